@@ -0,0 +1,335 @@
+# app/ann_index.py
+#
+# Inverted-file (IVF) approximate nearest neighbour index over a NumpyVectorStore.
+#
+# Vectors are clustered into `nlist` lists with spherical k-means; a query scores the
+# centroids and only scans the `nprobe` closest lists. Each list's vectors are stored
+# contiguously, so a probe is one slice of a memory-mapped matrix. Rows added to the
+# store after the index was built are searched exactly, and deleted rows are masked,
+# so the index only needs rebuilding when recall drifts or the store is compacted.
+#
+# Layout of an index directory (default vector_context/ivf):
+#   centroids.npy   nlist x D float32
+#   offsets.npy     nlist + 1 int64, list l spans [offsets[l], offsets[l + 1])
+#   rows.npy        store row of each indexed vector, in list order
+#   vectors.f32     indexed vectors, in list order
+#   meta.json       {"nlist", "dim", "count", "generation"}
+#
+#   python -m app.ann_index build --nlist 256
+#   python -m app.ann_index recall --k 10 --nprobe 1 4 16 64
+
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.numpy_store import NUMPY_STORE_DIR, NumpyVectorStore, normalize_rows, top_k
+
+IVF_INDEX_DIR = os.path.join(os.path.dirname(NUMPY_STORE_DIR), 'ivf')
+
+NPROBE = 8
+ASSIGN_BLOCK = 65536
+
+
+def default_nlist(count: int) -> int:
+    """
+    Returns the usual sqrt(N)-ish number of lists, at least 1.
+    """
+    return max(1, min(count, int(4 * np.sqrt(count))))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Assigns every row to its most similar centroid, in blocks to bound memory.
+    """
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK])
+        assign[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def train_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 20, sample_per_list: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    Trains nlist unit-norm centroids with spherical k-means on a sample of the rows.
+
+    Args:
+        vectors (np.ndarray): N x D unit-norm vectors (may be a memmap).
+        nlist (int): Number of centroids.
+        iterations (int, optional): Lloyd iterations. Defaults to 20.
+        sample_per_list (int, optional): Training rows per centroid. Defaults to 64.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        np.ndarray: nlist x D float32 centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_rows = np.sort(rng.choice(n, size=min(n, nlist * sample_per_list), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+        # Re-seed empty lists with random training points
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    A persisted IVF index over the rows of a NumpyVectorStore.
+    """
+
+    def __init__(self, index_directory: str = IVF_INDEX_DIR) -> None:
+        """
+        Args:
+            index_directory (str, optional): The index directory. Defaults to IVF_INDEX_DIR.
+        """
+        self.index_directory = index_directory
+        with open(os.path.join(index_directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.nlist, self.dim, self.count, self.generation = meta["nlist"], meta["dim"], meta["count"], meta["generation"]
+        self.centroids = np.load(os.path.join(index_directory, 'centroids.npy'))
+        self.offsets = np.load(os.path.join(index_directory, 'offsets.npy'))
+        self.rows = np.load(os.path.join(index_directory, 'rows.npy'), mmap_mode='r')
+        self.vectors = np.memmap(os.path.join(index_directory, 'vectors.f32'), dtype=np.float32, mode='r', shape=(self.count, self.dim))
+
+    @classmethod
+    def build(
+        cls,
+        store: NumpyVectorStore,
+        index_directory: str = IVF_INDEX_DIR,
+        nlist: Optional[int] = None,
+        iterations: int = 20,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Clusters the store's vectors and writes the index, replacing any previous one.
+
+        Args:
+            store (NumpyVectorStore): The store to index.
+            index_directory (str, optional): Where to write the index. Defaults to IVF_INDEX_DIR.
+            nlist (Optional[int], optional): Number of lists. Defaults to default_nlist(N).
+            iterations (int, optional): k-means iterations. Defaults to 20.
+            seed (int, optional): Random seed. Defaults to 0.
+
+        Returns:
+            IVFIndex: The new index.
+        """
+        if not store.count:
+            raise ValueError("Cannot build an IVF index over an empty store")
+        nlist = min(nlist or default_nlist(store.count), store.count)
+        vectors = store._vectors
+
+        centroids = train_kmeans(vectors, nlist, iterations=iterations, seed=seed)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+        tmp_dir = index_directory.rstrip(os.sep) + '.build'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, 'centroids.npy'), centroids)
+        np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+        np.save(os.path.join(tmp_dir, 'rows.npy'), order)
+        with open(os.path.join(tmp_dir, 'vectors.f32'), 'wb') as f:
+            for start in range(0, len(order), ASSIGN_BLOCK):
+                rows = np.sort(order[start:start + ASSIGN_BLOCK])
+                block = np.asarray(vectors[rows])
+                # Restore list order within the block after the sorted (sequential) read
+                f.write(block[np.argsort(np.argsort(order[start:start + ASSIGN_BLOCK]))].tobytes())
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({"nlist": nlist, "dim": store.dim, "count": store.count, "generation": store.generation}, f)
+
+        shutil.rmtree(index_directory, ignore_errors=True)
+        os.replace(tmp_dir, index_directory)
+        return cls(index_directory)
+
+    def matches(self, store: NumpyVectorStore) -> bool:
+        """
+        Whether the index was built over this store's current row numbering.
+        """
+        return self.generation == store.generation and self.dim == store.dim and self.count <= store.count
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scans the nprobe lists closest to the query.
+
+        Args:
+            query (np.ndarray): A unit-norm query vector.
+            k (int): Number of results.
+            nprobe (int, optional): Lists to scan. Defaults to NPROBE.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Candidate store rows and scores (unsorted, at most
+                the contents of the probed lists).
+        """
+        probe = top_k(self.centroids @ query, nprobe)
+        spans = [(self.offsets[l], self.offsets[l + 1]) for l in probe if self.offsets[l + 1] > self.offsets[l]]
+        if not spans:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([self.rows[a:b] for a, b in spans])
+        scores = np.concatenate([self.vectors[a:b] @ query for a, b in spans])
+        return rows, scores
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore whose searches go through an IVF index. Falls back to exact
+    search (with a warning) when the index is missing or was built over a different
+    generation of the store.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = NUMPY_STORE_DIR,
+        embedding_function: Optional[Embeddings] = None,
+        index_directory: str = IVF_INDEX_DIR,
+        nprobe: int = NPROBE
+    ) -> None:
+        """
+        Args:
+            persist_directory (str, optional): The NumPy store directory. Defaults to NUMPY_STORE_DIR.
+            embedding_function (Optional[Embeddings], optional): Embeds queries and added texts.
+            index_directory (str, optional): The IVF index directory. Defaults to IVF_INDEX_DIR.
+            nprobe (int, optional): Lists scanned per query. Defaults to NPROBE.
+        """
+        super().__init__(persist_directory, embedding_function)
+        self.nprobe = nprobe
+        self.index = None
+        if os.path.exists(os.path.join(index_directory, 'meta.json')):
+            self.index = IVFIndex(index_directory)
+        if not self.index or not self.index.matches(self):
+            print(f"[WARN] No up-to-date IVF index in {index_directory}; using exact search. "
+                  f"Build one with `python -m app.ann_index build`.")
+            self.index = None
+
+    def search_vectors(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.index is None or not self.index.matches(self):
+            return super().search_vectors(query, k)
+        return ivf_search(self, self.index, query, k, self.nprobe)
+
+
+def ivf_search(store: NumpyVectorStore, index: IVFIndex, query: np.ndarray, k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k search of a store through its IVF index. Rows appended since the index was
+    built are scanned exactly and deleted rows are skipped.
+
+    Args:
+        store (NumpyVectorStore): The store the index was built over.
+        index (IVFIndex): The index.
+        query (np.ndarray): A unit-norm query vector.
+        k (int): Number of results.
+        nprobe (int): Lists to scan.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Store rows and cosine similarities, best first.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    rows, scores = index.search(query, k, nprobe)
+    if store.count > index.count:
+        rows = np.concatenate([rows, np.arange(index.count, store.count)])
+        scores = np.concatenate([scores, store._vectors[index.count:] @ query])
+    if store._dead.any():
+        alive = ~store._dead[rows]
+        rows, scores = rows[alive], scores[alive]
+    best = top_k(scores, k)
+    return rows[best], scores[best]
+
+
+def recall_report(
+    store: NumpyVectorStore,
+    index: IVFIndex,
+    k: int = 10,
+    nprobes: List[int] = (1, 4, 16, 64),
+    queries: Optional[np.ndarray] = None,
+    num_queries: int = 200,
+    noise: float = 0.05,
+    seed: int = 0
+) -> List[dict]:
+    """
+    Measures recall@k of the IVF index against exact search, and per-query latency of
+    both, for several nprobe settings.
+
+    Args:
+        store (NumpyVectorStore): The indexed store.
+        index (IVFIndex): The index to evaluate.
+        k (int, optional): Result count. Defaults to 10.
+        nprobes (List[int], optional): nprobe values to try. Defaults to (1, 4, 16, 64).
+        queries (Optional[np.ndarray], optional): Unit-norm query vectors. Defaults to
+            num_queries stored vectors perturbed with Gaussian noise.
+        num_queries (int, optional): Number of sampled queries. Defaults to 200.
+        noise (float, optional): Noise scale for sampled queries. Defaults to 0.05.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        List[dict]: One row per setting ("exact" first) with recall@k and p50/p95 latency in ms.
+    """
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        alive = np.flatnonzero(~store._dead)
+        picks = np.sort(rng.choice(alive, size=min(num_queries, len(alive)), replace=False))
+        sampled = np.asarray(store._vectors[picks])
+        queries = normalize_rows(sampled + rng.normal(scale=noise / np.sqrt(store.dim), size=sampled.shape))
+
+    def timed(search):
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(set(search(query).tolist()))
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results, latencies
+
+    exact, exact_ms = timed(lambda q: NumpyVectorStore.search_vectors(store, q, k)[0])
+    report = [{"setting": "exact", "recall": 1.0,
+               "p50_ms": round(float(np.percentile(exact_ms, 50)), 3),
+               "p95_ms": round(float(np.percentile(exact_ms, 95)), 3)}]
+
+    for nprobe in nprobes:
+        approx, approx_ms = timed(lambda q: ivf_search(store, index, q, k, nprobe)[0])
+        hits = sum(len(a & e) for a, e in zip(approx, exact))
+        report.append({
+            "setting": f"ivf nlist={index.nlist} nprobe={nprobe}",
+            "recall": round(hits / max(1, sum(len(e) for e in exact)), 4),
+            "p50_ms": round(float(np.percentile(approx_ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(approx_ms, 95)), 3),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IVF approximate nearest neighbour index tools.")
+    parser.add_argument("--store-dir", default=NUMPY_STORE_DIR, help="NumPy store to index")
+    parser.add_argument("--index-dir", default=IVF_INDEX_DIR, help="Where the IVF index lives")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build (or rebuild) the IVF index")
+    build.add_argument("--nlist", type=int, default=None, help="Number of lists (default ~4*sqrt(N))")
+    build.add_argument("--iterations", type=int, default=20, help="k-means iterations")
+    recall = sub.add_parser("recall", help="Report recall@k and latency against exact search")
+    recall.add_argument("--k", type=int, default=10)
+    recall.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    recall.add_argument("--queries", type=int, default=200, help="Number of sampled query vectors")
+    args = parser.parse_args()
+
+    store = NumpyVectorStore(args.store_dir)
+    if args.command == "build":
+        start = time.perf_counter()
+        index = IVFIndex.build(store, args.index_dir, nlist=args.nlist, iterations=args.iterations)
+        print(f"Built IVF index with {index.nlist} lists over {index.count} vectors "
+              f"in {time.perf_counter() - start:.1f}s -> {args.index_dir}")
+    else:
+        report = recall_report(store, IVFIndex(args.index_dir), k=args.k, nprobes=args.nprobe, num_queries=args.queries)
+        print(json.dumps(report, indent=1))
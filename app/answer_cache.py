@@ -0,0 +1,201 @@
+# app/answer_cache.py
+#
+# In-process semantic cache of final answers. A new question is embedded and matched
+# against previously answered questions of the same kind (e.g. "sit", "finance") by
+# cosine similarity; above the threshold, the earlier answer is returned without
+# retrieval or generation. Entries expire after a TTL and are evicted least recently
+# used first. The whole cache is dropped when the index builder stamps a new index
+# version, so answers never outlive the documents they were generated from.
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.debug import debug_log
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+INDEX_VERSION_PATH = os.path.join(ROOT_DIR, 'vector_context', 'index_version')
+
+SIMILARITY_THRESHOLD = 0.92
+TTL_SECONDS = 3600.0
+MAX_ENTRIES = 256
+
+# Seconds between checks of the index version file
+VERSION_CHECK_INTERVAL = 1.0
+
+
+def read_index_version(path: str = INDEX_VERSION_PATH) -> Optional[str]:
+    """
+    Returns the current index version stamp, or None if the index was never stamped.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def bump_index_version(path: str = INDEX_VERSION_PATH) -> str:
+    """
+    Stamps a new index version, invalidating every semantic answer cache watching it.
+
+    Args:
+        path (str, optional): The version file. Defaults to INDEX_VERSION_PATH.
+
+    Returns:
+        str: The new version.
+    """
+    version = uuid.uuid4().hex
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe answer cache keyed by question embedding, with TTL and LRU eviction.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl: float = TTL_SECONDS,
+        max_entries: int = MAX_ENTRIES,
+        version_path: Optional[str] = INDEX_VERSION_PATH
+    ) -> None:
+        """
+        Args:
+            embeddings (Embeddings): Embeds questions (the query path's cached embedder).
+            threshold (float, optional): Minimum cosine similarity for a hit. Defaults to SIMILARITY_THRESHOLD.
+            ttl (float, optional): Entry lifetime in seconds. Defaults to TTL_SECONDS.
+            max_entries (int, optional): Entries kept before LRU eviction. Defaults to MAX_ENTRIES.
+            version_path (Optional[str], optional): Index version file to watch, or None to
+                disable invalidation. Defaults to INDEX_VERSION_PATH.
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_path = version_path
+        self._lock = threading.Lock()
+        # slot -> entry dict, in LRU order (least recently used first)
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._free: List[int] = list(range(max_entries))
+        self._version = read_index_version(version_path) if version_path else None
+        self._version_checked = time.monotonic()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+        self._saved_seconds = 0.0
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question.strip()), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_version(self) -> None:
+        now = time.monotonic()
+        if not self.version_path or now - self._version_checked < VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked = now
+        version = read_index_version(self.version_path)
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self._clear()
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._free = list(range(self.max_entries))
+
+    def _drop(self, slot: int) -> None:
+        del self._entries[slot]
+        self._free.append(slot)
+
+    def get(self, namespace: str, vector: np.ndarray) -> Optional[str]:
+        """
+        Returns the answer of the most similar live question in the namespace, if it is
+        at least `threshold` similar.
+
+        Args:
+            namespace (str): The kind of question, e.g. "sit".
+            vector (np.ndarray): The question embedding from embed().
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._check_version()
+            now = time.monotonic()
+            for slot in [s for s, e in self._entries.items() if now - e["created"] > self.ttl]:
+                self._drop(slot)
+                self._counters["expired"] += 1
+            slots = [s for s, e in self._entries.items() if e["namespace"] == namespace]
+            if slots:
+                scores = self._vectors[slots] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    slot = slots[best]
+                    entry = self._entries[slot]
+                    self._entries.move_to_end(slot)
+                    self._counters["hits"] += 1
+                    self._saved_seconds += max(0.0, entry["cost"] - (time.perf_counter() - start))
+                    debug_log(f"Answer cache hit (similarity {scores[best]:.3f}): {entry['question']!r}")
+                    return entry["answer"]
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, namespace: str, question: str, vector: np.ndarray, answer: str, cost: float) -> None:
+        """
+        Caches an answer.
+
+        Args:
+            namespace (str): The kind of question, e.g. "sit".
+            question (str): The question, for logging.
+            vector (np.ndarray): The question embedding from embed().
+            answer (str): The final answer.
+            cost (float): Seconds it took to produce, counted as saved on each hit.
+        """
+        if not answer:
+            return
+        with self._lock:
+            self._check_version()
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._clear()
+            if not self._free:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {"namespace": namespace, "question": question, "answer": answer,
+                                   "cost": cost, "created": time.monotonic()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns counters, the hit rate and the generation time saved by hits.
+        """
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "seconds_saved": round(self._saved_seconds, 3),
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,250 @@
+# app/async_pipeline.py
+#
+# Asyncio API for the RAG pipeline, STT and TTS. Generation uses the Ollama client's
+# native async I/O; retrieval, chain setup, the answer cache and the ElevenLabs calls
+# (blocking libraries) run in worker threads. Each backend has its own concurrency limit,
+# so one process can keep many conversations in flight without overloading any one
+# service. Generations also go through rag_pipeline's generation_scheduler (aslot/arun),
+# so async and sync callers share one global cap, fair queue and request coalescing.
+#
+# The Streamlit apps do not use this module: they render answers token by token from
+# the synchronous stream_* generators, which the whole-answer coroutines here cannot
+# provide. It is the entry point for asyncio hosts (e.g. an ASGI server) and batch jobs.
+#
+# The async HTTP client of an OllamaLLM is bound to the event loop it first ran on, so
+# each loop gets its own LLM instances (get_async_llm) instead of sharing get_llm()'s.
+#
+# Synchronous callers (e.g. Streamlit scripts, one thread per session) share a single
+# background event loop through run_coroutine():
+#
+#   from app.async_pipeline import allm_response_sit, run_coroutine
+#   answer = run_coroutine(allm_response_sit("Where is the SIT campus?"))
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Coroutine, Dict, List, Optional, Tuple, TypeVar
+
+from langchain_core.vectorstores import VectorStore
+from langchain_ollama import OllamaLLM
+
+from app import rag_pipeline
+from app.debate_evidence import DebateEvidence
+from app.debate_memory import DebateMemory
+from app.scheduler import generation_scheduler
+from app.think_filter import strip_think
+
+T = TypeVar("T")
+
+# Maximum concurrent operations per backend; override with e.g. ASYNC_LIMIT_LLM=4
+BACKEND_LIMITS: Dict[str, int] = {
+    name: int(os.environ.get(f"ASYNC_LIMIT_{name.upper()}", default))
+    for name, default in (("llm", 2), ("retrieval", 8), ("stt", 4), ("tts", 4))
+}
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+_llms: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, OllamaLLM]]" = weakref.WeakKeyDictionary()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def backend_limit(name: str) -> asyncio.Semaphore:
+    """
+    Returns the running loop's semaphore limiting concurrent calls to a backend.
+
+    Args:
+        name (str): The backend, a key of BACKEND_LIMITS.
+
+    Returns:
+        asyncio.Semaphore: The backend's semaphore.
+    """
+    per_loop = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    if name not in per_loop:
+        per_loop[name] = asyncio.Semaphore(BACKEND_LIMITS[name])
+    return per_loop[name]
+
+
+def get_async_llm(model: str = rag_pipeline.LLM_MODEL, **options) -> OllamaLLM:
+    """
+    Returns the running loop's Ollama LLM client for the model and options, creating it
+    on first use. Clients are not shared across loops, as their async HTTP connections
+    belong to the loop that opened them.
+
+    Args:
+        model (str, optional): The Ollama model. Defaults to rag_pipeline.LLM_MODEL.
+        **options: Further OllamaLLM fields, as for rag_pipeline.get_llm; part of the key.
+
+    Returns:
+        OllamaLLM: The loop's client.
+    """
+    per_loop = _llms.setdefault(asyncio.get_running_loop(), {})
+    key = (model, tuple(sorted(options.items())))
+    if key not in per_loop:
+        per_loop[key] = rag_pipeline.new_llm(model, **options)
+    return per_loop[key]
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the shared background event loop, starting its thread on first use.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="rag-event-loop", daemon=True).start()
+    return _loop
+
+
+def run_coroutine(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Runs a coroutine on the shared event loop from synchronous code and waits for it.
+
+    Args:
+        coro (Awaitable[T]): The coroutine.
+        timeout (Optional[float], optional): Seconds to wait. Defaults to None (no limit).
+
+    Returns:
+        T: The coroutine's result.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
+
+
+async def aquery_llm(vector_db: VectorStore, query: str) -> str:
+    """
+    Async counterpart of rag_pipeline.query_llm, using the same cached chain's retriever
+    and prompt.
+
+    Args:
+        vector_db (VectorStore): The vector database to use for retrieval.
+        query (str): The query string to send to the LLM.
+
+    Returns:
+        str: The response with the reasoning block removed.
+    """
+    # Building the chain may load the BM25 index from disk
+    qa_chain = await asyncio.to_thread(rag_pipeline.get_qa_chain, vector_db)
+    async with backend_limit("retrieval"):
+        docs = await asyncio.to_thread(qa_chain.retriever.invoke, query)
+    prompt = rag_pipeline.stuff_prompt(qa_chain, docs, query)
+    async with backend_limit("llm"):
+        response = await generation_scheduler.arun(("prompt", prompt), lambda: get_async_llm().ainvoke(prompt))
+    return strip_think(response)
+
+
+async def acached_answer(namespace: str, question: str, generate: Coroutine[Any, Any, str]) -> str:
+    """
+    Async counterpart of rag_pipeline.cached_answer. `generate` is only awaited on a miss.
+    """
+    cache = await asyncio.to_thread(rag_pipeline.get_answer_cache)
+    if cache is None:
+        return await generate
+    async with backend_limit("retrieval"):
+        vector = await asyncio.to_thread(cache.embed, question)
+    answer = cache.get(namespace, vector)
+    if answer is None:
+        start = time.perf_counter()
+        answer = await generate
+        cache.put(namespace, question, vector, answer, time.perf_counter() - start)
+    else:
+        generate.close()
+    return answer
+
+
+async def allm_response_sit(query: str) -> str:
+    """
+    Async counterpart of rag_pipeline.llm_response_sit.
+
+    Args:
+        query (str): The SIT-related question to answer.
+
+    Returns:
+        str: The LLM's response to the SIT query.
+    """
+    vector_db = await asyncio.to_thread(rag_pipeline.get_vector_db)
+    return await acached_answer("sit", query, aquery_llm(vector_db, rag_pipeline.SIT_SYSTEM_PROMPT + query))
+
+
+async def allm_response_finance(query: str) -> str:
+    """
+    Async counterpart of rag_pipeline.llm_response_finance.
+
+    Args:
+        query (str): The financial question to answer.
+
+    Returns:
+        str: The LLM's response to the financial query.
+    """
+    vector_db = await asyncio.to_thread(rag_pipeline.get_vector_db)
+    return await acached_answer("finance", query, aquery_llm(vector_db, rag_pipeline.FINANCE_SYSTEM_PROMPT + query))
+
+
+async def allm_response_medical_debate(
+    user_input: str,
+    history: List[Tuple[str, str]] = None,
+    debate_side: str = "for",
+    debate_round: int = 1,
+    memory: Optional[DebateMemory] = None,
+    evidence: Optional[DebateEvidence] = None
+) -> str:
+    """
+    Async counterpart of rag_pipeline.llm_response_medical_debate.
+
+    Args:
+        user_input (str): The latest argument or statement from the user.
+        history (List[Tuple[str, str]], optional): Previous (user argument, LLM response) rounds. Defaults to None.
+        debate_side (str, optional): The side of the debate ("for" or "against"). Defaults to "for".
+        debate_round (int, optional): The current round of the debate. Defaults to 1.
+        memory (Optional[DebateMemory], optional): The debate's bounded memory. Defaults to None.
+        evidence (Optional[DebateEvidence], optional): The debate's evidence cache. Defaults to None.
+
+    Returns:
+        str: The LLM's debate response as a string.
+    """
+    # Building the prompt may retrieve the argument's evidence
+    async with backend_limit("retrieval"):
+        prompt = await asyncio.to_thread(
+            rag_pipeline.build_medical_debate_prompt, user_input, history, debate_side, debate_round, memory, evidence
+        )
+    async with backend_limit("llm"):
+        # Same key as llm_response_medical_debate, so sync and async duplicates coalesce
+        return await generation_scheduler.arun(("debate", prompt), lambda: get_async_llm().ainvoke(prompt))
+
+
+async def atranscribe_audio(audio, language: str = "en", filename: Optional[str] = None) -> str:
+    """
+    Async counterpart of stt_elevenlabs.transcribe_audio; audio is a path, bytes or a buffer.
+    """
+    from app.stt_elevenlabs import transcribe_audio
+
+    async with backend_limit("stt"):
+        return await asyncio.to_thread(transcribe_audio, audio, language, filename)
+
+
+async def atext_to_speech(text: str, voice_id: str, **kwargs) -> bytes:
+    """
+    Async counterpart of tts_elevenlabs.text_to_speech; kwargs are passed through.
+    """
+    from app.tts_elevenlabs import text_to_speech
+
+    async with backend_limit("tts"):
+        return await asyncio.to_thread(text_to_speech, text, voice_id, **kwargs)
+
+
+async def avoice_turn_sit(audio, voice_id: str, language: str = "en") -> Tuple[str, str, bytes]:
+    """
+    One voice Q&A turn: transcribe, answer, synthesise.
+
+    Args:
+        audio: The recorded question, as a path, bytes or a buffer.
+        voice_id (str): The ElevenLabs voice for the reply.
+        language (str, optional): The spoken language. Defaults to "en".
+
+    Returns:
+        Tuple[str, str, bytes]: The transcript, the answer and the MP3 reply.
+    """
+    question = await atranscribe_audio(audio, language)
+    answer = await allm_response_sit(question)
+    return question, answer, await atext_to_speech(answer, voice_id)
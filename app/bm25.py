@@ -0,0 +1,252 @@
+# app/bm25.py
+#
+# Compact BM25 inverted index over the indexed chunks, and a hybrid retriever that
+# fuses it with vector search using reciprocal rank fusion (RRF).
+#
+# BM25 weights are precomputed per posting at build time, so a query is one slice per
+# query term, a sum of the weights per matched chunk and an argpartition top-k. The cost
+# grows with the postings of the query terms, not with the number of chunks.
+#
+# Layout of an index directory (default vector_context/bm25):
+#   vocab.json     {term: term index}
+#   postings.npz   term_offsets (V + 1), doc_ids (P, int32), weights (P, float32),
+#                  doc_offsets (N x 2, int64) into docs.jsonl
+#   docs.jsonl     one {"text", "metadata"} record per chunk
+#   meta.json      {"count", "terms", "avgdl", "k1", "b"}
+#
+#   python -m app.bm25 build                  # from the Chroma collection
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from app.numpy_store import top_k
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BM25_INDEX_DIR = os.path.join(ROOT_DIR, 'vector_context', 'bm25')
+
+K1 = 1.5
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and splits text into alphanumeric tokens, so course codes ("ict1001")
+    and years ("2009") survive as single terms.
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    A persisted BM25 inverted index.
+    """
+
+    def __init__(self, index_directory: str = BM25_INDEX_DIR) -> None:
+        """
+        Args:
+            index_directory (str, optional): The index directory. Defaults to BM25_INDEX_DIR.
+        """
+        self.index_directory = index_directory
+        with open(os.path.join(index_directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_directory, 'vocab.json'), 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        postings = np.load(os.path.join(index_directory, 'postings.npz'))
+        self.term_offsets = postings["term_offsets"]
+        self.doc_ids = postings["doc_ids"]
+        self.weights = postings["weights"]
+        self.doc_offsets = postings["doc_offsets"]
+        self.count = self.meta["count"]
+        self._docs_file = open(os.path.join(index_directory, 'docs.jsonl'), 'rb')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(documents: Iterable[Document], index_directory: str = BM25_INDEX_DIR, k1: float = K1, b: float = B) -> "BM25Index":
+        """
+        Builds and persists an index over the given documents, replacing any previous one.
+
+        Args:
+            documents (Iterable[Document]): The chunks to index.
+            index_directory (str, optional): Where to write the index. Defaults to BM25_INDEX_DIR.
+            k1 (float, optional): BM25 term-frequency saturation. Defaults to K1.
+            b (float, optional): BM25 length normalisation. Defaults to B.
+
+        Returns:
+            BM25Index: The new index.
+        """
+        tmp_dir = index_directory.rstrip(os.sep) + '.build'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        postings = defaultdict(list)
+        doc_lens, doc_offsets = [], []
+        position = 0
+        with open(os.path.join(tmp_dir, 'docs.jsonl'), 'wb') as f:
+            for doc_id, doc in enumerate(documents):
+                tokens = tokenize(doc.page_content)
+                doc_lens.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    postings[term].append((doc_id, tf))
+                record = json.dumps({"text": doc.page_content, "metadata": doc.metadata or {}}, ensure_ascii=False).encode('utf-8') + b'\n'
+                f.write(record)
+                doc_offsets.append((position, len(record)))
+                position += len(record)
+
+        count = len(doc_lens)
+        doc_lens = np.asarray(doc_lens, dtype=np.float32)
+        avgdl = float(doc_lens.mean()) if count else 0.0
+        vocab = {term: n for n, term in enumerate(sorted(postings))}
+
+        term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids, weights = [], []
+        for term, n in vocab.items():
+            ids, tfs = map(np.asarray, zip(*postings[term]))
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = k1 * (1 - b + b * doc_lens[ids] / (avgdl or 1))
+            doc_ids.append(ids.astype(np.int32))
+            weights.append((idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+            term_offsets[n + 1] = term_offsets[n] + len(ids)
+
+        np.savez(
+            os.path.join(tmp_dir, 'postings.npz'),
+            term_offsets=term_offsets,
+            doc_ids=np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32),
+            weights=np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            doc_offsets=np.asarray(doc_offsets, dtype=np.int64).reshape(-1, 2),
+        )
+        with open(os.path.join(tmp_dir, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({"count": count, "terms": len(vocab), "avgdl": avgdl, "k1": k1, "b": b}, f)
+
+        shutil.rmtree(index_directory, ignore_errors=True)
+        os.replace(tmp_dir, index_directory)
+        return BM25Index(index_directory)
+
+    def search_ids(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores the query against every chunk containing one of its terms. Only those
+        chunks are touched, so the cost does not depend on the size of the index.
+
+        Args:
+            query (str): The query text.
+            k (int): Number of results.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Chunk numbers and BM25 scores, best first.
+        """
+        ids, weights = [], []
+        for term in set(tokenize(query)):
+            n = self.vocab.get(term)
+            if n is None:
+                continue
+            start, end = self.term_offsets[n], self.term_offsets[n + 1]
+            ids.append(self.doc_ids[start:end])
+            weights.append(self.weights[start:end])
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Sum the weights of each matched chunk over the query terms
+        rows, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights)).astype(np.float32)
+        best = top_k(scores, k)
+        return rows[best].astype(np.int64), scores[best]
+
+    def document(self, row: int) -> Document:
+        offset, length = self.doc_offsets[row]
+        with self._lock:
+            self._docs_file.seek(int(offset))
+            record = json.loads(self._docs_file.read(int(length)))
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Returns the k best BM25 matches for the query with their scores.
+        """
+        rows, scores = self.search_ids(query, k)
+        return [(self.document(row), float(score)) for row, score in zip(rows, scores)]
+
+
+def iter_store_documents(vector_db: VectorStore, batch_size: int = 1000) -> Iterator[Document]:
+    """
+    Streams every chunk stored in a Chroma or NumPy vector store.
+    """
+    if hasattr(vector_db, "iter_rows"):
+        for _, _, docs in vector_db.iter_rows(batch_size):
+            yield from docs
+        return
+    offset = 0
+    while True:
+        page = vector_db.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            return
+        for text, metadata in zip(page["documents"], page["metadatas"]):
+            yield Document(page_content=text, metadata=metadata or {})
+        offset += len(page["ids"])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing vector search and BM25 with reciprocal rank fusion: each list
+    contributes weight / (rrf_k + rank) per document, and documents are keyed by content.
+    """
+
+    vector_store: VectorStore
+    bm25: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    lexical_query: Optional[Callable[[str], str]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        fused, docs = defaultdict(float), {}
+        vector_hits = self.vector_store.similarity_search(query, k=self.fetch_k)
+        lexical_hits = [doc for doc, _ in self.bm25.search(self.lexical_query(query) if self.lexical_query else query, k=self.fetch_k)]
+        for weight, hits in ((self.vector_weight, vector_hits), (self.lexical_weight, lexical_hits)):
+            for rank, doc in enumerate(hits, start=1):
+                fused[doc.page_content] += weight / (self.rrf_k + rank)
+                docs.setdefault(doc.page_content, doc)
+        ranked = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [docs[text] for text in ranked]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25 index tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build the BM25 index from a vector store's chunks")
+    build.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    build.add_argument("--index-dir", default=BM25_INDEX_DIR)
+    search = sub.add_parser("search", help="Run a lexical query")
+    search.add_argument("query")
+    search.add_argument("--k", type=int, default=4)
+    search.add_argument("--index-dir", default=BM25_INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.backend == "numpy":
+            from app.numpy_store import NumpyVectorStore
+            store = NumpyVectorStore()
+        else:
+            from langchain_community.vectorstores import Chroma
+            store = Chroma(persist_directory=os.path.join(ROOT_DIR, 'vector_context'))
+        index = BM25Index.build(iter_store_documents(store), args.index_dir)
+        print(f"Built BM25 index over {index.count} chunks ({index.meta['terms']} terms) -> {args.index_dir}")
+    else:
+        for doc, score in BM25Index(args.index_dir).search(args.query, args.k):
+            print(f"{score:.3f}  {doc.page_content[:100]!r}")
@@ -1,31 +1,157 @@
-from langchain_ollama import OllamaEmbeddings
+# app/build_sit_vector_db.py
+#
+# Incrementally (re)builds the Chroma vector database from the SIT data, or from any
+# directories of text/markdown files. Chunks are content-addressed and tracked in an
+# SQLite manifest next to the database (see app/ingest.py), so a rebuild only embeds
+# new chunks, deletes the vectors of removed ones, and resumes if interrupted. The
+# BM25 index used by hybrid retrieval (see app/bm25.py) is rebuilt alongside.
+#
+#   python -m app.build_sit_vector_db                    # index sit-data/
+#   python -m app.build_sit_vector_db docs/ notes/ --flush-size 512
+#   python -m app.build_sit_vector_db --persist-directory /tmp/scratch_db   # build elsewhere
+
 from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+
+from app.answer_cache import INDEX_VERSION_PATH, bump_index_version
+from app.bm25 import BM25Index, iter_store_documents
+from app.embeddings import embedding_stats, make_embedding_model
+from app.ingest import IndexManifest, ingest, purge_untracked, BLOCK_CHARS, FLUSH_SIZE
+
+import argparse
 import os
+from typing import List, Optional
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Directory holding the SIT data files
+DATA_DIR = os.path.join(ROOT_DIR, 'sit-data')
+VECTOR_DB_DIR = os.path.join(ROOT_DIR, 'vector_context')
+MANIFEST_PATH = os.path.join(VECTOR_DB_DIR, 'index_manifest.sqlite3')
+BM25_INDEX_DIR = os.path.join(VECTOR_DB_DIR, 'bm25')
+LEGACY_MANIFEST_PATH = os.path.join(VECTOR_DB_DIR, 'index_manifest.json')
+
+# Files and directories indexed into the vector database
+SOURCES = [DATA_DIR]
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+
+
+def open_manifest(vector_db: Chroma, persist_directory: str) -> IndexManifest:
+    """
+    Opens the index manifest of a persisted database. On first use it imports the JSON
+    manifest of earlier builder versions, or, if there is none, purges the untracked
+    duplicates appended by full rebuilds made before the manifest existed.
+
+    Args:
+        vector_db (Chroma): The vector database the manifest describes.
+        persist_directory (str): Where the database lives.
+
+    Returns:
+        IndexManifest: The opened manifest.
+    """
+    manifest = IndexManifest(os.path.join(persist_directory, os.path.basename(MANIFEST_PATH)))
+    if manifest.is_new:
+        legacy_path = os.path.join(persist_directory, os.path.basename(LEGACY_MANIFEST_PATH))
+        if os.path.exists(legacy_path):
+            print(f"Imported {manifest.import_json(legacy_path)} chunk ids from {legacy_path}")
+            os.remove(legacy_path)
+        else:
+            purged = purge_untracked(vector_db, manifest)
+            if purged:
+                print(f"Removed {purged} untracked vectors from a previous full build")
+    return manifest
+
+
+def build_index(
+    sources: List[str] = SOURCES,
+    persist_directory: str = VECTOR_DB_DIR,
+    embedding_model: Optional[Embeddings] = None,
+    flush_size: int = FLUSH_SIZE,
+    block_chars: int = BLOCK_CHARS
+) -> None:
+    """
+    Incrementally builds the vector database for the given files and directories.
+    Sources indexed previously but not found under `sources` are removed.
+
+    Args:
+        sources (List[str], optional): Files and directories to index. Defaults to SOURCES.
+        persist_directory (str, optional): Where the database lives. Defaults to VECTOR_DB_DIR.
+        embedding_model (Optional[Embeddings], optional): The embedding stage.
+            Defaults to the cached, batched Ollama embedder with default settings.
+        flush_size (int, optional): Chunks embedded and upserted per flush. Defaults to FLUSH_SIZE.
+        block_chars (int, optional): Read block size in characters. Defaults to BLOCK_CHARS.
+    """
+    # Split the text into chunks
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+
+    # Create embeddings
+    embedding_model = embedding_model or make_embedding_model()
+
+    # Open (or create) the persisted vector database
+    vector_db = Chroma(persist_directory=persist_directory, embedding_function=embedding_model)
+
+    manifest = open_manifest(vector_db, persist_directory)
+    try:
+        ingest_stats = ingest(sources, vector_db, manifest, text_splitter, flush_size=flush_size, block_chars=block_chars)
+    finally:
+        manifest.close()
 
-# Path to the Wikipedia data file
-DATA_PATH = os.path.join(os.path.dirname(__file__), '../sit-data/sit_wikipedia.txt')
-VECTOR_DB_DIR = os.path.join(os.path.dirname(__file__), '../vector_context')
+    # Rebuild the BM25 index over the same chunks whenever they changed
+    bm25_dir = os.path.join(persist_directory, os.path.basename(BM25_INDEX_DIR))
+    if ingest_stats.chunks_embedded or ingest_stats.chunks_deleted or not os.path.exists(bm25_dir):
+        bm25 = BM25Index.build(iter_store_documents(vector_db), bm25_dir)
+        print(f"BM25 index rebuilt over {bm25.count} chunks ({bm25.meta['terms']} terms)")
+        # Invalidate cached answers generated from the previous index
+        bump_index_version(os.path.join(persist_directory, os.path.basename(INDEX_VERSION_PATH)))
 
-# Load the Wikipedia text
-with open(DATA_PATH, 'r', encoding='utf-8') as f:
-    raw_text = f.read()
+    stats = embedding_stats(embedding_model)
+    if "cache" in stats:
+        print(f"Embedding cache: {stats['cache']['hits']} hits, {stats['cache']['misses']} misses")
+    if "texts" in stats:
+        print(
+            f"Embedded {stats['texts']} chunks in {stats['requests']} requests "
+            f"({stats['chunks_per_second']} chunks/sec, {stats['retries']} retries)"
+        )
+    print(f"Vector DB built and saved to {persist_directory}")
 
-# Split the text into chunks
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=100
-)
-docs = text_splitter.create_documents([raw_text])
 
-# Create embeddings
-embedding_model = OllamaEmbeddings(model="deepseek-r1")
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Incrementally build the SIT vector database.")
+    parser.add_argument("sources", nargs="*", default=SOURCES,
+                        help="Files/directories to index; previously indexed sources not listed are removed")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per embedding request")
+    parser.add_argument("--max-workers", type=int, default=4, help="Maximum concurrent embedding requests")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries per failed embedding request")
+    parser.add_argument("--persist-directory", default=VECTOR_DB_DIR,
+                        help="Where the database, its manifest and the BM25 index live")
+    parser.add_argument("--flush-size", type=int, default=FLUSH_SIZE, help="Chunks embedded and upserted per flush")
+    parser.add_argument("--base-url", default=None, help="Ollama server URL (e.g. a local stand-in server)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the persistent embedding cache")
+    args = parser.parse_args()
+    missing = [path for path in args.sources if not os.path.exists(path)]
+    if missing:
+        # Sources under a missing path would be treated as removed and purged from the index
+        parser.error(f"source not found: {', '.join(missing)}")
+    return args
 
-# Create and persist the vector database
-vector_db = Chroma.from_documents(
-    docs,
-    embedding_model,
-    persist_directory=VECTOR_DB_DIR
-)
 
-print(f"Vector DB built and saved to {VECTOR_DB_DIR}")
+if __name__ == "__main__":
+    args = parse_args()
+    build_index(
+        sources=args.sources,
+        persist_directory=args.persist_directory,
+        embedding_model=make_embedding_model(
+            base_url=args.base_url,
+            batch_size=args.batch_size,
+            max_workers=args.max_workers,
+            max_retries=args.max_retries,
+            cache=not args.no_cache,
+        ),
+        flush_size=args.flush_size,
+    )
@@ -0,0 +1,248 @@
+# app/context_packing.py
+#
+# Context assembly between retrieval and the "stuff" prompt. Chunks are written with
+# chunk_overlap=100, so neighbouring chunks share text, and the same sentences often occur
+# in several documents. Before retrieved chunks are concatenated into the prompt they are:
+#
+# 1. merged: a chunk whose start repeats the end of another (or that is contained in
+#    another) is joined with it, so the shared span appears once;
+# 2. deduplicated: sentences already present in a better-ranked chunk are dropped;
+# 3. packed: chunks are added best-ranked first until the token budget is used up; a
+#    chunk that does not fit is cut at a sentence boundary if enough budget is left.
+#
+# Token counts are estimated from character counts, since the Ollama model's tokenizer
+# is not available locally.
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.debug import debug_log
+
+# Upper bound on the estimated tokens of retrieved context per prompt; 0 removes the limit
+# (chunks are still merged and deduplicated)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1024"))
+
+CHARS_PER_TOKEN = 4.0
+
+# Shortest shared span (in characters) treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+# Sentences shorter than this are never dropped as duplicates (headings, list markers)
+MIN_DUPLICATE_CHARS = 30
+
+# A chunk that does not fit is only truncated if at least this many tokens are left
+MIN_TRUNCATED_TOKENS = 48
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "chunks_in": 0, "chunks_out": 0, "merged": 0, "truncated": 0,
+          "dropped": 0, "tokens_in": 0, "tokens_out": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _overlap(left: str, right: str, min_overlap: int = MIN_OVERLAP_CHARS) -> int:
+    """
+    Length of the longest suffix of `left` that is a prefix of `right` (0 if shorter
+    than min_overlap).
+    """
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    start = max(0, len(left) - len(right))
+    pos = left.find(probe, start)
+    while pos != -1:
+        # The earliest match gives the longest overlap
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+def _same_source(a: Document, b: Document) -> bool:
+    source_a, source_b = a.metadata.get("source"), b.metadata.get("source")
+    return source_a is None or source_b is None or source_a == source_b
+
+
+def _join(a: str, b: str, min_overlap: int) -> Optional[str]:
+    """
+    Returns the text covering both a and b if one contains or overlaps the other, else None.
+    """
+    if b in a:
+        return a
+    if a in b:
+        return b
+    overlap = _overlap(a, b, min_overlap)
+    if overlap:
+        return a + b[overlap:]
+    overlap = _overlap(b, a, min_overlap)
+    if overlap:
+        return b + a[overlap:]
+    return None
+
+
+def merge_overlapping(docs: List[Document], min_overlap: int = MIN_OVERLAP_CHARS) -> Tuple[List[Document], int]:
+    """
+    Joins chunks that overlap or contain one another. A merged chunk takes the position
+    of its best-ranked part.
+
+    Args:
+        docs (List[Document]): Retrieved chunks, best first.
+        min_overlap (int, optional): Shortest overlap joined. Defaults to MIN_OVERLAP_CHARS.
+
+    Returns:
+        Tuple[List[Document], int]: The merged chunks, best first, and the number of merges.
+    """
+    merged: List[Document] = []
+    merges = 0
+    for doc in docs:
+        current = Document(page_content=doc.page_content.strip(), metadata=dict(doc.metadata or {}))
+        if not current.page_content:
+            continue
+        position = len(merged)
+        i = 0
+        while i < len(merged):
+            other = merged[i]
+            joined = _join(other.page_content, current.page_content, min_overlap) if _same_source(other, current) else None
+            if joined is None:
+                i += 1
+                continue
+            merged.pop(i)
+            position = min(position, i)
+            current = Document(page_content=joined, metadata={**current.metadata, **other.metadata})
+            merges += 1
+            # The joined chunk may now overlap chunks checked before
+            i = 0
+        merged.insert(position, current)
+    return merged, merges
+
+
+def drop_duplicate_sentences(docs: List[Document], min_chars: int = MIN_DUPLICATE_CHARS) -> Tuple[List[Document], int]:
+    """
+    Removes sentences already present in a better-ranked chunk; chunks left empty are dropped.
+
+    Args:
+        docs (List[Document]): Chunks, best first.
+        min_chars (int, optional): Shorter sentences are always kept. Defaults to MIN_DUPLICATE_CHARS.
+
+    Returns:
+        Tuple[List[Document], int]: The remaining chunks and the number of sentences removed.
+    """
+    seen = set()
+    out = []
+    removed = 0
+    for doc in docs:
+        sentences = _SENTENCE_END.split(doc.page_content)
+        kept = []
+        for sentence in sentences:
+            key = " ".join(sentence.lower().split())
+            if len(key) >= min_chars and key in seen:
+                continue
+            seen.add(key)
+            kept.append(sentence)
+        removed += len(sentences) - len(kept)
+        text = doc.page_content if len(kept) == len(sentences) else "\n".join(s for s in kept if s.strip())
+        if text.strip():
+            out.append(Document(page_content=text, metadata=doc.metadata))
+    return out, removed
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts text to at most max_tokens estimated tokens, at the last sentence end if any.
+    """
+    limit = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    ends = [m.start() for m in _SENTENCE_END.finditer(head)]
+    return head[:ends[-1]].rstrip() if ends else head.rstrip()
+
+
+def pack_context(
+    docs: List[Document],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    min_overlap: int = MIN_OVERLAP_CHARS
+) -> List[Document]:
+    """
+    Merges overlapping chunks, removes duplicate sentences and packs the result, best
+    ranked first, into the token budget. Records the packing counters (packing_stats()).
+
+    Args:
+        docs (List[Document]): Retrieved chunks, best first.
+        token_budget (int, optional): Estimated tokens of context allowed; 0 or less means
+            no limit. Defaults to CONTEXT_TOKEN_BUDGET.
+        min_overlap (int, optional): Shortest overlap joined. Defaults to MIN_OVERLAP_CHARS.
+
+    Returns:
+        List[Document]: The chunks to put in the prompt, best first.
+    """
+    tokens_in = sum(estimate_tokens(doc.page_content) for doc in docs)
+    merged, merges = merge_overlapping(docs, min_overlap)
+    unique, _ = drop_duplicate_sentences(merged)
+
+    packed, used, truncated = [], 0, 0
+    for doc in unique:
+        tokens = estimate_tokens(doc.page_content)
+        left = token_budget - used if token_budget > 0 else tokens
+        if tokens > left:
+            if left < MIN_TRUNCATED_TOKENS:
+                # A smaller, lower-ranked chunk may still fit
+                continue
+            text = truncate_to_tokens(doc.page_content, left)
+            if not text:
+                continue
+            doc = Document(page_content=text, metadata=doc.metadata)
+            tokens = estimate_tokens(text)
+            truncated += 1
+        packed.append(doc)
+        used += tokens
+
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["chunks_in"] += len(docs)
+        _stats["chunks_out"] += len(packed)
+        _stats["merged"] += merges
+        _stats["truncated"] += truncated
+        _stats["dropped"] += len(unique) - len(packed)
+        _stats["tokens_in"] += tokens_in
+        _stats["tokens_out"] += used
+    return packed
+
+
+def packing_stats() -> Dict[str, float]:
+    """
+    Returns the packing counters of this process and the share of context tokens saved.
+    """
+    with _stats_lock:
+        saved = 1 - _stats["tokens_out"] / _stats["tokens_in"] if _stats["tokens_in"] else 0.0
+        return {**_stats, "tokens_saved": round(saved, 4)}
+
+
+class PackedRetriever(BaseRetriever):
+    """
+    Retriever wrapper returning the wrapped retriever's chunks packed by pack_context().
+    """
+
+    retriever: BaseRetriever
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    min_overlap: int = MIN_OVERLAP_CHARS
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        packed = pack_context(docs, self.token_budget, self.min_overlap)
+        debug_log(
+            f"Packed context: {len(docs)} chunks, {sum(estimate_tokens(d.page_content) for d in docs)} tokens -> "
+            f"{len(packed)} chunks, {sum(estimate_tokens(d.page_content) for d in packed)} tokens"
+        )
+        return packed
@@ -0,0 +1,151 @@
+# app/debate_evidence.py
+#
+# Per-debate evidence cache for retrieval-augmented debate turns. Evidence for the
+# debate topic is retrieved once, when the debate starts (in the background, while the
+# user prepares the opening argument). Each round then only retrieves for the new
+# argument, with a small k, and keeps the chunks not already held for the topic;
+# repeated arguments are answered from the cache. The evidence for a round is the
+# argument's chunks followed by the topic chunks, packed into a token budget. Failed
+# retrievals are not cached: the round goes without that evidence and the next one retries.
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from app.context_packing import pack_context
+
+# Chunks retrieved for the topic and for each argument
+TOPIC_K = 6
+ARGUMENT_K = 3
+
+# Estimated tokens of evidence per debate prompt
+EVIDENCE_TOKEN_BUDGET = 600
+
+# Arguments whose retrieval results are kept per debate
+MAX_ARGUMENTS = 64
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="debate-evidence")
+
+
+def _key(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class DebateEvidence:
+    """
+    Thread-safe evidence cache of one debate: topic evidence plus per-argument deltas.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        retrieve: Callable[[str, int], List[Document]],
+        topic_k: int = TOPIC_K,
+        argument_k: int = ARGUMENT_K,
+        token_budget: int = EVIDENCE_TOKEN_BUDGET,
+        max_arguments: int = MAX_ARGUMENTS
+    ) -> None:
+        """
+        Args:
+            topic (str): The debate topic, retrieved for once.
+            retrieve (Callable[[str, int], List[Document]]): Returns the k best chunks for a query.
+            topic_k (int, optional): Chunks retrieved for the topic. Defaults to TOPIC_K.
+            argument_k (int, optional): Chunks retrieved per argument. Defaults to ARGUMENT_K.
+            token_budget (int, optional): Estimated tokens of evidence per round. Defaults to EVIDENCE_TOKEN_BUDGET.
+            max_arguments (int, optional): Arguments cached before LRU eviction. Defaults to MAX_ARGUMENTS.
+        """
+        self.topic = topic
+        self.retrieve = retrieve
+        self.topic_k = topic_k
+        self.argument_k = argument_k
+        self.token_budget = token_budget
+        self.max_arguments = max_arguments
+        self._lock = threading.Lock()
+        self._topic: Optional[Future] = None
+        self._arguments: "OrderedDict[str, List[Document]]" = OrderedDict()
+        self._counters = {"topic_retrievals": 0, "argument_retrievals": 0, "argument_hits": 0, "duplicates_skipped": 0}
+
+    def prefetch(self) -> Future:
+        """
+        Starts retrieving the topic evidence in the background (once per debate, or
+        again after a failed attempt).
+
+        Returns:
+            Future: Resolves to the topic chunks, or raises the retrieval error.
+        """
+        with self._lock:
+            future = self._topic
+            started = future is None
+            if started:
+                future = self._topic = _executor.submit(self._retrieve_topic)
+        if started:
+            # Outside the lock: the callback runs at once if the retrieval already finished
+            future.add_done_callback(self._forget_failed_topic)
+        return future
+
+    def _retrieve_topic(self) -> List[Document]:
+        docs = self.retrieve(self.topic, self.topic_k)
+        with self._lock:
+            self._counters["topic_retrievals"] += 1
+        return docs
+
+    def _forget_failed_topic(self, future: Future) -> None:
+        if future.exception() is None:
+            return
+        print(f"[WARN] Topic evidence retrieval failed: {future.exception()}")
+        with self._lock:
+            if self._topic is future:
+                self._topic = None
+
+    def topic_evidence(self, timeout: Optional[float] = None) -> List[Document]:
+        """
+        Returns the topic chunks, or no chunks if their retrieval failed (it is retried
+        on the next call).
+        """
+        future = self.prefetch()
+        if future.exception(timeout) is not None:
+            return []
+        return future.result()
+
+    def for_argument(self, argument: str) -> List[Document]:
+        """
+        Returns the evidence for a round: the argument's chunks that are not part of the
+        topic evidence, then the topic chunks, packed into the token budget.
+
+        Args:
+            argument (str): The user's latest argument.
+
+        Returns:
+            List[Document]: The evidence, most specific first.
+        """
+        topic_docs = self.topic_evidence()
+        key = _key(argument)
+        with self._lock:
+            delta = self._arguments.get(key)
+            if delta is not None:
+                self._arguments.move_to_end(key)
+                self._counters["argument_hits"] += 1
+        if delta is None:
+            known = {doc.page_content for doc in topic_docs}
+            try:
+                # A few spare hits, so held chunks can be dropped without a second query
+                hits = self.retrieve(argument, 2 * self.argument_k)
+            except Exception as e:
+                # Not cached, so the argument is retrieved again if it comes back
+                print(f"[WARN] Argument evidence retrieval failed: {e}")
+                return pack_context(topic_docs, self.token_budget)
+            delta = [doc for doc in hits if doc.page_content not in known][:self.argument_k]
+            with self._lock:
+                self._counters["argument_retrievals"] += 1
+                self._counters["duplicates_skipped"] += sum(doc.page_content in known for doc in hits)
+                self._arguments[key] = delta
+                while len(self._arguments) > self.max_arguments:
+                    self._arguments.popitem(last=False)
+        return pack_context(delta + topic_docs, self.token_budget)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "arguments": len(self._arguments)}
@@ -0,0 +1,201 @@
+# app/debate_memory.py
+#
+# Bounded memory of a debate. The last `keep_turns` rounds stay verbatim; older rounds
+# are folded into a running summary. Folding runs in the background after each round
+# (one LLM call covering all rounds that left the verbatim window). Until a fold has
+# finished, the rounds waiting for it are represented by their first sentences. The
+# rendered history never exceeds `max_tokens` estimated tokens, so the prompt of round
+# 20 is no longer than the prompt of round 3.
+
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.context_packing import estimate_tokens, truncate_to_tokens
+from app.think_filter import strip_think
+
+# Rounds kept verbatim
+KEEP_TURNS = 2
+
+# Hard caps (estimated tokens) on the running summary and on the whole rendered history
+SUMMARY_TOKENS = 300
+HISTORY_TOKENS = 1200
+
+SUMMARY_PROMPT = (
+    "You keep the running summary of a debate on: \"{topic}\".\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New rounds:\n{rounds}\n\n"
+    "Rewrite the summary so it also covers the new rounds: the main claims, evidence and "
+    "concessions of each side, in at most {words} words. Reply with the summary only.\n"
+)
+
+# Folds of all debates run one at a time, off the request path
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debate-memory")
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.S)
+
+
+def first_sentence(text: str, max_tokens: int = 40) -> str:
+    """
+    Returns the first sentence of text, cut to max_tokens estimated tokens.
+    """
+    text = " ".join(text.split())
+    match = _FIRST_SENTENCE.match(text)
+    return truncate_to_tokens(match.group(1) if match else text, max_tokens)
+
+
+class DebateMemory:
+    """
+    Thread-safe rolling memory of one debate: recent rounds verbatim plus a running summary.
+    """
+
+    def __init__(
+        self,
+        topic: str = "",
+        summarize: Optional[Callable[[str], str]] = None,
+        keep_turns: int = KEEP_TURNS,
+        summary_tokens: int = SUMMARY_TOKENS,
+        max_tokens: int = HISTORY_TOKENS
+    ) -> None:
+        """
+        Args:
+            topic (str, optional): The debate topic, given to the summarizer. Defaults to "".
+            summarize (Optional[Callable[[str], str]], optional): Completes a prompt; used to
+                fold old rounds into the summary. Without it, or if it fails, rounds are
+                folded as their first sentences. Defaults to None.
+            keep_turns (int, optional): Rounds kept verbatim. Defaults to KEEP_TURNS.
+            summary_tokens (int, optional): Cap on the summary. Defaults to SUMMARY_TOKENS.
+            max_tokens (int, optional): Cap on the rendered history. Defaults to HISTORY_TOKENS.
+        """
+        self.topic = topic
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        # (round, user argument, debater response)
+        self._recent: List[Tuple[int, str, str]] = []
+        self._pending: List[Tuple[int, str, str]] = []
+        self._summary = ""
+        self._rounds = 0
+        self._fold: Optional[Future] = None
+        self._folding = False
+        self._counters = {"folds": 0, "folded_rounds": 0, "fallbacks": 0}
+
+    @property
+    def rounds(self) -> int:
+        return self._rounds
+
+    def add_turn(self, user_argument: str, response: str, background: bool = True) -> None:
+        """
+        Records a finished round. Rounds leaving the verbatim window are folded into the
+        summary, in the background by default.
+
+        Args:
+            user_argument (str): The user's argument.
+            response (str): The debater's response.
+            background (bool, optional): Whether to fold in the background rather than
+                before returning. Defaults to True.
+        """
+        with self._lock:
+            self._rounds += 1
+            self._recent.append((self._rounds, user_argument, response))
+            while len(self._recent) > self.keep_turns:
+                self._pending.append(self._recent.pop(0))
+            start = bool(self._pending) and not self._folding
+            if start:
+                self._folding = True
+        if not start:
+            return
+        if background:
+            self._fold = _executor.submit(self._run_fold)
+        else:
+            self._run_fold()
+
+    def _compress(self, rounds: List[Tuple[int, str, str]]) -> str:
+        return "\n".join(
+            f"Round {n}: user: {first_sentence(user)} Debater: {first_sentence(response)}"
+            for n, user, response in rounds
+        )
+
+    def _cap_summary(self, summary: str) -> str:
+        # Keep the most recent lines when an extractive summary outgrows the cap
+        lines = summary.strip().splitlines()
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return truncate_to_tokens("\n".join(lines), self.summary_tokens)
+
+    def _run_fold(self) -> None:
+        # Loops until no rounds are pending, so rounds added during a fold are not missed
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._folding = False
+                    return
+                rounds, summary = list(self._pending), self._summary
+            text = None
+            if self.summarize is not None:
+                prompt = SUMMARY_PROMPT.format(
+                    topic=self.topic,
+                    summary=summary or "(none yet)",
+                    rounds="\n".join(f"Round {n} user: {u}\nRound {n} debater: {r}" for n, u, r in rounds),
+                    words=int(self.summary_tokens * 0.75),
+                )
+                try:
+                    text = strip_think(self.summarize(prompt))
+                except Exception as e:
+                    print(f"[WARN] Debate summary failed, keeping first sentences: {e}")
+            if text:
+                summary = truncate_to_tokens(text, self.summary_tokens)
+            else:
+                summary = self._cap_summary(f"{summary}\n{self._compress(rounds)}")
+            with self._lock:
+                self._summary = summary
+                del self._pending[:len(rounds)]
+                self._counters["folds"] += 1
+                self._counters["folded_rounds"] += len(rounds)
+                if not text:
+                    self._counters["fallbacks"] += 1
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for the background fold, if any, to finish.
+        """
+        fold = self._fold
+        if fold is not None:
+            fold.result(timeout)
+
+    def sections(self) -> Tuple[str, str, str]:
+        """
+        Returns the history to put in the prompt, within max_tokens estimated tokens.
+
+        Returns:
+            Tuple[str, str, str]:
+                - summary: The running summary, plus first sentences of rounds not yet folded.
+                - user_recent: The recent user arguments, verbatim.
+                - llm_recent: The recent debater responses, verbatim (the oldest are cut
+                  if the cap requires it).
+        """
+        with self._lock:
+            summary, pending, recent = self._summary, list(self._pending), list(self._recent)
+        if pending:
+            summary = f"{summary}\n{self._cap_summary(self._compress(pending))}"
+        budget = self.max_tokens - estimate_tokens(summary)
+        user_points, llm_points = [], []
+        # Newest rounds first, so the cap cuts the oldest verbatim text
+        for n, user, response in reversed(recent):
+            user_text = truncate_to_tokens(user, max(0, budget))
+            budget -= estimate_tokens(user_text)
+            llm_text = truncate_to_tokens(response, max(0, budget))
+            budget -= estimate_tokens(llm_text)
+            if user_text:
+                user_points.insert(0, f"Round {n} user: {user_text}")
+            if llm_text:
+                llm_points.insert(0, f"Round {n} debater: {llm_text}")
+        return summary.strip(), "\n".join(user_points), "\n".join(llm_points)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._counters, "rounds": self._rounds, "pending": len(self._pending),
+                    "summary_tokens": estimate_tokens(self._summary)}
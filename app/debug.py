@@ -0,0 +1,18 @@
+# app/debug.py
+#
+# Opt-in diagnostic logging. Per-call timings and cache / reuse notices are printed only
+# when RAG_DEBUG=1, so a normal run logs nothing per question except warnings and
+# errors. The events themselves are counted by the stats functions (answer_cache_stats,
+# packing_stats, speculation_stats, ...) whatever the setting.
+
+import os
+
+RAG_DEBUG = os.environ.get("RAG_DEBUG", "0") == "1"
+
+
+def debug_log(message: str) -> None:
+    """
+    Prints `message` when RAG_DEBUG=1.
+    """
+    if RAG_DEBUG:
+        print(message)
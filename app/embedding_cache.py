@@ -0,0 +1,206 @@
+# app/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_PATH = os.path.join(ROOT_DIR, 'vector_context', 'embedding_cache.sqlite3')
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a text, used as the cache key alongside the model name.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, text hash), stored in SQLite.
+    Vectors are kept as packed float32. When the cache grows past max_entries,
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = 200_000) -> None:
+        """
+        Args:
+            path (str, optional): SQLite file location. Defaults to CACHE_PATH.
+            max_entries (int, optional): Maximum number of cached vectors. Defaults to 200,000.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Looks up cached vectors and marks the hits as recently used.
+
+        Args:
+            model (str): The embedding model name.
+            hashes (List[str]): Text hashes to look up.
+
+        Returns:
+            Dict[str, List[float]]: Cached vectors by text hash; misses are absent.
+        """
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """
+        Stores vectors and evicts the least recently used entries if the cache is full.
+
+        Args:
+            model (str): The embedding model name.
+            items (Dict[str, List[float]]): Vectors by text hash.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, key, array('f', vector).tobytes(), now) for key, vector in items.items()],
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with an EmbeddingCache, so each distinct text is embedded
+    once per model, across the index builder and the query path.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: Optional[EmbeddingCache] = None) -> None:
+        """
+        Args:
+            embeddings (Embeddings): The underlying embedding model, called on cache misses.
+            model (str): The model name, part of the cache key (make_embedding_model appends a
+                non-default server URL, so each server has its own entries).
+            cache (Optional[EmbeddingCache], optional): The cache to use. Defaults to one at CACHE_PATH.
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts, only sending cache misses to the underlying model.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: One vector per text, in input order.
+        """
+        if not texts:
+            return []
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model, hashes)
+
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self.cache.put_many(self.model, computed)
+            vectors.update(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [vectors[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, answering repeated queries from the cache.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            List[float]: The query vector.
+        """
+        key = text_hash(text)
+        cached = self.cache.get_many(self.model, [key])
+        with self._lock:
+            if key in cached:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if key in cached:
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model, {key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        """
+        Returns cache hit/miss counters for this wrapper.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,260 @@
+# app/embeddings.py
+
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+from app.embedding_cache import CachedEmbeddings
+from app.scheduler import MicroBatchingEmbeddings, embedding_scheduler
+
+EMBEDDING_MODEL = "deepseek-r1"
+
+
+class EmbeddingStats:
+    """
+    Thread-safe counters for an embedding stage: texts, requests, retries and busy time.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears all counters.
+        """
+        with self._lock:
+            self.texts = 0
+            self.requests = 0
+            self.retries = 0
+            self.failures = 0
+            self.seconds = 0.0
+
+    def record(self, texts: int = 0, requests: int = 0, retries: int = 0, failures: int = 0, seconds: float = 0.0) -> None:
+        """
+        Adds to the counters.
+        """
+        with self._lock:
+            self.texts += texts
+            self.requests += requests
+            self.retries += retries
+            self.failures += failures
+            self.seconds += seconds
+
+    @property
+    def chunks_per_second(self) -> float:
+        """
+        Embedding throughput over the wall-clock time spent in embed calls.
+        """
+        return self.texts / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Returns a snapshot of the counters.
+        """
+        with self._lock:
+            return {
+                "texts": self.texts,
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "seconds": round(self.seconds, 3),
+                "chunks_per_second": round(self.texts / self.seconds, 2) if self.seconds else 0.0,
+            }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model and embeds documents in fixed-size batches, with a bounded
+    number of batches in flight at once and retry with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 32,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5
+    ) -> None:
+        """
+        Args:
+            embeddings (Embeddings): The underlying embedding model.
+            batch_size (int, optional): Texts per embedding request. Defaults to 32.
+            max_workers (int, optional): Maximum concurrent in-flight requests. Defaults to 4.
+            max_retries (int, optional): Retries per failed request. Defaults to 3.
+            backoff (float, optional): Base delay in seconds before the first retry. Defaults to 0.5.
+        """
+        if batch_size < 1 or max_workers < 1:
+            raise ValueError("batch_size and max_workers must be at least 1")
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = EmbeddingStats()
+
+    def _with_retry(self, fn, *args):
+        """
+        Calls fn(*args), retrying with jittered exponential backoff on failure.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats.record(failures=1)
+                    raise
+                delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                print(f"[WARN] Embedding request failed ({e}); retrying in {delay:.2f}s")
+                self.stats.record(retries=1)
+                time.sleep(delay)
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        vectors = self._with_retry(self.embeddings.embed_documents, batch)
+        self.stats.record(requests=1)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts in batches of batch_size, at most max_workers batches at a time.
+        Results are returned in input order.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            List[List[float]]: One vector per text.
+        """
+        if not texts:
+            return []
+        start = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_workers == 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        self.stats.record(texts=len(texts), seconds=time.perf_counter() - start)
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a single query text, with retries.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            List[float]: The query vector.
+        """
+        start = time.perf_counter()
+        vector = self._with_retry(self.embeddings.embed_query, text)
+        self.stats.record(texts=1, requests=1, seconds=time.perf_counter() - start)
+        return vector
+
+
+class DeterministicEmbeddings(Embeddings):
+    """
+    Offline embedding function for benchmarks and stand-in servers: a signed
+    feature-hashing bag of words, L2-normalised. Texts sharing words get similar vectors,
+    and the same text always maps to the same vector.
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        """
+        Args:
+            size (int, optional): Vector dimensionality. Defaults to 256.
+        """
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def make_embedding_model(
+    model: str = EMBEDDING_MODEL,
+    base_url: Optional[str] = None,
+    batch_size: int = 32,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    cache: bool = True,
+    micro_batch_ms: float = 0.0
+) -> Embeddings:
+    """
+    Builds the Ollama embedding stage shared by the index builder and the query path:
+    an on-disk embedding cache in front of a batched, concurrent embedder.
+
+    Args:
+        model (str, optional): Ollama embedding model. Defaults to EMBEDDING_MODEL.
+        base_url (Optional[str], optional): Ollama server URL, e.g. a local stand-in server.
+            Defaults to None, which uses OLLAMA_HOST or the local default.
+        batch_size (int, optional): Texts per embedding request. Defaults to 32.
+        max_workers (int, optional): Maximum concurrent in-flight requests. Defaults to 4.
+        max_retries (int, optional): Retries per failed request. Defaults to 3.
+        cache (bool, optional): Whether to put the persistent embedding cache in front. Entries
+            are keyed by model and, when base_url is given, by server too. Defaults to True.
+        micro_batch_ms (float, optional): When positive, concurrent query embeddings that miss
+            the cache are batched for this many milliseconds and sent under the shared
+            embedding scheduler (see app/scheduler.py). Defaults to 0.0 (off).
+
+    Returns:
+        Embeddings: The embedding stage; a CachedEmbeddings wrapping a BatchedEmbeddings
+            when cache is True, otherwise the BatchedEmbeddings itself.
+    """
+    embedder = BatchedEmbeddings(
+        OllamaEmbeddings(model=model, base_url=base_url),
+        batch_size=batch_size,
+        max_workers=max_workers,
+        max_retries=max_retries,
+    )
+    if micro_batch_ms > 0:
+        embedder = MicroBatchingEmbeddings(embedder, micro_batch_ms, max_batch=batch_size, scheduler=embedding_scheduler)
+    if not cache:
+        return embedder
+    # Vectors from another server (e.g. the benchmark stand-in) must not answer real queries
+    cache_model = model if base_url is None else f"{model}@{base_url.rstrip('/')}"
+    return CachedEmbeddings(embedder, cache_model)
+
+
+def embedding_stats(embeddings: Embeddings) -> dict:
+    """
+    Collects the stats of an embedding stage built by make_embedding_model.
+
+    Args:
+        embeddings (Embeddings): The embedding stage.
+
+    Returns:
+        dict: Embedder counters, plus 'cache' hit/miss counters when a cache is in front
+            and 'micro_batch' counters when query micro-batching is on.
+    """
+    stats = {}
+    if isinstance(embeddings, CachedEmbeddings):
+        stats["cache"] = embeddings.stats()
+        embeddings = embeddings.embeddings
+    if isinstance(embeddings, MicroBatchingEmbeddings):
+        stats["micro_batch"] = embeddings.stats()
+        embeddings = embeddings.embeddings
+    if isinstance(embeddings, BatchedEmbeddings):
+        stats.update(embeddings.stats.as_dict())
+    return stats
@@ -0,0 +1,193 @@
+# app/http_client.py
+#
+# Shared HTTP client for the ElevenLabs API (TTS and STT). One requests.Session per
+# process keeps connections alive in a pool, so calls after the first skip the TCP and
+# TLS handshakes. Every request has connect and read timeouts, so a hung upload or
+# download fails instead of blocking a Streamlit run forever. Connection failures
+# (including connect timeouts) and 429/5xx responses are retried a bounded number of
+# times with jittered exponential backoff (honouring Retry-After); read timeouts are
+# not, as the server may already be working on the request. Latency, retries and
+# failures are recorded per endpoint.
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# ElevenLabs API root; point at a local stand-in (benchmarks/tts_server.py) for offline testing
+ELEVENLABS_BASE_URL = os.environ.get("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io").rstrip("/")
+
+# Seconds to establish a connection / between bytes received
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+
+# Retries after the first attempt, and the base delay before the first retry (seconds)
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF = 0.5
+
+# Longest delay taken from a Retry-After header (seconds)
+MAX_RETRY_AFTER = 30.0
+
+# Keep-alive connections kept per host
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HTTPClient:
+    """
+    Thread-safe pooled HTTP client with timeouts, bounded retry and per-endpoint latency stats.
+    """
+
+    def __init__(
+        self,
+        timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff: float = HTTP_BACKOFF,
+        pool_size: int = HTTP_POOL_SIZE,
+        latency_samples: int = 1000
+    ) -> None:
+        """
+        Args:
+            timeout (Tuple[float, float], optional): Default (connect, read) timeouts. Defaults to
+                (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT).
+            max_retries (int, optional): Retries after the first attempt. Defaults to HTTP_MAX_RETRIES.
+            backoff (float, optional): Base delay in seconds before the first retry. Defaults to HTTP_BACKOFF.
+            pool_size (int, optional): Keep-alive connections per host. Defaults to HTTP_POOL_SIZE.
+            latency_samples (int, optional): Recent latencies kept per endpoint for percentiles. Defaults to 1000.
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.latency_samples = latency_samples
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, dict] = {}
+
+    def _record(self, endpoint: str, seconds: Optional[float] = None, retries: int = 0, failed: bool = False) -> None:
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "requests": 0, "retries": 0, "failures": 0,
+                "latencies": deque(maxlen=self.latency_samples),
+            })
+            stats["requests"] += 1
+            stats["retries"] += retries
+            stats["failures"] += failed
+            if seconds is not None:
+                stats["latencies"].append(seconds)
+
+    def _delay(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def request(self, method: str, url: str, endpoint: Optional[str] = None, **kwargs: Any) -> requests.Response:
+        """
+        Sends a request through the shared session, retrying connection failures and
+        429/5xx responses. The last response is returned whatever its status; an
+        exception is raised only when no response was received.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            endpoint (Optional[str], optional): Name under which latency is recorded. Defaults
+                to the method and URL path.
+            **kwargs: Passed to requests.Session.request; `timeout` defaults to the client's.
+                Request bodies must be replayable (bytes, not open files) to be retried.
+
+        Returns:
+            requests.Response: The response. Its latency is the time to the response headers,
+            so for stream=True it does not include the body download.
+        """
+        if endpoint is None:
+            endpoint = f"{method.upper()} {urlparse(url).path}"
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            resp = None
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except requests.ReadTimeout:
+                self._record(endpoint, retries=attempt, failed=True)
+                raise
+            except requests.ConnectionError as e:
+                if attempt == self.max_retries:
+                    self._record(endpoint, retries=attempt, failed=True)
+                    raise
+                error = str(e)
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    self._record(endpoint, time.perf_counter() - start, retries=attempt, failed=resp.status_code >= 400)
+                    return resp
+                error = f"HTTP {resp.status_code}"
+            delay = self._delay(attempt, resp)
+            if resp is not None:
+                # Frees the connection for reuse
+                resp.close()
+            print(f"[WARN] {endpoint} failed ({error}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns per-endpoint request, retry and failure counts and latency percentiles
+        (including retries and backoff).
+        """
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                latencies = np.asarray(stats["latencies"]) * 1000
+                result[endpoint] = {
+                    "requests": stats["requests"],
+                    "retries": stats["retries"],
+                    "failures": stats["failures"],
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else 0.0,
+                    "p95_ms": round(float(np.percentile(latencies, 95)), 3) if len(latencies) else 0.0,
+                    "max_ms": round(float(latencies.max()), 3) if len(latencies) else 0.0,
+                }
+            return result
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[HTTPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """
+    Returns the process-wide HTTP client.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HTTPClient()
+    return _client
+
+
+def http_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Returns the per-endpoint stats of the process-wide client.
+    """
+    return get_http_client().stats()
@@ -0,0 +1,439 @@
+# app/ingest.py
+#
+# Streaming ingestion of document directories into a vector store:
+#
+#   walk files -> read in bounded blocks -> split -> embed -> upsert (in flushes)
+#
+# Every stage is a generator, so peak memory is bounded by the read block size and
+# the flush size rather than by the corpus. Chunks are content-addressed, and an
+# SQLite manifest tracks which chunk ids belong to which source file version. That
+# makes rebuilds incremental and lets an interrupted run resume where it stopped.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.vectorstores import VectorStore
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SOURCE_EXTENSIONS = ('.txt', '.md', '.markdown')
+BLOCK_CHARS = 64 * 1024
+FLUSH_SIZE = 256
+
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Returns the content-addressed id of a chunk.
+
+    Args:
+        source (str): The source key (path relative to the repository root).
+        text (str): The chunk text.
+
+    Returns:
+        str: Hex SHA-256 digest of the source and chunk text.
+    """
+    return hashlib.sha256(f"{source}\0{text}".encode('utf-8')).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """
+    Returns the SHA-256 digest of a file, read in blocks.
+
+    Args:
+        path (str): Path of the file to hash.
+
+    Returns:
+        str: Hex SHA-256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(path: str) -> str:
+    """
+    Returns the manifest key of a source file: its path relative to the repository root.
+    """
+    return os.path.relpath(os.path.abspath(path), ROOT_DIR).replace(os.sep, '/')
+
+
+class IndexManifest:
+    """
+    SQLite record of what is in the vector store: one row per source file (with the
+    digest of the version being indexed and whether indexing it completed) and one row
+    per chunk id (with the source digest it was last seen in).
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): SQLite file location.
+        """
+        self.path = path
+        self.is_new = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " key TEXT PRIMARY KEY, sha256 TEXT NOT NULL, complete INTEGER NOT NULL, seen_run REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, source TEXT NOT NULL, sha256 TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source, sha256);"
+        )
+        self._conn.commit()
+
+    def import_json(self, json_path: str) -> int:
+        """
+        Imports a JSON manifest written by earlier versions of the builder.
+
+        Args:
+            json_path (str): Path of the JSON manifest.
+
+        Returns:
+            int: The number of chunk ids imported.
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            sources = json.load(f).get("sources", {})
+        count = 0
+        for key, entry in sources.items():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (key, sha256, complete, seen_run) VALUES (?, ?, 1, 0)",
+                (key, entry["sha256"]),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, source, sha256) VALUES (?, ?, ?)",
+                [(i, key, entry["sha256"]) for i in entry["chunks"]],
+            )
+            count += len(entry["chunks"])
+        self._conn.commit()
+        return count
+
+    def source_state(self, key: str) -> Optional[Tuple[str, bool]]:
+        """
+        Returns (sha256, complete) for a source, or None if it was never indexed.
+        """
+        row = self._conn.execute("SELECT sha256, complete FROM sources WHERE key = ?", (key,)).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def mark_seen(self, key: str, run: float) -> None:
+        self._conn.execute("UPDATE sources SET seen_run = ? WHERE key = ?", (run, key))
+        self._conn.commit()
+
+    def begin_source(self, key: str, sha256: str, run: float) -> None:
+        """
+        Records that a new version of a source is being indexed.
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sources (key, sha256, complete, seen_run) VALUES (?, ?, 0, ?)",
+            (key, sha256, run),
+        )
+        self._conn.commit()
+
+    def known_ids(self, ids: List[str]) -> set:
+        """
+        Returns the subset of ids that are already in the vector store.
+        """
+        if not ids:
+            return set()
+        rows = self._conn.execute(
+            f"SELECT id FROM chunks WHERE id IN ({','.join('?' * len(ids))})", ids
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def record_chunks(self, key: str, sha256: str, ids: List[str]) -> None:
+        """
+        Records chunk ids as present in the given source version.
+        """
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, source, sha256) VALUES (?, ?, ?)",
+            [(i, key, sha256) for i in ids],
+        )
+        self._conn.commit()
+
+    def iter_stale_ids(self, key: str, sha256: Optional[str] = None, batch_size: int = 500) -> Iterator[List[str]]:
+        """
+        Yields, in batches, the chunk ids of a source not seen in the given version
+        (or all of its ids if sha256 is None).
+        """
+        while True:
+            if sha256 is None:
+                rows = self._conn.execute(
+                    "SELECT id FROM chunks WHERE source = ? LIMIT ?", (key, batch_size)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id FROM chunks WHERE source = ? AND sha256 != ? LIMIT ?", (key, sha256, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+
+    def forget_chunks(self, ids: List[str]) -> None:
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+        self._conn.commit()
+
+    def finish_source(self, key: str) -> None:
+        self._conn.execute("UPDATE sources SET complete = 1 WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def unseen_sources(self, run: float) -> List[str]:
+        """
+        Returns the keys of sources that were not found during the given run.
+        """
+        return [row[0] for row in self._conn.execute("SELECT key FROM sources WHERE seen_run != ?", (run,))]
+
+    def forget_source(self, key: str) -> None:
+        self._conn.execute("DELETE FROM sources WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def all_ids(self) -> set:
+        return {row[0] for row in self._conn.execute("SELECT id FROM chunks")}
+
+    def counts(self) -> Tuple[int, int]:
+        """
+        Returns the number of indexed sources and chunks.
+        """
+        sources = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        chunks = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return sources, chunks
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def iter_source_files(paths: Iterable[str], extensions: Tuple[str, ...] = SOURCE_EXTENSIONS) -> Iterator[str]:
+    """
+    Yields the text/markdown files under the given files and directories, in a stable order.
+
+    Args:
+        paths (Iterable[str]): Files and/or directories to ingest.
+        extensions (Tuple[str, ...], optional): File extensions to include. Defaults to SOURCE_EXTENSIONS.
+
+    Yields:
+        str: Path of each source file.
+
+    Raises:
+        FileNotFoundError: If a path does not exist.
+        OSError: If a directory cannot be listed.
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Source not found: {path}")
+
+        def fail(error: OSError) -> None:
+            raise error
+
+        # os.walk skips unreadable directories silently; their sources would look removed
+        for dirpath, dirnames, filenames in os.walk(path, onerror=fail):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(extensions):
+                    yield os.path.join(dirpath, name)
+
+
+def iter_text_blocks(path: str, block_chars: int = BLOCK_CHARS) -> Iterator[str]:
+    """
+    Reads a text file in blocks of roughly block_chars, cut at paragraph boundaries where
+    possible, so arbitrarily large files never have to fit in memory at once.
+
+    Args:
+        path (str): Path of the file to read.
+        block_chars (int, optional): Target block size in characters. Defaults to BLOCK_CHARS.
+
+    Yields:
+        str: Consecutive blocks of the file.
+    """
+    lines, size = [], 0
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            lines.append(line)
+            size += len(line)
+            if (size >= block_chars and not line.strip()) or size >= 2 * block_chars:
+                yield ''.join(lines)
+                lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_chunks(
+    path: str,
+    text_splitter: RecursiveCharacterTextSplitter,
+    block_chars: int = BLOCK_CHARS
+) -> Iterator[Tuple[str, Document]]:
+    """
+    Splits a source file into content-addressed chunks, block by block.
+    Identical chunks within a block are yielded once; repeats across blocks are
+    deduplicated by id when flushed.
+
+    Args:
+        path (str): Path of the source file.
+        text_splitter (RecursiveCharacterTextSplitter): The splitter to use.
+        block_chars (int, optional): Read block size in characters. Defaults to BLOCK_CHARS.
+
+    Yields:
+        Tuple[str, Document]: The chunk id and chunk document.
+    """
+    key = source_key(path)
+    for block in iter_text_blocks(path, block_chars):
+        seen = set()
+        for doc in text_splitter.create_documents([block], metadatas=[{"source": key}]):
+            doc_id = chunk_id(key, doc.page_content)
+            if doc_id not in seen:
+                seen.add(doc_id)
+                yield doc_id, doc
+
+
+class IngestStats:
+    """
+    Progress counters for one ingestion run.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.files_seen = 0
+        self.files_indexed = 0
+        self.chunks_embedded = 0
+        self.chunks_reused = 0
+        self.chunks_deleted = 0
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.chunks_embedded / elapsed if elapsed else 0.0
+        return (
+            f"{self.files_seen} files scanned, {self.files_indexed} indexed, "
+            f"{self.chunks_embedded} chunks embedded ({rate:.1f}/sec), "
+            f"{self.chunks_reused} unchanged, {self.chunks_deleted} deleted, {elapsed:.1f}s"
+        )
+
+
+def _flush(vector_db: VectorStore, manifest: IndexManifest, key: str, sha256: str, pending: List[Tuple[str, Document]], stats: IngestStats) -> None:
+    """
+    Embeds and upserts the pending chunks of one source, then records them in the manifest.
+    The vector store upserts by id, so replaying a flush after a crash is harmless.
+    """
+    if not pending:
+        return
+    ids = list(dict.fromkeys(i for i, _ in pending))
+    known = manifest.known_ids(ids)
+    new = {i: d for i, d in pending if i not in known}
+    if new:
+        vector_db.add_documents(list(new.values()), ids=list(new))
+    manifest.record_chunks(key, sha256, ids)
+    stats.chunks_embedded += len(new)
+    stats.chunks_reused += len(known)
+    pending.clear()
+
+
+def _delete_stale(vector_db: VectorStore, manifest: IndexManifest, key: str, sha256: Optional[str], stats: IngestStats) -> None:
+    for ids in manifest.iter_stale_ids(key, sha256):
+        vector_db.delete(ids=ids)
+        manifest.forget_chunks(ids)
+        stats.chunks_deleted += len(ids)
+
+
+def ingest(
+    paths: Iterable[str],
+    vector_db: VectorStore,
+    manifest: IndexManifest,
+    text_splitter: RecursiveCharacterTextSplitter,
+    flush_size: int = FLUSH_SIZE,
+    block_chars: int = BLOCK_CHARS,
+    progress_every: int = 100
+) -> IngestStats:
+    """
+    Streams files into the vector store, embedding only chunks the manifest has not seen
+    and deleting chunks (and whole sources) that no longer exist.
+
+    Each file is tracked as in progress until all of its chunks are upserted, and the
+    manifest is committed after every flush. Re-running after an interruption skips
+    completed files and, within a partially indexed file, every chunk already upserted.
+
+    Args:
+        paths (Iterable[str]): Files and/or directories to ingest.
+        vector_db (VectorStore): The store to upsert into; must support add_documents(ids=...) and delete(ids=...).
+        manifest (IndexManifest): The index manifest.
+        text_splitter (RecursiveCharacterTextSplitter): The splitter to use.
+        flush_size (int, optional): Chunks embedded and upserted per flush. Defaults to FLUSH_SIZE.
+        block_chars (int, optional): Read block size in characters. Defaults to BLOCK_CHARS.
+        progress_every (int, optional): Print progress every this many files. Defaults to 100.
+
+    Returns:
+        IngestStats: Counters for the run.
+
+    Raises:
+        FileNotFoundError: If a path does not exist. Nothing is indexed or removed, as
+            every source under a mistyped path would otherwise be removed from the index.
+    """
+    paths = list(paths)
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Source not found: {', '.join(missing)}")
+    run = time.time()
+    stats = IngestStats()
+
+    for path in iter_source_files(paths):
+        key = source_key(path)
+        digest = file_sha256(path)
+        state = manifest.source_state(key)
+        stats.files_seen += 1
+
+        if state and state == (digest, True):
+            manifest.mark_seen(key, run)
+        else:
+            if not state or state[0] != digest:
+                manifest.begin_source(key, digest, run)
+            else:
+                manifest.mark_seen(key, run)
+                print(f"{key}: resuming interrupted indexing")
+
+            pending = []
+            for item in iter_chunks(path, text_splitter, block_chars):
+                pending.append(item)
+                if len(pending) >= flush_size:
+                    _flush(vector_db, manifest, key, digest, pending, stats)
+            _flush(vector_db, manifest, key, digest, pending, stats)
+
+            _delete_stale(vector_db, manifest, key, digest, stats)
+            manifest.finish_source(key)
+            stats.files_indexed += 1
+
+        if stats.files_seen % progress_every == 0:
+            print(f"[ingest] {stats.report()}")
+
+    for key in manifest.unseen_sources(run):
+        _delete_stale(vector_db, manifest, key, None, stats)
+        manifest.forget_source(key)
+        print(f"{key}: source removed")
+
+    print(f"[ingest] {stats.report()}")
+    return stats
+
+
+def purge_untracked(vector_db: VectorStore, manifest: IndexManifest) -> int:
+    """
+    Deletes vectors the manifest does not know about, e.g. duplicates appended
+    by full rebuilds made before the manifest existed.
+
+    Args:
+        vector_db (VectorStore): A Chroma store to clean.
+        manifest (IndexManifest): The current manifest.
+
+    Returns:
+        int: The number of vectors deleted.
+    """
+    tracked = manifest.all_ids()
+    untracked = [i for i in vector_db.get(include=[])["ids"] if i not in tracked]
+    for i in range(0, len(untracked), 500):
+        vector_db.delete(ids=untracked[i:i + 500])
+    return len(untracked)
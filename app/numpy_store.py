@@ -0,0 +1,421 @@
+# app/numpy_store.py
+#
+# Exact-search vector store over a memory-mapped float32 matrix.
+#
+# Layout of a store directory:
+#   vectors.f32   N x D float32 rows, L2-normalised (cosine similarity = dot product)
+#   offsets.i64   N x 2 int64 (byte offset, length) of each row's record in docs.jsonl
+#   docs.jsonl    one {"text", "metadata"} JSON record per row
+#   ids.txt       one id per line, in row order
+#   meta.json     {"dim", "count", "deleted": [row, ...], "generation"}
+#
+# Opening a store only reads meta.json and maps the two binary files, so cold start
+# is independent of corpus size. Deletes are tombstones; the files are compacted once
+# a quarter of the rows are dead. Compaction renumbers rows, so it gives the store a
+# new "generation"; indexes derived from the rows (app/ann_index.py) record it.
+#
+#   python -m app.numpy_store export                      # vector_context -> vector_context/numpy
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CHROMA_DIR = os.path.join(ROOT_DIR, 'vector_context')
+NUMPY_STORE_DIR = os.path.join(CHROMA_DIR, 'numpy')
+
+VECTORS_FILE = 'vectors.f32'
+OFFSETS_FILE = 'offsets.i64'
+DOCS_FILE = 'docs.jsonl'
+IDS_FILE = 'ids.txt'
+META_FILE = 'meta.json'
+
+COMPACT_RATIO = 0.25
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Returns float32 copies of the rows scaled to unit L2 norm (zero rows are left as is).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores, best first, using argpartition
+    so the cost is linear in len(scores).
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    LangChain vector store doing exact cosine search with a single matmul over a
+    memory-mapped float32 matrix, followed by an argpartition top-k.
+    """
+
+    def __init__(self, persist_directory: str = NUMPY_STORE_DIR, embedding_function: Optional[Embeddings] = None) -> None:
+        """
+        Args:
+            persist_directory (str, optional): The store directory. Defaults to NUMPY_STORE_DIR.
+            embedding_function (Optional[Embeddings], optional): Embeds queries and added texts.
+        """
+        self.persist_directory = persist_directory
+        self._embedding_function = embedding_function
+        self._lock = threading.RLock()
+        self._id_rows: Optional[Dict[str, int]] = None
+        self._docs_file = None
+        os.makedirs(persist_directory, exist_ok=True)
+        self._load()
+
+    # ——— persistence ———
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _load(self) -> None:
+        meta_path = self._path(META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        else:
+            meta = {"dim": None, "count": 0, "deleted": [], "generation": uuid.uuid4().hex}
+        self.dim = meta["dim"]
+        self.generation = meta["generation"]
+        self.count = meta["count"]
+        if self.count:
+            self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode='r', shape=(self.count, self.dim))
+            self._offsets = np.memmap(self._path(OFFSETS_FILE), dtype=np.int64, mode='r', shape=(self.count, 2))
+        else:
+            self._vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._offsets = np.zeros((0, 2), dtype=np.int64)
+        self._dead = np.zeros(self.count, dtype=bool)
+        self._dead[meta["deleted"]] = True
+        if self._docs_file:
+            self._docs_file.close()
+        self._docs_file = open(self._path(DOCS_FILE), 'rb') if self.count else None
+
+    def _save_meta(self) -> None:
+        tmp_path = self._path(META_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "dim": self.dim,
+                "count": self.count,
+                "deleted": np.flatnonzero(self._dead).tolist(),
+                "generation": self.generation,
+            }, f)
+        os.replace(tmp_path, self._path(META_FILE))
+
+    def _all_ids(self) -> List[str]:
+        if not self.count:
+            return []
+        with open(self._path(IDS_FILE), 'r', encoding='utf-8') as f:
+            # Rows past the committed count are leftovers of an interrupted add_vectors
+            return [line.rstrip('\n') for _, line in zip(range(self.count), f)]
+
+    def _truncate_uncommitted(self) -> None:
+        # add_vectors appends to the data files before it commits meta.json; after a crash
+        # in between, drop the extra rows so new rows line up with ids and tombstones again.
+        # Done by the writer only: a reader could cut rows a writer has not committed yet.
+        docs_end = int(self._offsets[-1].sum()) if self.count else 0
+        sizes = {
+            DOCS_FILE: docs_end,
+            VECTORS_FILE: self.count * (self.dim or 0) * 4,
+            OFFSETS_FILE: self.count * 16,
+        }
+        if all(os.path.getsize(self._path(name)) == size for name, size in sizes.items() if os.path.exists(self._path(name))):
+            return
+        print(f"[WARN] Dropping uncommitted rows from {self.persist_directory}")
+        for name, size in sizes.items():
+            if os.path.exists(self._path(name)):
+                os.truncate(self._path(name), size)
+        if os.path.exists(self._path(IDS_FILE)):
+            ids = self._all_ids()
+            with open(self._path(IDS_FILE), 'w', encoding='utf-8') as f:
+                f.writelines(f"{i}\n" for i in ids)
+
+    def _rows_by_id(self) -> Dict[str, int]:
+        if self._id_rows is None:
+            self._id_rows = {i: row for row, i in enumerate(self._all_ids()) if not self._dead[row]}
+        return self._id_rows
+
+    def add_vectors(
+        self,
+        vectors: np.ndarray,
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Appends precomputed vectors with their texts. Existing ids are replaced.
+
+        Args:
+            vectors (np.ndarray): N x D vectors; normalised before storing.
+            texts (List[str]): The N texts.
+            metadatas (Optional[List[dict]], optional): Per-text metadata.
+            ids (Optional[List[str]], optional): Per-text ids. Defaults to random UUIDs.
+
+        Returns:
+            List[str]: The ids of the added rows.
+        """
+        vectors = normalize_rows(vectors)
+        if not len(texts):
+            return []
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            rows = self._rows_by_id()
+            self._mark_dead([rows.pop(i) for i in ids if i in rows])
+            self._truncate_uncommitted()
+
+            docs_path = self._path(DOCS_FILE)
+            position = os.path.getsize(docs_path) if os.path.exists(docs_path) else 0
+            offsets = np.empty((len(texts), 2), dtype=np.int64)
+            with open(docs_path, 'ab') as f:
+                for n, (text, metadata) in enumerate(zip(texts, metadatas)):
+                    record = json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False).encode('utf-8') + b'\n'
+                    f.write(record)
+                    offsets[n] = (position, len(record))
+                    position += len(record)
+            with open(self._path(VECTORS_FILE), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._path(OFFSETS_FILE), 'ab') as f:
+                f.write(offsets.tobytes())
+            with open(self._path(IDS_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(f"{i}\n" for i in ids)
+
+            dead = np.flatnonzero(self._dead)
+            self.count += len(texts)
+            self._dead = np.zeros(self.count, dtype=bool)
+            self._dead[dead] = True
+            for n, i in enumerate(ids):
+                rows[i] = self.count - len(texts) + n
+            self._save_meta()
+            self._load()
+        return ids
+
+    def _mark_dead(self, rows: List[int]) -> None:
+        if rows:
+            self._dead[rows] = True
+
+    def compact(self) -> None:
+        """
+        Rewrites the store without deleted rows.
+        """
+        with self._lock:
+            alive = np.flatnonzero(~self._dead)
+            tmp_dir = self.persist_directory.rstrip(os.sep) + '.compact'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            compacted = NumpyVectorStore(tmp_dir, self._embedding_function)
+            ids = self._all_ids()
+            for start in range(0, len(alive), 4096):
+                rows = alive[start:start + 4096]
+                records = [self._record(row) for row in rows]
+                compacted.add_vectors(
+                    np.asarray(self._vectors[rows]),
+                    [r["text"] for r in records],
+                    [r["metadata"] for r in records],
+                    [ids[row] for row in rows],
+                )
+            compacted.close()
+            self.close()
+            backup_dir = self.persist_directory.rstrip(os.sep) + '.old'
+            os.replace(self.persist_directory, backup_dir)
+            os.replace(tmp_dir, self.persist_directory)
+            shutil.rmtree(backup_dir)
+            self._id_rows = None
+            self._load()
+
+    def close(self) -> None:
+        """
+        Releases the open file handles.
+        """
+        if self._docs_file:
+            self._docs_file.close()
+            self._docs_file = None
+        self._vectors = self._offsets = None
+
+    # ——— lookup ———
+
+    def _record(self, row: int) -> Dict[str, Any]:
+        offset, length = self._offsets[row]
+        with self._lock:
+            self._docs_file.seek(int(offset))
+            return json.loads(self._docs_file.read(int(length)))
+
+    def _document(self, row: int) -> Document:
+        record = self._record(row)
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def search_vectors(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top-k search for a normalised query vector.
+
+        Args:
+            query (np.ndarray): The D-dimensional query vector.
+            k (int): Number of results.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and cosine similarities, best first.
+        """
+        if not self.count:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self._vectors @ np.asarray(query, dtype=np.float32)
+        if self._dead.any():
+            scores[self._dead] = -np.inf
+            k = min(k, int((~self._dead).sum()))
+        rows = top_k(scores, k)
+        return rows, scores[rows]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        rows, scores = self.search_vectors(normalize_rows(embedding), k)
+        return [(self._document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k most similar documents with their cosine similarity (higher is closer).
+        """
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities
+        return lambda score: score
+
+    # ——— VectorStore interface ———
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding_function
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Deletes rows by id, compacting the files once enough rows are dead.
+        """
+        if not ids:
+            return None
+        with self._lock:
+            rows = self._rows_by_id()
+            self._mark_dead([rows.pop(i) for i in ids if i in rows])
+            self._save_meta()
+            if self.count and self._dead.sum() > COMPACT_RATIO * self.count:
+                self.compact()
+        return True
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        rows = self._rows_by_id()
+        return [self._document(rows[i]) for i in ids if i in rows]
+
+    def iter_rows(self, batch_size: int = 4096):
+        """
+        Yields (ids, vectors, documents) for the live rows, in batches.
+        """
+        ids = self._all_ids()
+        alive = np.flatnonzero(~self._dead)
+        for start in range(0, len(alive), batch_size):
+            rows = alive[start:start + batch_size]
+            yield [ids[row] for row in rows], np.asarray(self._vectors[rows]), [self._document(row) for row in rows]
+
+    def __len__(self) -> int:
+        return int(self.count - self._dead.sum())
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = NUMPY_STORE_DIR,
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        store = cls(persist_directory, embedding)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+
+def export_chroma(chroma_dir: str = CHROMA_DIR, out_dir: str = NUMPY_STORE_DIR, batch_size: int = 1000) -> int:
+    """
+    Converts a persisted Chroma collection into a NumpyVectorStore, reusing the stored
+    embeddings (nothing is re-embedded). The export is written to a temporary directory
+    and swapped in at the end, so a running app never sees a half-written store.
+
+    Args:
+        chroma_dir (str, optional): The Chroma persist directory. Defaults to CHROMA_DIR.
+        out_dir (str, optional): The NumPy store directory. Defaults to NUMPY_STORE_DIR.
+        batch_size (int, optional): Rows read from Chroma per page. Defaults to 1000.
+
+    Returns:
+        int: The number of rows exported.
+    """
+    from langchain_community.vectorstores import Chroma
+
+    chroma = Chroma(persist_directory=chroma_dir)
+    tmp_dir = out_dir.rstrip(os.sep) + '.export'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    store = NumpyVectorStore(tmp_dir)
+
+    offset = 0
+    while True:
+        page = chroma.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        store.add_vectors(np.asarray(page["embeddings"], dtype=np.float32), page["documents"], page["metadatas"], page["ids"])
+        offset += len(page["ids"])
+    store.close()
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return offset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NumPy vector store tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Convert a Chroma collection into a NumPy store")
+    export.add_argument("--chroma-dir", default=CHROMA_DIR)
+    export.add_argument("--out-dir", default=NUMPY_STORE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = export_chroma(args.chroma_dir, args.out_dir)
+        print(f"Exported {count} vectors from {args.chroma_dir} to {args.out_dir}")
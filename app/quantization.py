@@ -0,0 +1,421 @@
+# app/quantization.py
+#
+# Quantized vector storage for the NumPy store: scalar int8 (1 byte per dimension)
+# or product quantization (1 byte per subvector). Only the codes are held in RAM;
+# the full-precision matrix stays memory-mapped on disk and is touched only when the
+# top candidates are re-ranked exactly.
+#
+# Layout of a quantized index directory (default vector_context/quantized/<mode>):
+#   codes.npy      N x D int8 (int8) or N x M uint8 (pq)
+#   params.npz     per-dimension offset/scale (int8) or M x 256 x D/M codebooks (pq)
+#   meta.json      {"mode", "dim", "count", "generation", "m"}
+#
+#   python -m app.quantization build --mode int8
+#   python -m app.quantization build --mode pq --m 64
+#   python -m app.quantization report --k 10
+
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.numpy_store import CHROMA_DIR, NUMPY_STORE_DIR, NumpyVectorStore, normalize_rows, top_k
+
+QUANTIZED_DIR = os.path.join(CHROMA_DIR, 'quantized')
+
+RERANK_FACTOR = 4
+# Rows dequantized per block while scoring: small enough for the block to stay in cache
+SCORE_BLOCK = 2048
+ENCODE_BLOCK = 65536
+
+
+def _kmeans(x: np.ndarray, k: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """
+    Euclidean k-means (Lloyd) returning k x D float32 centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=len(x) < k)].copy()
+    for _ in range(iterations):
+        distances = (centroids ** 2).sum(1) - 2 * x @ centroids.T
+        assign = np.argmin(distances, axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        order = np.argsort(assign, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(x[order], starts[filled], axis=0)
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters with random points
+        centroids[~filled] = x[rng.choice(len(x), size=int((~filled).sum()))]
+    return centroids.astype(np.float32)
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension affine int8 quantization: x ~= (code + 128) * scale + offset.
+    """
+
+    def __init__(self, offset: np.ndarray, scale: np.ndarray) -> None:
+        self.offset = offset.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def train(cls, sample: np.ndarray) -> "ScalarQuantizer":
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        return cls(low, np.maximum(high - low, 1e-12) / 255)
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(x, dtype=np.float32) - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) + 128) * self.scale + self.offset
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate dot products of the query with every encoded row, computed in blocks.
+        """
+        weights = self.scale * query
+        constant = float((128 * self.scale + self.offset) @ query)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK):
+            out[start:start + SCORE_BLOCK] = codes[start:start + SCORE_BLOCK].astype(np.float32) @ weights + constant
+        return out
+
+    def save(self, path: str) -> None:
+        np.savez(path, offset=self.offset, scale=self.scale)
+
+    @classmethod
+    def load(cls, path: str) -> "ScalarQuantizer":
+        params = np.load(path)
+        return cls(params["offset"], params["scale"])
+
+
+class ProductQuantizer:
+    """
+    Splits vectors into m subvectors and encodes each as the index of its nearest of
+    256 sub-centroids. Queries use asymmetric distance computation: one m x 256 lookup
+    table of query/centroid dot products per query, summed over the codes.
+    """
+
+    def __init__(self, codebooks: np.ndarray, dim: int) -> None:
+        """
+        Args:
+            codebooks (np.ndarray): m x 256 x (padded_dim / m) sub-centroids.
+            dim (int): The original (unpadded) dimensionality.
+        """
+        self.codebooks = codebooks.astype(np.float32)
+        self.m = codebooks.shape[0]
+        self.dim = dim
+
+    def _split(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        sub = self.codebooks.shape[2]
+        pad = self.m * sub - x.shape[-1]
+        if pad:
+            x = np.pad(x, [(0, 0)] * (x.ndim - 1) + [(0, pad)])
+        return x.reshape(*x.shape[:-1], self.m, sub)
+
+    @classmethod
+    def train(cls, sample: np.ndarray, m: int, iterations: int = 15, seed: int = 0) -> "ProductQuantizer":
+        dim = sample.shape[1]
+        sub = -(-dim // m)
+        quantizer = cls(np.zeros((m, 256, sub), dtype=np.float32), dim)
+        parts = quantizer._split(sample)
+        quantizer.codebooks = np.stack([_kmeans(parts[:, j], 256, iterations, seed + j) for j in range(m)])
+        return quantizer
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        parts = self._split(x)
+        codes = np.empty((len(parts), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            book = self.codebooks[j]
+            codes[:, j] = np.argmin((book ** 2).sum(1) - 2 * parts[:, j] @ book.T, axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.m), codes]
+        return parts.reshape(len(codes), -1)[:, :self.dim]
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        table = np.einsum('mkd,md->mk', self.codebooks, self._split(query))
+        out = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.m):
+            out += table[j][codes[:, j]]
+        return out
+
+    def save(self, path: str) -> None:
+        np.savez(path, codebooks=self.codebooks, dim=self.dim)
+
+    @classmethod
+    def load(cls, path: str) -> "ProductQuantizer":
+        params = np.load(path)
+        return cls(params["codebooks"], int(params["dim"]))
+
+
+class QuantizedIndex:
+    """
+    A persisted set of quantized codes for the rows of a NumpyVectorStore.
+    """
+
+    def __init__(self, index_directory: str) -> None:
+        with open(os.path.join(index_directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.index_directory = index_directory
+        self.mode, self.dim, self.count, self.generation = meta["mode"], meta["dim"], meta["count"], meta["generation"]
+        params = os.path.join(index_directory, 'params.npz')
+        self.quantizer = ScalarQuantizer.load(params) if self.mode == "int8" else ProductQuantizer.load(params)
+        # Codes are loaded into RAM: they are the resident part of the index
+        self.codes = np.load(os.path.join(index_directory, 'codes.npy'))
+
+    @classmethod
+    def build(
+        cls,
+        store: NumpyVectorStore,
+        mode: str = "int8",
+        index_directory: Optional[str] = None,
+        m: Optional[int] = None,
+        sample_size: int = 16384,
+        seed: int = 0
+    ) -> "QuantizedIndex":
+        """
+        Trains a quantizer on a sample of the store and encodes every row.
+
+        Args:
+            store (NumpyVectorStore): The store to quantize.
+            mode (str, optional): "int8" or "pq". Defaults to "int8".
+            index_directory (Optional[str], optional): Where to write the codes.
+                Defaults to QUANTIZED_DIR/<mode>.
+            m (Optional[int], optional): PQ subvectors (bytes per vector). Defaults to dim / 8.
+            sample_size (int, optional): Training rows. Defaults to 16384.
+            seed (int, optional): Random seed. Defaults to 0.
+
+        Returns:
+            QuantizedIndex: The new index.
+        """
+        if mode not in ("int8", "pq"):
+            raise ValueError(f"Unknown quantization mode {mode!r}; expected 'int8' or 'pq'")
+        if not store.count:
+            raise ValueError("Cannot quantize an empty store")
+        index_directory = index_directory or os.path.join(QUANTIZED_DIR, mode)
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(store.count, size=min(store.count, sample_size), replace=False))
+        sample = np.asarray(store._vectors[rows])
+
+        if mode == "int8":
+            quantizer = ScalarQuantizer.train(sample)
+        else:
+            m = m or max(1, store.dim // 8)
+            quantizer = ProductQuantizer.train(sample, m, seed=seed)
+
+        tmp_dir = index_directory.rstrip(os.sep) + '.build'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        codes = np.concatenate([
+            quantizer.encode(np.asarray(store._vectors[start:start + ENCODE_BLOCK]))
+            for start in range(0, store.count, ENCODE_BLOCK)
+        ])
+        np.save(os.path.join(tmp_dir, 'codes.npy'), codes)
+        quantizer.save(os.path.join(tmp_dir, 'params.npz'))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({"mode": mode, "dim": store.dim, "count": store.count, "generation": store.generation,
+                       "m": getattr(quantizer, "m", None)}, f)
+
+        shutil.rmtree(index_directory, ignore_errors=True)
+        os.makedirs(os.path.dirname(index_directory), exist_ok=True)
+        os.replace(tmp_dir, index_directory)
+        return cls(index_directory)
+
+    def matches(self, store: NumpyVectorStore) -> bool:
+        return self.generation == store.generation and self.dim == store.dim and self.count <= store.count
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+
+def quantized_search(
+    store: NumpyVectorStore,
+    index: QuantizedIndex,
+    query: np.ndarray,
+    k: int,
+    rerank: bool = True,
+    rerank_factor: int = RERANK_FACTOR
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k search over the quantized codes. With rerank, the best k * rerank_factor
+    candidates are re-scored exactly against the memory-mapped full-precision rows.
+    Rows appended since the codes were built are scored exactly; deleted rows are skipped.
+
+    Args:
+        store (NumpyVectorStore): The store the codes were built over.
+        index (QuantizedIndex): The quantized codes.
+        query (np.ndarray): A unit-norm query vector.
+        k (int): Number of results.
+        rerank (bool, optional): Re-rank candidates at full precision. Defaults to True.
+        rerank_factor (int, optional): Candidates re-ranked per result. Defaults to RERANK_FACTOR.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Store rows and scores, best first.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    scores = index.quantizer.scores(index.codes, query)
+    if store.count > index.count:
+        scores = np.concatenate([scores, store._vectors[index.count:] @ query])
+    alive = len(scores)
+    if store._dead.any():
+        scores[store._dead] = -np.inf
+        alive = int((~store._dead).sum())
+        k = min(k, alive)
+    if not rerank:
+        rows = top_k(scores, k)
+        return rows, scores[rows]
+    candidates = np.sort(top_k(scores, min(k * rerank_factor, alive)))
+    exact = np.asarray(store._vectors[candidates]) @ query
+    best = top_k(exact, k)
+    return candidates[best], exact[best]
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore whose searches run over int8 or PQ codes, optionally re-ranking
+    the top candidates at full precision. Falls back to exact search (with a warning)
+    when the codes are missing or stale.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = NUMPY_STORE_DIR,
+        embedding_function: Optional[Embeddings] = None,
+        mode: str = "int8",
+        index_directory: Optional[str] = None,
+        rerank: bool = True,
+        rerank_factor: int = RERANK_FACTOR
+    ) -> None:
+        """
+        Args:
+            persist_directory (str, optional): The NumPy store directory. Defaults to NUMPY_STORE_DIR.
+            embedding_function (Optional[Embeddings], optional): Embeds queries and added texts.
+            mode (str, optional): "int8" or "pq". Defaults to "int8".
+            index_directory (Optional[str], optional): The codes directory. Defaults to QUANTIZED_DIR/<mode>.
+            rerank (bool, optional): Re-rank candidates at full precision. Defaults to True.
+            rerank_factor (int, optional): Candidates re-ranked per result. Defaults to RERANK_FACTOR.
+        """
+        super().__init__(persist_directory, embedding_function)
+        index_directory = index_directory or os.path.join(QUANTIZED_DIR, mode)
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
+        self.index = None
+        if os.path.exists(os.path.join(index_directory, 'meta.json')):
+            self.index = QuantizedIndex(index_directory)
+        if not self.index or not self.index.matches(self):
+            print(f"[WARN] No up-to-date {mode} codes in {index_directory}; using exact search. "
+                  f"Build them with `python -m app.quantization build --mode {mode}`.")
+            self.index = None
+
+    def search_vectors(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.index is None or not self.index.matches(self):
+            return super().search_vectors(query, k)
+        return quantized_search(self, self.index, query, k, self.rerank, self.rerank_factor)
+
+
+def _chroma_footprint(chroma_dir: str) -> int:
+    """
+    Bytes of the HNSW segment files Chroma loads into memory (vectors plus graph links).
+    """
+    total = 0
+    for entry in os.scandir(chroma_dir):
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, 'data_level0.bin')):
+            total += sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+    return total
+
+
+def quantization_report(
+    store: NumpyVectorStore,
+    indexes: List[QuantizedIndex],
+    k: int = 10,
+    num_queries: int = 200,
+    noise: float = 0.05,
+    chroma_dir: Optional[str] = CHROMA_DIR,
+    seed: int = 0
+) -> List[dict]:
+    """
+    Reports resident memory, recall@k against exact float32 search, and latency for
+    each quantized index, with and without full-precision re-ranking.
+
+    Args:
+        store (NumpyVectorStore): The full-precision store (exported from Chroma).
+        indexes (List[QuantizedIndex]): The quantized indexes to evaluate.
+        k (int, optional): Result count. Defaults to 10.
+        num_queries (int, optional): Stored vectors, perturbed, used as queries. Defaults to 200.
+        noise (float, optional): Noise scale for the queries. Defaults to 0.05.
+        chroma_dir (Optional[str], optional): Chroma directory to measure. Defaults to CHROMA_DIR.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        List[dict]: One row per setting with bytes/vector, memory saved, recall@k and p50 latency.
+    """
+    rng = np.random.default_rng(seed)
+    alive = np.flatnonzero(~store._dead)
+    picks = np.sort(rng.choice(alive, size=min(num_queries, len(alive)), replace=False))
+    sampled = np.asarray(store._vectors[picks])
+    queries = normalize_rows(sampled + rng.normal(scale=noise / np.sqrt(store.dim), size=sampled.shape))
+
+    def run(search):
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(set(search(query).tolist()))
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results, float(np.percentile(latencies, 50))
+
+    exact, exact_ms = run(lambda q: NumpyVectorStore.search_vectors(store, q, k)[0])
+    float_bytes = store.count * store.dim * 4
+    report = [{"setting": "float32 (exact)", "bytes_per_vector": store.dim * 4, "resident_mb": round(float_bytes / 2**20, 2),
+               "saved": 0.0, "recall": 1.0, "p50_ms": round(exact_ms, 3)}]
+    chroma_bytes = _chroma_footprint(chroma_dir) if chroma_dir and os.path.isdir(chroma_dir) else 0
+    if chroma_bytes:
+        report.insert(0, {"setting": "chroma (hnsw segment)", "resident_mb": round(chroma_bytes / 2**20, 2)})
+    baseline = chroma_bytes or float_bytes
+
+    for index in indexes:
+        for rerank in (False, True):
+            results, p50 = run(lambda q: quantized_search(store, index, q, k, rerank)[0])
+            hits = sum(len(a & e) for a, e in zip(results, exact))
+            report.append({
+                "setting": f"{index.mode}{f' m={index.quantizer.m}' if index.mode == 'pq' else ''}{' + rerank' if rerank else ''}",
+                "bytes_per_vector": round(index.nbytes / index.count, 1),
+                "resident_mb": round(index.nbytes / 2**20, 2),
+                "saved": round(1 - index.nbytes / baseline, 4),
+                "recall": round(hits / max(1, sum(len(e) for e in exact)), 4),
+                "p50_ms": round(p50, 3),
+            })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantized vector storage tools.")
+    parser.add_argument("--store-dir", default=NUMPY_STORE_DIR, help="NumPy store to quantize")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Train a quantizer and encode the store")
+    build.add_argument("--mode", choices=["int8", "pq"], default="int8")
+    build.add_argument("--m", type=int, default=None, help="PQ subvectors, i.e. bytes per vector (default dim/8)")
+    report = sub.add_parser("report", help="Memory saved and recall lost versus full precision and Chroma")
+    report.add_argument("--k", type=int, default=10)
+    report.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    store = NumpyVectorStore(args.store_dir)
+    if args.command == "build":
+        index = QuantizedIndex.build(store, args.mode, m=args.m)
+        print(f"Encoded {index.count} vectors as {args.mode} ({index.nbytes / index.count:.0f} bytes/vector) "
+              f"-> {index.index_directory}")
+    else:
+        built = [QuantizedIndex(os.path.join(QUANTIZED_DIR, mode)) for mode in ("int8", "pq")
+                 if os.path.exists(os.path.join(QUANTIZED_DIR, mode, 'meta.json'))]
+        print(json.dumps(quantization_report(store, built, k=args.k, num_queries=args.queries), indent=1))
@@ -1,55 +1,587 @@
-from langchain_ollama import OllamaEmbeddings, OllamaLLM
-from langchain_community.vectorstores import Chroma
+import time
+
+_IMPORT_START = time.perf_counter()
+
+from langchain_ollama import OllamaLLM
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.prompts import format_document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
 from langchain.chains import RetrievalQA
 
-from typing import List, Tuple
+from app.context_packing import CONTEXT_TOKEN_BUDGET, PackedRetriever
+from app.debate_evidence import DebateEvidence
+from app.debug import debug_log
+from app.answer_cache import read_index_version
+from app.debate_memory import DebateMemory
+from app.embedding_cache import CachedEmbeddings
+from app.embeddings import embedding_stats, make_embedding_model
+from app.speculative import SPECULATIVE_GENERATION, Speculation
+from app.scheduler import EMBED_BATCH_WINDOW_MS, current_session, embedding_scheduler, generation_scheduler, session_scope
+from app.think_filter import filter_stream, strip_think
+
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+VECTOR_DB_DIR = "./vector_context"
+NUMPY_STORE_DIR = os.path.join(VECTOR_DB_DIR, "numpy")
+IVF_INDEX_DIR = os.path.join(VECTOR_DB_DIR, "ivf")
+QUANTIZED_DIR = os.path.join(VECTOR_DB_DIR, "quantized")
+BM25_INDEX_DIR = os.path.join(VECTOR_DB_DIR, "bm25")
+
+# Vector store backend used by load_db(); "chroma", "numpy", "ivf", "int8" or "pq"
+VECTOR_DB_BACKEND = os.environ.get("VECTOR_DB_BACKEND", "chroma")
+
+LLM_MODEL = "deepseek-r1"
+
+# Connection pool of each cached Ollama client; connections are kept alive between questions
+LLM_POOL_LIMITS = {"max_connections": 16, "max_keepalive_connections": 8, "keepalive_expiry": 300.0}
+
+# Semantic answer cache in front of llm_response_sit/finance; disable with ANSWER_CACHE=0
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+
+# Ground medical debate turns in the vector store; opt-in with DEBATE_RETRIEVAL=1, for a
+# store that holds debate material (the default one is the SIT corpus)
+DEBATE_RETRIEVAL_ENABLED = os.environ.get("DEBATE_RETRIEVAL", "0") == "1"
+
+# Relevance score (0-1) below which retrieved chunks are not used as debate evidence
+DEBATE_EVIDENCE_MIN_RELEVANCE = float(os.environ.get("DEBATE_EVIDENCE_MIN_RELEVANCE", "0.5"))
+
+# "hybrid" fuses vector and BM25 retrieval when a BM25 index has been built; "vector" disables it
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+
+
+def _load_chroma(embedding_model: Embeddings, **kwargs) -> VectorStore:
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(persist_directory=kwargs.get("persist_directory", VECTOR_DB_DIR), embedding_function=embedding_model)
+
 
-def load_db() -> Chroma:
+def _load_numpy(embedding_model: Embeddings, **kwargs) -> VectorStore:
+    from app.numpy_store import NumpyVectorStore
+
+    return NumpyVectorStore(kwargs.get("persist_directory", NUMPY_STORE_DIR), embedding_model)
+
+
+def _load_ivf(embedding_model: Embeddings, **kwargs) -> VectorStore:
+    from app.ann_index import IVFVectorStore, NPROBE
+
+    return IVFVectorStore(
+        kwargs.get("persist_directory", NUMPY_STORE_DIR),
+        embedding_model,
+        index_directory=kwargs.get("index_directory", IVF_INDEX_DIR),
+        nprobe=kwargs.get("nprobe", NPROBE),
+    )
+
+
+def _load_quantized(mode: str) -> Callable[..., VectorStore]:
+    def load(embedding_model: Embeddings, **kwargs) -> VectorStore:
+        from app.quantization import QuantizedVectorStore, RERANK_FACTOR
+
+        return QuantizedVectorStore(
+            kwargs.get("persist_directory", NUMPY_STORE_DIR),
+            embedding_model,
+            mode=mode,
+            index_directory=kwargs.get("index_directory", os.path.join(QUANTIZED_DIR, mode)),
+            rerank=kwargs.get("rerank", True),
+            rerank_factor=kwargs.get("rerank_factor", RERANK_FACTOR),
+        )
+    return load
+
+
+# Registered vector store backends: name -> loader(embedding_model, **kwargs)
+VECTOR_STORE_BACKENDS: Dict[str, Callable[..., VectorStore]] = {
+    "chroma": _load_chroma,
+    "numpy": _load_numpy,
+    "ivf": _load_ivf,
+    "int8": _load_quantized("int8"),
+    "pq": _load_quantized("pq"),
+}
+
+
+def register_vector_store(name: str, loader: Callable[..., VectorStore]) -> None:
     """
-    Loads the existing Chroma vector database using the specified embedding model.
-    
+    Registers a vector store backend selectable through load_db(backend=name).
+
+    Args:
+        name (str): The backend name.
+        loader (Callable[..., VectorStore]): Called as loader(embedding_model, **kwargs) and
+            returning a LangChain VectorStore.
+    """
+    VECTOR_STORE_BACKENDS[name] = loader
+
+
+def load_db(backend: str = VECTOR_DB_BACKEND, **kwargs) -> VectorStore:
+    """
+    Loads the existing vector database using the specified embedding model.
+    Query embeddings go through the persistent embedding cache, so repeated questions
+    (including the fixed system prompts) skip the embedding round-trip.
+
+    Args:
+        backend (str, optional): The vector store backend, one of VECTOR_STORE_BACKENDS.
+            Defaults to VECTOR_DB_BACKEND ("chroma" unless set in the environment).
+            "numpy" is an exact-search memory-mapped store exported with
+            `python -m app.numpy_store export`; "ivf" searches the same store through an
+            approximate index built with `python -m app.ann_index build`; "int8" and "pq"
+            search quantized codes built with `python -m app.quantization build`.
+        **kwargs: Backend-specific options, e.g. persist_directory, index_directory and
+            nprobe (lists scanned per query) for "ivf", or rerank and rerank_factor
+            (full-precision re-ranking of the top candidates) for "int8"/"pq".
+
     Returns:
-        Chroma: The loaded Chroma vector database instance.
+        VectorStore: The loaded vector database instance.
     """
-    embedding_model = OllamaEmbeddings(model="deepseek-r1")  # Change model as needed
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unknown vector store backend {backend!r}; expected one of {sorted(VECTOR_STORE_BACKENDS)}")
+
+    # Concurrent query embeddings from all sessions are micro-batched into shared requests
+    embedding_model = make_embedding_model(model="deepseek-r1", micro_batch_ms=EMBED_BATCH_WINDOW_MS)  # Change model as needed
 
     # Load the existing vector database
-    vector_db = Chroma(persist_directory="./vector_context", embedding_function=embedding_model)
+    start = time.perf_counter()
+    vector_db = VECTOR_STORE_BACKENDS[backend](embedding_model, **kwargs)
 
     print("Vector database loaded successfully!")
+    debug_log(f"Loaded the {backend} vector database in {(time.perf_counter() - start) * 1000:.0f} ms")
     return vector_db
 
 
-def query_llm(vector_db: Chroma, query: str) -> str:
+_vector_db: Optional[VectorStore] = None
+_vector_db_lock = threading.Lock()
+
+
+def get_vector_db() -> VectorStore:
+    """
+    Returns the process-wide vector database, loading it on first use. Safe to call from
+    several threads (e.g. concurrent Streamlit sessions): only the first caller loads.
+
+    Returns:
+        VectorStore: The shared vector database.
+    """
+    global _vector_db
+    if _vector_db is None:
+        with _vector_db_lock:
+            if _vector_db is None:
+                _vector_db = load_db()
+    return _vector_db
+
+
+def warm_up_vector_db(background: bool = False) -> Optional[threading.Thread]:
+    """
+    Loads the vector database and the BM25 index and runs one dummy query, so the
+    embedding model, the index files and any lazy backend state are ready before the
+    first real question. The query bypasses the embedding cache so Ollama loads the model.
+
+    Args:
+        background (bool, optional): Run in a daemon thread and return it. Defaults to False.
+
+    Returns:
+        Optional[threading.Thread]: The warm-up thread when background is True.
+    """
+    def run() -> None:
+        start = time.perf_counter()
+        try:
+            vector_db = get_vector_db()
+            embeddings = vector_db.embeddings
+            if isinstance(embeddings, CachedEmbeddings):
+                # A cached "warm-up" vector would never load the Ollama embedding model
+                embeddings = embeddings.embeddings
+            vector_db.similarity_search_by_vector(embeddings.embed_query("warm-up"), k=1)
+            load_bm25()
+        except Exception as e:
+            print(f"[WARN] Vector database warm-up failed: {e}")
+            return
+        debug_log(f"Vector database warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, name="vector-db-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def __getattr__(name: str):
+    # `rag_pipeline.vector_db` used to be loaded at import; keep it available, lazily
+    if name == "vector_db":
+        return get_vector_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_bm25_index = None
+_bm25_stamp = None
+_bm25_lock = threading.Lock()
+
+
+def _bm25_version() -> Optional[tuple]:
+    try:
+        mtime = os.stat(os.path.join(BM25_INDEX_DIR, "meta.json")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return mtime, read_index_version()
+
+
+def load_bm25():
+    """
+    Loads the BM25 index written by the index builder, or returns None if there is none.
+    The index is reloaded when the builder replaces it (meta.json's mtime or the index
+    version stamp changes).
+
+    Returns:
+        Optional[BM25Index]: The lexical index.
+    """
+    global _bm25_index, _bm25_stamp
+    stamp = _bm25_version()
+    if stamp != _bm25_stamp:
+        with _bm25_lock:
+            if stamp != _bm25_stamp:
+                if stamp is None:
+                    _bm25_index = None
+                else:
+                    from app.bm25 import BM25Index
+
+                    _bm25_index = BM25Index(BM25_INDEX_DIR)
+                # The next get_qa_chain replaces the chains built on the previous index
+                _bm25_stamp = stamp
+    return _bm25_index
+
+
+def question_text(prompt: str) -> str:
+    """
+    Returns the user question of a prompt built as "<system prompt>Question: <question>",
+    so lexical search matches on the question rather than on the fixed instructions.
+    """
+    return prompt.rsplit("Question: ", 1)[-1]
+
+
+def get_retriever(
+    vector_db: VectorStore,
+    k: int = 4,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    mode: Optional[str] = None,
+    bm25=None
+) -> BaseRetriever:
+    """
+    Returns the retriever used by query_llm: reciprocal-rank fusion of vector search and
+    BM25 in "hybrid" mode (when a BM25 index exists), plain vector search otherwise.
+    Its chunks are merged where they overlap, deduplicated and packed into the token
+    budget (see app/context_packing.py) before they are stuffed into the prompt.
+
+    Args:
+        vector_db (VectorStore): The vector database to search.
+        k (int, optional): Number of chunks to retrieve. Defaults to 4.
+        token_budget (int, optional): Estimated tokens of context per prompt; 0 for no limit.
+            Defaults to CONTEXT_TOKEN_BUDGET.
+        mode (Optional[str], optional): "hybrid" or "vector". Defaults to RETRIEVAL_MODE.
+        bm25 (Optional[BM25Index], optional): The lexical index for hybrid mode, e.g. one
+            built elsewhere by a benchmark. Defaults to load_bm25().
+
+    Returns:
+        BaseRetriever: The retriever.
+    """
+    if (mode or RETRIEVAL_MODE) != "hybrid":
+        bm25 = None
+    elif bm25 is None:
+        bm25 = load_bm25()
+    if bm25 is None:
+        retriever = vector_db.as_retriever(search_kwargs={"k": k})
+    else:
+        from app.bm25 import HybridRetriever
+
+        retriever = HybridRetriever(vector_store=vector_db, bm25=bm25, k=k, lexical_query=question_text)
+    return PackedRetriever(retriever=retriever, token_budget=token_budget)
+
+
+_llm_cache: Dict[tuple, OllamaLLM] = {}
+_chain_cache: Dict[tuple, Tuple[VectorStore, object, RetrievalQA]] = {}
+_llm_cache_lock = threading.Lock()
+
+
+def new_llm(model: str = LLM_MODEL, **options) -> OllamaLLM:
+    """
+    Returns a new Ollama LLM client with a pool of HTTP connections to the Ollama server.
+    Most callers want the shared client from get_llm().
+
+    Args:
+        model (str, optional): The Ollama model. Defaults to LLM_MODEL.
+        **options: Further OllamaLLM fields (e.g. temperature, keep_alive, base_url).
+
+    Returns:
+        OllamaLLM: The client.
+    """
+    import httpx
+
+    return OllamaLLM(model=model, client_kwargs={"limits": httpx.Limits(**LLM_POOL_LIMITS)}, **options)
+
+
+def get_llm(model: str = LLM_MODEL, **options) -> OllamaLLM:
+    """
+    Returns a process-wide Ollama LLM client for the model and options, creating it on
+    first use. Cached clients keep a pool of HTTP connections to the Ollama server.
+
+    Args:
+        model (str, optional): The Ollama model. Defaults to LLM_MODEL.
+        **options: Further OllamaLLM fields (e.g. temperature, keep_alive, base_url); part of the key.
+
+    Returns:
+        OllamaLLM: The shared client.
+    """
+    key = (model, tuple(sorted(options.items())))
+    llm = _llm_cache.get(key)
+    if llm is None:
+        with _llm_cache_lock:
+            llm = _llm_cache.get(key)
+            if llm is None:
+                llm = new_llm(model, **options)
+                _llm_cache[key] = llm
+    return llm
+
+
+def get_qa_chain(vector_db: VectorStore, model: str = LLM_MODEL, chain_type: str = "stuff", k: int = 4) -> RetrievalQA:
+    """
+    Returns a cached RetrievalQA chain over the vector database. One chain is kept per
+    model, chain type and retriever configuration (retrieval mode, k and context token
+    budget); it is replaced when called with another vector store or after the BM25 index
+    is reloaded, so superseded chains and indexes are freed.
+
+    Args:
+        vector_db (VectorStore): The vector database to retrieve from.
+        model (str, optional): The Ollama model. Defaults to LLM_MODEL.
+        chain_type (str, optional): The RetrievalQA chain type. Defaults to "stuff".
+        k (int, optional): Number of chunks to retrieve. Defaults to 4.
+
+    Returns:
+        RetrievalQA: The shared chain.
+    """
+    bm25 = load_bm25() if RETRIEVAL_MODE == "hybrid" else None
+    key = (model, chain_type, RETRIEVAL_MODE, k, CONTEXT_TOKEN_BUDGET)
+    entry = _chain_cache.get(key)
+    if entry is None or entry[0] is not vector_db or entry[1] is not bm25:
+        llm = get_llm(model)
+        with _llm_cache_lock:
+            entry = _chain_cache.get(key)
+            if entry is None or entry[0] is not vector_db or entry[1] is not bm25:
+                chain = RetrievalQA.from_chain_type(llm=llm, chain_type=chain_type, retriever=get_retriever(vector_db, k))
+                entry = _chain_cache[key] = (vector_db, bm25, chain)
+    return entry[2]
+
+
+def query_llm(vector_db: VectorStore, query: str) -> str:
     """
     Queries the LLM using a RetrievalQA chain with the provided vector database and query string.
     
     Args:
-        vector_db (Chroma): The vector database to use for retrieval.
+        vector_db (VectorStore): The vector database to use for retrieval.
         query (str): The query string to send to the LLM.
     
     Returns:
         str: The processed response from the LLM.
     """
-    # Load the LLM
-    llm = OllamaLLM(model="deepseek-r1")
-    # Create a RetrievalQA chain
-    qa_chain = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", retriever=vector_db.as_retriever())
-    response = qa_chain.invoke({'query': query})
-    # Remove <think>...</think> if present in the response
-    import re
+    # Reuse the LLM client and RetrievalQA chain across calls
+    qa_chain = get_qa_chain(vector_db)
+    # Identical concurrent questions share one generation; others queue fairly per session
+    response = generation_scheduler.run(("qa", id(qa_chain), query), lambda: qa_chain.invoke({'query': query}))
     if isinstance(response, dict) and "result" in response:
         result = response["result"]
     else:
         result = response
     # Remove <think>...</think> tags and their content
-    result = re.sub(r'<think>.*?</think>', '', result, flags=re.DOTALL).strip()
+    result = strip_think(result)
     print("\nLLM Response in rag_pipeline:")
     print(result)
     return result
 
 
-vector_db = load_db()
+def stuff_prompt(qa_chain: RetrievalQA, docs: List[Document], question: str) -> str:
+    """
+    Formats the prompt a "stuff" RetrievalQA chain would send for the given documents,
+    so streamed answers use exactly the same prompt as query_llm.
+    """
+    stuff = qa_chain.combine_documents_chain
+    context = stuff.document_separator.join(format_document(doc, stuff.document_prompt) for doc in docs)
+    return stuff.llm_chain.prompt.format(**{stuff.document_variable_name: context, "question": question})
+
+
+def stream_llm(
+    prompt: str,
+    model: str = LLM_MODEL,
+    start: Optional[float] = None,
+    on_reasoning: Optional[Callable[[str], None]] = None
+) -> Iterator[str]:
+    """
+    Streams the visible answer tokens of a completion, logging time to first visible
+    token and total time.
+
+    Args:
+        prompt (str): The full prompt.
+        model (str, optional): The Ollama model. Defaults to LLM_MODEL.
+        start (Optional[float], optional): perf_counter() when the request began, so the
+            logged latency includes retrieval. Defaults to now.
+        on_reasoning (Optional[Callable[[str], None]], optional): Receives the filtered-out
+            <think> reasoning as it streams, for debugging. Defaults to None.
+
+    Yields:
+        str: Answer tokens as they arrive.
+    """
+    start = start or time.perf_counter()
+    first = None
+    with generation_scheduler.slot():
+        for token in filter_stream(get_llm(model).stream(prompt), on_reasoning):
+            if first is None:
+                first = time.perf_counter() - start
+                debug_log(f"Time to first visible token: {first * 1000:.0f} ms")
+            yield token
+    debug_log(f"Streamed response in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def stream_query_llm(
+    vector_db: VectorStore,
+    query: str,
+    on_reasoning: Optional[Callable[[str], None]] = None,
+    speculation: Optional[Speculation] = None
+) -> Iterator[str]:
+    """
+    Streaming variant of query_llm: retrieves with the cached chain's retriever and
+    yields answer tokens as they arrive, with the reasoning block removed.
+
+    Args:
+        vector_db (VectorStore): The vector database to use for retrieval.
+        query (str): The query string to send to the LLM.
+        on_reasoning (Optional[Callable[[str], None]], optional): Receives the reasoning stream. Defaults to None.
+        speculation (Optional[Speculation], optional): Work started for an earlier version of
+            the query (see speculate_sit); used if the query is unchanged or nearly so,
+            cancelled otherwise. Defaults to None.
+
+    Yields:
+        str: Answer tokens.
+    """
+    start = time.perf_counter()
+    qa_chain = get_qa_chain(vector_db)
+    docs = None
+    if speculation is not None:
+        # The speculation was started for the bare question, without the system prompt
+        question = question_text(query)
+        if speculation.generating and speculation.same_question(question):
+            debug_log("Reusing the speculative answer")
+            yield from speculation.stream()
+            return
+        speculation.cancel_generation()
+        if speculation.matches(question):
+            try:
+                docs = speculation.docs()
+                debug_log(f"Reusing speculative retrieval ({len(docs)} chunks)")
+            except Exception as e:
+                print(f"[WARN] Speculative retrieval failed, retrieving again: {e}")
+        else:
+            speculation.cancel()
+    if docs is None:
+        docs = qa_chain.retriever.invoke(query)
+    yield from stream_llm(stuff_prompt(qa_chain, docs, query), start=start, on_reasoning=on_reasoning)
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    """
+    Returns the process-wide semantic answer cache, or None when disabled. Questions are
+    embedded with the vector database's (cached) embedding model.
+
+    Returns:
+        Optional[SemanticAnswerCache]: The shared cache.
+    """
+    global _answer_cache
+    if _answer_cache is None and ANSWER_CACHE_ENABLED:
+        with _llm_cache_lock:
+            if _answer_cache is None:
+                from app.answer_cache import SemanticAnswerCache
+
+                _answer_cache = SemanticAnswerCache(
+                    get_vector_db().embeddings,
+                    threshold=ANSWER_CACHE_THRESHOLD,
+                    ttl=ANSWER_CACHE_TTL,
+                )
+    return _answer_cache
+
+
+def answer_cache_stats() -> Dict[str, float]:
+    """
+    Returns the answer cache metrics (hits, misses, hit_rate, seconds_saved, ...), empty when disabled.
+    """
+    return _answer_cache.stats() if _answer_cache is not None else {}
+
+
+def scheduler_stats() -> Dict[str, dict]:
+    """
+    Returns queue depth, wait-time and coalescing metrics of the Ollama schedulers, plus
+    the query embedding micro-batching counters once the vector database is loaded.
+    """
+    stats = {"generation": generation_scheduler.stats(), "embedding": embedding_scheduler.stats()}
+    if _vector_db is not None and _vector_db.embeddings is not None:
+        stats["embedding"].update(embedding_stats(_vector_db.embeddings).get("micro_batch", {}))
+    return stats
+
+
+def cached_answer(namespace: str, question: str, generate: Callable[[], str]) -> str:
+    """
+    Returns a cached answer to a semantically equivalent earlier question, or generates,
+    caches and returns a new one.
+
+    Args:
+        namespace (str): The kind of question, e.g. "sit"; answers are not shared across kinds.
+        question (str): The user question (without system prompt).
+        generate (Callable[[], str]): Produces the answer on a miss.
+
+    Returns:
+        str: The answer.
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        return generate()
+    vector = cache.embed(question)
+    answer = cache.get(namespace, vector)
+    if answer is None:
+        start = time.perf_counter()
+        answer = generate()
+        cache.put(namespace, question, vector, answer, time.perf_counter() - start)
+    return answer
+
+
+def stream_cached_answer(namespace: str, question: str, generate: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """
+    Streaming counterpart of cached_answer: a hit is yielded whole, a miss is streamed
+    and cached once the stream completes.
+    """
+    cache = get_answer_cache()
+    if cache is None:
+        yield from generate()
+        return
+    vector = cache.embed(question)
+    answer = cache.get(namespace, vector)
+    if answer is not None:
+        yield answer
+        return
+    start, parts = time.perf_counter(), []
+    for token in generate():
+        parts.append(token)
+        yield token
+    cache.put(namespace, question, vector, "".join(parts).strip(), time.perf_counter() - start)
+
+
+FINANCE_SYSTEM_PROMPT = (
+    "You are a financial expert. Use the information from the provided documents and your financial knowledge to answer the following question as accurately and concisely as possible. "
+    "If the answer is not present in the documents, say so.\n\nQuestion: "
+)
+
+SIT_SYSTEM_PROMPT = (
+    "You are an expert on the Singapore Institute of Technology (SIT). Use the information from the provided documents and your knowledge to answer the following question as accurately and concisely as possible. "
+    "If the answer is not present in the documents, say so.\n\nQuestion: "
+)
+
 
 def llm_response_finance(query: str) -> str:
     """
@@ -62,12 +594,8 @@ def llm_response_finance(query: str) -> str:
         str: The LLM's response to the financial query.
     """
     # Add a financial knowledge prompt to guide the LLM
-    system_prompt = (
-        "You are a financial expert. Use the information from the provided documents and your financial knowledge to answer the following question as accurately and concisely as possible. "
-        "If the answer is not present in the documents, say so.\n\nQuestion: "
-    )
-    full_prompt = system_prompt + query
-    response = query_llm(vector_db, full_prompt)
+    full_prompt = FINANCE_SYSTEM_PROMPT + query
+    response = cached_answer("finance", query, lambda: query_llm(get_vector_db(), full_prompt))
     return response
 
 
@@ -82,14 +610,80 @@ def llm_response_sit(query: str) -> str:
         str: The LLM's response to the SIT query.
     """
     # Add a SIT knowledge prompt to guide the LLM
-    system_prompt = (
-        "You are an expert on the Singapore Institute of Technology (SIT). Use the information from the provided documents and your knowledge to answer the following question as accurately and concisely as possible. "
-        "If the answer is not present in the documents, say so.\n\nQuestion: "
-    )
-    full_prompt = system_prompt + query
-    response = query_llm(vector_db, full_prompt)
+    full_prompt = SIT_SYSTEM_PROMPT + query
+    response = cached_answer("sit", query, lambda: query_llm(get_vector_db(), full_prompt))
     return response
 
+
+def stream_response_finance(query: str) -> Iterator[str]:
+    """
+    Streaming variant of llm_response_finance.
+
+    Args:
+        query (str): The financial question to answer.
+
+    Yields:
+        str: Answer tokens as they arrive.
+    """
+    yield from stream_cached_answer("finance", query, lambda: stream_query_llm(get_vector_db(), FINANCE_SYSTEM_PROMPT + query))
+
+
+def speculate_sit(question: str, generate: bool = SPECULATIVE_GENERATION) -> Speculation:
+    """
+    Starts answering a transcribed SIT question in the background while the user reviews
+    it: embeds it for the answer cache and retrieves its chunks, and with `generate`
+    also streams the answer into a buffer. Pass the result to stream_response_sit.
+    The background calls are queued under the caller's scheduler session.
+
+    Args:
+        question (str): The transcribed question.
+        generate (bool, optional): Whether to also start generating. Defaults to
+            SPECULATIVE_GENERATION (SPECULATIVE_GENERATION=1 in the environment).
+
+    Returns:
+        Speculation: The running speculation; cancel() it if the question is discarded.
+    """
+    # The work runs on the speculation executor, outside the caller's session_scope
+    session = current_session()
+
+    def retrieve(text: str) -> List[Document]:
+        with session_scope(session):
+            cache = get_answer_cache()
+            if cache is not None:
+                # Warms the embedding cache for the answer cache lookup on submission
+                cache.embed(text)
+            return get_qa_chain(get_vector_db()).retriever.invoke(SIT_SYSTEM_PROMPT + text)
+
+    def stream(docs: List[Document]) -> Iterator[str]:
+        # Consumed and closed on the same worker thread, so the scope is reset there
+        with session_scope(session):
+            prompt = SIT_SYSTEM_PROMPT + question
+            yield from stream_llm(stuff_prompt(get_qa_chain(get_vector_db()), docs, prompt))
+
+    return Speculation(question, retrieve, stream if generate else None).start()
+
+
+def stream_response_sit(query: str, speculation: Optional[Speculation] = None) -> Iterator[str]:
+    """
+    Streaming variant of llm_response_sit.
+
+    Args:
+        query (str): The SIT-related question to answer.
+        speculation (Optional[Speculation], optional): Work started by speculate_sit() for
+            the transcribed version of the query. Defaults to None.
+
+    Yields:
+        str: Answer tokens as they arrive.
+    """
+    try:
+        yield from stream_cached_answer(
+            "sit", query, lambda: stream_query_llm(get_vector_db(), SIT_SYSTEM_PROMPT + query, speculation=speculation)
+        )
+    finally:
+        if speculation is not None:
+            # Nothing left to reuse (e.g. an answer cache hit): stop any speculative generation
+            speculation.cancel()
+
 # For medical debate
 # def llm_response_medical_debate(query: str, debate_side: str = "for", debate_round: int = 1) -> str:
 #     """
@@ -187,6 +781,9 @@ def llm_response_sit(query: str) -> str:
 
 
 
+MEDICAL_DEBATE_TOPIC = "AI in healthcare, allowing AI to override human decisions in healthcare."
+
+
 def summarize_debate_history(
     history: List[Tuple[str, str]]
 ) -> Tuple[str, str]:
@@ -213,32 +810,89 @@ def summarize_debate_history(
         "\n".join(llm_points),
     )
 
-def llm_response_medical_debate(
+def new_debate_memory(topic: str = MEDICAL_DEBATE_TOPIC) -> DebateMemory:
+    """
+    Returns a bounded memory for one debate whose older rounds are summarized by the LLM
+    in the background. Record each finished round with add_turn() and pass the memory to
+    llm_response_medical_debate / stream_response_medical_debate.
+
+    Args:
+        topic (str, optional): The debate topic. Defaults to MEDICAL_DEBATE_TOPIC.
+
+    Returns:
+        DebateMemory: The empty memory.
+    """
+    def summarize(prompt: str) -> str:
+        # Queued fairly with the debates' own generations
+        return generation_scheduler.run(None, lambda: get_llm().invoke(prompt), session="debate-memory")
+
+    return DebateMemory(topic, summarize=summarize)
+
+
+def new_debate_evidence(topic: str = MEDICAL_DEBATE_TOPIC) -> Optional[DebateEvidence]:
+    """
+    Returns the evidence cache for one debate and starts retrieving the topic evidence in
+    the background, or None unless debate retrieval is enabled (DEBATE_RETRIEVAL=1).
+    Chunks scoring below DEBATE_EVIDENCE_MIN_RELEVANCE are dropped, so an off-topic store
+    adds nothing to the prompt. Pass it to llm_response_medical_debate /
+    stream_response_medical_debate for every round.
+
+    Args:
+        topic (str, optional): The debate topic. Defaults to MEDICAL_DEBATE_TOPIC.
+
+    Returns:
+        Optional[DebateEvidence]: The evidence cache.
+    """
+    if not DEBATE_RETRIEVAL_ENABLED:
+        return None
+
+    def retrieve(query: str, k: int) -> List[Document]:
+        # Scored vector search, for the relevance cutoff; DebateEvidence packs the whole round
+        hits = get_vector_db().similarity_search_with_relevance_scores(query, k=k)
+        return [doc for doc, score in hits if score >= DEBATE_EVIDENCE_MIN_RELEVANCE]
+
+    evidence = DebateEvidence(topic, retrieve)
+    evidence.prefetch()
+    return evidence
+
+
+def build_medical_debate_prompt(
     user_input: str,
     history: List[Tuple[str, str]] = None,
     debate_side: str = "for",
-    debate_round: int = 1
+    debate_round: int = 1,
+    memory: Optional[DebateMemory] = None,
+    evidence: Optional[DebateEvidence] = None
 ) -> str:
     """
-    Craft a debate response on:
-      "AI in healthcare, allowing AI to override human decisions in healthcare."
-    - Includes a counter to a specific user sentence ("As you said...")
-    - Fact-checks user claims (e.g., "1+1=3")
-    - On rounds >1, prepends summaries of past arguments
+    Builds the debate prompt used by llm_response_medical_debate and its streaming variant.
+    The history part is bounded: only the last rounds are included verbatim, and earlier
+    ones as a summary (see app/debate_memory.py). With an evidence cache, chunks retrieved
+    for the topic and the user's argument are included (see app/debate_evidence.py).
+    The proposition is the memory's (else the evidence cache's) topic, so it matches
+    what was retrieved; MEDICAL_DEBATE_TOPIC without either.
 
     Args:
         user_input (str): The latest argument or statement from the user.
-        history (List[Tuple[str, str]], optional): List of tuples containing previous user arguments and LLM responses. Defaults to None.
+        history (List[Tuple[str, str]], optional): Previous (user argument, LLM response) rounds. Defaults to None.
         debate_side (str, optional): The side of the debate ("for" or "against"). Defaults to "for".
         debate_round (int, optional): The current round of the debate. Defaults to 1.
+        memory (Optional[DebateMemory], optional): The debate's memory from new_debate_memory();
+            takes precedence over history. Defaults to None.
+        evidence (Optional[DebateEvidence], optional): The debate's evidence cache from
+            new_debate_evidence(). Defaults to None.
 
     Returns:
-        str: The LLM's debate response as a string.
+        str: The full prompt.
     """
-    topic = "AI in healthcare, allowing AI to override human decisions in healthcare."
-    # Prepare summaries if we have history
-    history = history or []
-    user_summary, llm_summary = summarize_debate_history(history) if history else ("", "")
+    holder = memory if memory is not None else evidence
+    topic = (holder.topic if holder is not None else "") or MEDICAL_DEBATE_TOPIC
+    if memory is None and history:
+        # Stateless callers get the same bounded layout, older rounds as first sentences
+        memory = DebateMemory(topic)
+        for user_arg, llm_resp in history:
+            memory.add_turn(user_arg, llm_resp, background=False)
+    summary, user_summary, llm_summary = memory.sections() if memory is not None else ("", "", "")
 
     # Common opening for all rounds
     base_prompt = (
@@ -252,6 +906,14 @@ def llm_response_medical_debate(
         "  5. You are generating response for a audio debate so keep the grammer and response like a speech.\n\n"
     )
 
+    docs = evidence.for_argument(user_input) if evidence is not None else []
+    if docs:
+        base_prompt += (
+            "Evidence from the knowledge base (cite it where relevant, ignore it where not):\n"
+            + "\n\n".join(doc.page_content for doc in docs)
+            + "\n\n"
+        )
+
     if debate_round == 1:
         # Opening round: respond directly to the user's opening argument
         full_prompt = (
@@ -264,18 +926,75 @@ def llm_response_medical_debate(
         full_prompt = (
             f"{base_prompt}"
             "Debate summary so far:\n"
-            f"  User arguments:\n{user_summary}\n\n"
+            + (f"  Earlier rounds:\n{summary}\n\n" if summary else "")
+            + f"  User arguments:\n{user_summary}\n\n"
             f"  Debater responses:\n{llm_summary}\n\n"
             f"User's latest argument:\n{user_input}\n\n"
             "Your response:\n"
         )
 
-    # Route through RAG if available, else fallback to Ollama
-    # if vector_db:
-    #     return query_llm(vector_db, full_prompt)
-    # else:
-    #     llm = OllamaLLM(model="deepseek-r1")
-    #     return llm.invoke(full_prompt)
-    
-    llm = OllamaLLM(model="deepseek-r1")
-    return llm.invoke(full_prompt)
+    return full_prompt
+
+
+def llm_response_medical_debate(
+    user_input: str,
+    history: List[Tuple[str, str]] = None,
+    debate_side: str = "for",
+    debate_round: int = 1,
+    memory: Optional[DebateMemory] = None,
+    evidence: Optional[DebateEvidence] = None
+) -> str:
+    """
+    Craft a debate response on the debate's topic (MEDICAL_DEBATE_TOPIC by default):
+    - Includes a counter to a specific user sentence ("As you said...")
+    - Fact-checks user claims (e.g., "1+1=3")
+    - On rounds >1, prepends the last rounds and a bounded summary of earlier ones
+    - With an evidence cache, grounds the response in retrieved chunks
+
+    Args:
+        user_input (str): The latest argument or statement from the user.
+        history (List[Tuple[str, str]], optional): List of tuples containing previous user arguments and LLM responses. Defaults to None.
+        debate_side (str, optional): The side of the debate ("for" or "against"). Defaults to "for".
+        debate_round (int, optional): The current round of the debate. Defaults to 1.
+        memory (Optional[DebateMemory], optional): The debate's bounded memory from
+            new_debate_memory(); replaces history. Defaults to None.
+        evidence (Optional[DebateEvidence], optional): The debate's evidence cache from
+            new_debate_evidence(); grounds the response in the vector store. Defaults to None.
+
+    Returns:
+        str: The LLM's debate response as a string.
+    """
+    full_prompt = build_medical_debate_prompt(user_input, history, debate_side, debate_round, memory, evidence)
+
+    llm = get_llm()
+    return generation_scheduler.run(("debate", full_prompt), lambda: llm.invoke(full_prompt))
+
+
+def stream_response_medical_debate(
+    user_input: str,
+    history: List[Tuple[str, str]] = None,
+    debate_side: str = "for",
+    debate_round: int = 1,
+    memory: Optional[DebateMemory] = None,
+    evidence: Optional[DebateEvidence] = None
+) -> Iterator[str]:
+    """
+    Streaming variant of llm_response_medical_debate, with the reasoning block removed.
+
+    Args:
+        user_input (str): The latest argument or statement from the user.
+        history (List[Tuple[str, str]], optional): Previous (user argument, LLM response) rounds. Defaults to None.
+        debate_side (str, optional): The side of the debate ("for" or "against"). Defaults to "for".
+        debate_round (int, optional): The current round of the debate. Defaults to 1.
+        memory (Optional[DebateMemory], optional): The debate's bounded memory. Defaults to None.
+        evidence (Optional[DebateEvidence], optional): The debate's evidence cache. Defaults to None.
+
+    Yields:
+        str: Response tokens as they arrive.
+    """
+    start = time.perf_counter()
+    prompt = build_medical_debate_prompt(user_input, history, debate_side, debate_round, memory, evidence)
+    yield from stream_llm(prompt, start=start)
+
+
+debug_log(f"rag_pipeline imported in {(time.perf_counter() - _IMPORT_START) * 1000:.0f} ms")
@@ -0,0 +1,320 @@
+# app/scheduler.py
+#
+# Scheduling of calls to the local Ollama server shared by all sessions of a process:
+#
+# - FairScheduler caps concurrent calls and admits waiting callers round-robin across
+#   sessions (FIFO within a session), so one chatty session cannot starve the others.
+#   Identical concurrent run() calls are coalesced: one runs, the others share its result.
+#   Streamed generations (slot()) are only queued fairly, never coalesced. aslot() and
+#   arun() are the asyncio counterparts; sync and async callers share the same queue.
+# - MicroBatchingEmbeddings collects single-query embedding calls for a few milliseconds
+#   and sends them to the server as one batch; identical texts in flight are embedded once.
+#
+# Sessions are identified through session_scope(); by default each thread is a session.
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, TypeVar
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+T = TypeVar("T")
+
+# Concurrent generation / embedding calls to Ollama across all sessions of the process
+OLLAMA_MAX_GENERATIONS = int(os.environ.get("OLLAMA_MAX_GENERATIONS", "2"))
+OLLAMA_MAX_EMBEDDINGS = int(os.environ.get("OLLAMA_MAX_EMBEDDINGS", "2"))
+
+# How long query embeddings wait to be batched with concurrent ones
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5"))
+
+_session: contextvars.ContextVar = contextvars.ContextVar("scheduler_session", default=None)
+
+
+@contextmanager
+def session_scope(session_id: Hashable) -> Iterator[None]:
+    """
+    Attributes the calls made inside the block to the given session for fair queueing.
+    """
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def current_session() -> Hashable:
+    session = _session.get()
+    return session if session is not None else threading.get_ident()
+
+
+class FairScheduler:
+    """
+    Concurrency cap with a fair per-session queue and single-flight request coalescing.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 2, wait_samples: int = 1000) -> None:
+        """
+        Args:
+            name (str): Name used in stats.
+            max_concurrency (int, optional): Calls running at once. Defaults to 2.
+            wait_samples (int, optional): Recent queue waits kept for percentiles. Defaults to 1000.
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._running = 0
+        self._inflight: Dict[Hashable, Future] = {}
+        self._waits = deque(maxlen=wait_samples)
+        self._counters = {"completed": 0, "coalesced": 0, "max_queue_depth": 0}
+
+    def _queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _acquire(self, session: Hashable) -> None:
+        ticket = object()
+        start = time.perf_counter()
+        with self._cond:
+            self._queues.setdefault(session, deque()).append(ticket)
+            self._counters["max_queue_depth"] = max(self._counters["max_queue_depth"], self._queue_depth())
+            # Granted when a slot is free and this ticket heads the longest-waiting session's queue
+            while not (self._running < self.max_concurrency and next(iter(self._queues.values()))[0] is ticket):
+                self._cond.wait()
+            queue = self._queues.pop(session)
+            queue.popleft()
+            if queue:
+                # Round robin: the session's next request goes behind the other sessions
+                self._queues[session] = queue
+            self._running += 1
+            self._waits.append(time.perf_counter() - start)
+            self._cond.notify_all()
+
+    def _release(self) -> None:
+        with self._cond:
+            self._running -= 1
+            self._counters["completed"] += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, session: Optional[Hashable] = None) -> Iterator[None]:
+        """
+        Holds one of the scheduler's slots for the duration of the block (e.g. a stream).
+        Unlike run(), callers are never coalesced.
+
+        Args:
+            session (Optional[Hashable], optional): The caller's session. Defaults to current_session().
+        """
+        self._acquire(session if session is not None else current_session())
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, session: Optional[Hashable] = None) -> AsyncIterator[None]:
+        """
+        Async counterpart of slot(). The wait for a slot runs in a worker thread, so the
+        event loop is not blocked while queued.
+
+        Args:
+            session (Optional[Hashable], optional): The caller's session. Defaults to current_session().
+        """
+        acquired = asyncio.ensure_future(
+            asyncio.to_thread(self._acquire, session if session is not None else current_session())
+        )
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The worker thread still takes the slot; give it back as soon as it has
+            acquired.add_done_callback(lambda _: self._release())
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def run(self, key: Optional[Hashable], fn: Callable[[], T], session: Optional[Hashable] = None) -> T:
+        """
+        Runs fn in a fair slot. If a call with the same key is already queued or running,
+        waits for it and returns its result instead.
+
+        Args:
+            key (Optional[Hashable]): Identity of the request, or None to never coalesce.
+            fn (Callable[[], T]): The call.
+            session (Optional[Hashable], optional): The caller's session. Defaults to current_session().
+
+        Returns:
+            T: The call's result.
+        """
+        if key is None:
+            with self.slot(session):
+                return fn()
+        with self._cond:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            return future.result()
+        try:
+            with self.slot(session):
+                result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                del self._inflight[key]
+
+    async def arun(self, key: Optional[Hashable], fn: Callable[[], Awaitable[T]], session: Optional[Hashable] = None) -> T:
+        """
+        Async counterpart of run(): awaits fn() in a fair slot, or the result of a sync or
+        async call with the same key already queued or running.
+
+        Args:
+            key (Optional[Hashable]): Identity of the request, or None to never coalesce.
+            fn (Callable[[], Awaitable[T]]): Returns the call's awaitable.
+            session (Optional[Hashable], optional): The caller's session. Defaults to current_session().
+
+        Returns:
+            T: The call's result.
+        """
+        if key is None:
+            async with self.aslot(session):
+                return await fn()
+        with self._cond:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            # Shielded: cancelling this caller must not cancel the shared result
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            async with self.aslot(session):
+                result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the current queue depth and running calls, counters, and queue wait percentiles.
+        """
+        with self._cond:
+            waits = np.asarray(self._waits) * 1000
+            return {
+                "name": self.name,
+                "max_concurrency": self.max_concurrency,
+                "running": self._running,
+                "queue_depth": self._queue_depth(),
+                "sessions_waiting": len(self._queues),
+                **self._counters,
+                "wait_p50_ms": round(float(np.percentile(waits, 50)), 3) if len(waits) else 0.0,
+                "wait_p95_ms": round(float(np.percentile(waits, 95)), 3) if len(waits) else 0.0,
+                "wait_max_ms": round(float(waits.max()), 3) if len(waits) else 0.0,
+            }
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """
+    Embedding wrapper batching concurrent embed_query calls: the first caller of a batch
+    waits up to window_ms (or until max_batch texts are queued), then embeds the whole
+    batch with one embed_documents call while the other callers wait for their vectors.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        window_ms: float = 5.0,
+        max_batch: int = 32,
+        scheduler: Optional[FairScheduler] = None
+    ) -> None:
+        """
+        Args:
+            embeddings (Embeddings): The underlying embedding model.
+            window_ms (float, optional): How long a batch stays open. Defaults to 5.0.
+            max_batch (int, optional): Texts after which a batch is sent at once. Defaults to 32.
+            scheduler (Optional[FairScheduler], optional): Caps concurrent embedding calls. Defaults to None.
+        """
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.scheduler = scheduler
+        self._cond = threading.Condition()
+        self._batch: List[str] = []
+        self._inflight: Dict[str, Future] = {}
+        self._counters = {"queries": 0, "coalesced": 0, "batches": 0, "batched_texts": 0}
+
+    def _call(self, texts: List[str]) -> List[List[float]]:
+        if self.scheduler is None:
+            return self.embeddings.embed_documents(texts)
+        return self.scheduler.run(None, lambda: self.embeddings.embed_documents(texts))
+
+    def _flush(self, batch: List[str], futures: List[Future]) -> None:
+        try:
+            vectors = self._call(batch)
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+        finally:
+            with self._cond:
+                for text in batch:
+                    del self._inflight[text]
+                self._counters["batches"] += 1
+                self._counters["batched_texts"] += len(batch)
+
+    def embed_query(self, text: str) -> List[float]:
+        leader = False
+        with self._cond:
+            self._counters["queries"] += 1
+            future = self._inflight.get(text)
+            if future is not None:
+                self._counters["coalesced"] += 1
+            else:
+                future = self._inflight[text] = Future()
+                self._batch.append(text)
+                leader = len(self._batch) == 1
+                if len(self._batch) >= self.max_batch:
+                    self._cond.notify_all()
+            if leader:
+                self._cond.wait_for(lambda: len(self._batch) >= self.max_batch, timeout=self.window)
+                batch, self._batch = self._batch, []
+                futures = [self._inflight[t] for t in batch]
+        if leader:
+            self._flush(batch, futures)
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Already a batch: send it directly (still under the concurrency cap)
+        return self._call(texts)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            batches = self._counters["batches"]
+            return {**self._counters, "mean_batch_size": round(self._counters["batched_texts"] / batches, 2) if batches else 0.0}
+
+
+generation_scheduler = FairScheduler("generation", OLLAMA_MAX_GENERATIONS)
+embedding_scheduler = FairScheduler("embedding", OLLAMA_MAX_EMBEDDINGS)
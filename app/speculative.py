@@ -0,0 +1,202 @@
+# app/speculative.py
+#
+# Speculative work for a question the user is still reviewing. As soon as a transcript
+# is available, retrieval (and optionally generation) starts in the background. When the
+# question is submitted:
+#
+# - unchanged (ignoring case, whitespace and punctuation): the retrieved chunks and, if
+#   generation was speculated, the answer streamed so far are reused;
+# - nearly unchanged (word-level similarity >= threshold): the chunks are reused and the
+#   speculative generation is cancelled;
+# - otherwise: everything is cancelled and the question is answered from scratch.
+#
+# Cancelling stops a running generation at its next token and closes its stream, which
+# frees the scheduler slot and the connection to Ollama.
+
+import difflib
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+# Word-level similarity above which the speculative retrieval is reused
+SIMILARITY_THRESHOLD = float(os.environ.get("SPECULATIVE_SIMILARITY", "0.8"))
+
+# Whether to also start generating the answer; it occupies an LLM slot while the user reviews
+SPECULATIVE_GENERATION = os.environ.get("SPECULATIVE_GENERATION", "0") == "1"
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculation")
+
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "reused": 0, "reused_generation": 0, "cancelled": 0, "seconds_hidden": 0.0}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Word-level similarity of two questions, between 0 and 1, ignoring case and punctuation.
+    """
+    return difflib.SequenceMatcher(None, _words(a), _words(b), autojunk=False).ratio()
+
+
+def _count(counter: str, amount: float = 1) -> None:
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+class Speculation:
+    """
+    Background retrieval, and optionally generation, for a question that may still change.
+    """
+
+    def __init__(
+        self,
+        question: str,
+        retrieve: Callable[[str], List[Document]],
+        generate: Optional[Callable[[List[Document]], Iterator[str]]] = None,
+        threshold: float = SIMILARITY_THRESHOLD
+    ) -> None:
+        """
+        Args:
+            question (str): The question as transcribed.
+            retrieve (Callable[[str], List[Document]]): Retrieves the chunks for a question.
+            generate (Optional[Callable[[List[Document]], Iterator[str]]], optional): Streams the
+                answer to the question from its chunks; None to only retrieve. Defaults to None.
+            threshold (float, optional): Similarity needed to reuse the chunks. Defaults to SIMILARITY_THRESHOLD.
+        """
+        self.question = question
+        self.retrieve = retrieve
+        self.generate = generate
+        self.threshold = threshold
+        self._docs: Future = Future()
+        self._cond = threading.Condition()
+        self._tokens: List[str] = []
+        self._generation_done = generate is None
+        self._generation_error: Optional[BaseException] = None
+        self._cancelled = False
+        self._generation_cancelled = False
+        self._reused = False
+        self._retrieval_seconds = 0.0
+
+    def start(self) -> "Speculation":
+        _count("started")
+        _executor.submit(self._run)
+        return self
+
+    def _run(self) -> None:
+        if self._cancelled or not self._docs.set_running_or_notify_cancel():
+            return
+        start = time.perf_counter()
+        try:
+            docs = self.retrieve(self.question)
+            self._retrieval_seconds = time.perf_counter() - start
+        except BaseException as e:
+            self._docs.set_exception(e)
+            with self._cond:
+                self._generation_done = True
+                self._cond.notify_all()
+            return
+        self._docs.set_result(docs)
+        if self.generate is None:
+            return
+        tokens = None
+        try:
+            tokens = self.generate(docs)
+            for token in tokens:
+                with self._cond:
+                    if self._generation_cancelled:
+                        break
+                    self._tokens.append(token)
+                    self._cond.notify_all()
+        except BaseException as e:
+            self._generation_error = e
+        finally:
+            if tokens is not None and hasattr(tokens, "close"):
+                # Releases the LLM stream (and its scheduler slot) when cancelled early
+                tokens.close()
+            with self._cond:
+                self._generation_done = True
+                self._cond.notify_all()
+
+    def matches(self, question: str) -> bool:
+        """
+        Whether the speculative chunks can be used for the submitted question.
+        """
+        return similarity(self.question, question) >= self.threshold
+
+    def same_question(self, question: str) -> bool:
+        """
+        Whether the submitted question is the speculated one, ignoring case and punctuation.
+        """
+        return _words(self.question) == _words(question)
+
+    def docs(self, timeout: Optional[float] = None) -> List[Document]:
+        """
+        Returns the speculatively retrieved chunks, waiting for the retrieval if needed.
+        Raises the retrieval's exception if it failed.
+        """
+        start = time.perf_counter()
+        docs = self._docs.result(timeout)
+        self._reused = True
+        _count("reused")
+        # Only the part of the retrieval that ran before submission was hidden
+        _count("seconds_hidden", max(0.0, self._retrieval_seconds - (time.perf_counter() - start)))
+        return docs
+
+    def stream(self) -> Iterator[str]:
+        """
+        Yields the speculative answer: the tokens generated so far at once, then the rest
+        as it arrives. Raises the generation's exception if it failed.
+        """
+        self._reused = True
+        _count("reused_generation")
+        sent = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._tokens) > sent or self._generation_done)
+                tokens, done = self._tokens[sent:], self._generation_done
+            if tokens:
+                sent += len(tokens)
+                yield "".join(tokens)
+            elif done:
+                break
+        if self._generation_error is not None:
+            raise self._generation_error
+
+    @property
+    def generating(self) -> bool:
+        return self.generate is not None and not self._generation_cancelled
+
+    def cancel_generation(self) -> None:
+        with self._cond:
+            self._generation_cancelled = True
+            self._cond.notify_all()
+
+    def cancel(self) -> None:
+        """
+        Drops the speculation: a pending retrieval does not start, a running generation
+        stops at its next token. Called after a reuse, it only stops the generation.
+        """
+        if self._cancelled:
+            return
+        self._cancelled = True
+        if not self._reused:
+            _count("cancelled")
+        self._docs.cancel()
+        self.cancel_generation()
+
+
+def speculation_stats() -> Dict[str, float]:
+    """
+    Returns the speculation counters of this process and the retrieval time hidden behind
+    the user's review.
+    """
+    with _stats_lock:
+        return {**_stats, "seconds_hidden": round(_stats["seconds_hidden"], 3)}
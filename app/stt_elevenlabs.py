@@ -1,31 +1,67 @@
 # app/stt_elevenlabs.py
 
+import os
+from typing import BinaryIO, Optional, Union
+
 import requests
+from app.http_client import ELEVENLABS_BASE_URL, get_http_client
 from app.instance.config import ELEVENLABS_API_KEY
 
-def transcribe_audio(audio_path: str, language: str = "en") -> str:
+AudioInput = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+# Returned by transcribe_audio in place of a transcript when the request fails
+TRANSCRIPTION_FAILED = "Transcription failed."
+
+def read_audio(audio: AudioInput) -> bytes:
+    """
+    Returns the bytes of audio given as a file path, bytes, or a binary buffer (e.g. a
+    Streamlit UploadedFile or io.BytesIO). Buffers are read whole from the start, so
+    one that was already read still returns its data.
+    """
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            return f.read()
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return bytes(audio)
+    if hasattr(audio, "getvalue"):
+        return audio.getvalue()
+    if audio.seekable():
+        audio.seek(0)
+    return audio.read()
+
+def transcribe_audio(audio: AudioInput, language: str = "en", filename: Optional[str] = None) -> str:
     """
-    Transcribes an audio file using the ElevenLabs Speech-to-Text API.
+    Transcribes audio using the ElevenLabs Speech-to-Text API. The audio is sent from
+    memory; nothing is written to disk.
 
     Args:
-        audio_path (str): The path to the audio file to be transcribed.
+        audio (AudioInput): The audio as a file path, bytes, or a binary buffer.
         language (str, optional): The language code (ISO-639-1 or ISO-639-3) for transcription. Defaults to "en".
+        filename (Optional[str], optional): Name sent with the upload. Defaults to the path's or
+            buffer's name, else "audio.wav".
 
     Returns:
-        str: The transcribed text if successful, otherwise an error message.
+        str: The transcribed text if successful, otherwise TRANSCRIPTION_FAILED.
     """
-    url = "https://api.elevenlabs.io/v1/speech-to-text"
+    url = f"{ELEVENLABS_BASE_URL}/v1/speech-to-text"
     headers = {"xi-api-key": ELEVENLABS_API_KEY}
 
     data = {
         "model_id": "scribe_v1",        # required
         "language_code": language       # ISO-639-1 or ISO-639-3, e.g. "en" or "eng" :contentReference[oaicite:0]{index=0}
     }
-    files = {"file": open(audio_path, "rb")}
+    if filename is None:
+        filename = audio if isinstance(audio, str) else getattr(audio, "name", None) or "audio.wav"
+    # Bytes rather than a buffer, so the upload can be re-sent on a retry
+    files = {"file": (os.path.basename(filename), read_audio(audio))}
 
-    resp = requests.post(url, headers=headers, data=data, files=files)
+    try:
+        resp = get_http_client().post(url, endpoint="stt", headers=headers, data=data, files=files)
+    except requests.RequestException as e:
+        print("[ERROR] ElevenLabs STT request failed:", e)
+        return TRANSCRIPTION_FAILED
     if resp.status_code == 200:
         return resp.json().get("text", "")
     else:
         print("[ERROR] ElevenLabs STT:", resp.status_code, resp.text)
-        return "Transcription failed."
+        return TRANSCRIPTION_FAILED
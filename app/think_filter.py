@@ -0,0 +1,167 @@
+# app/think_filter.py
+#
+# Incremental filter removing deepseek-r1's <think>...</think> reasoning from streamed
+# completions. Tags may be split across chunks ("<thi" + "nk>"); the filter holds back
+# at most len("</think>") - 1 characters of a partial tag. Some chat templates omit the
+# opening tag, so until the first tag is seen, text is also held back (up to
+# UNTAGGED_ANSWER_CHARS): a closing tag then marks it as reasoning and drops it, while
+# a stream without tags is released as the answer. Memory stays constant in the stream
+# length.
+
+from typing import Callable, Iterable, Iterator, Optional
+
+OPEN_TAG = "<think>"
+CLOSE_TAG = "</think>"
+
+# Text without any tag after which a stream is taken to have no reasoning block
+UNTAGGED_ANSWER_CHARS = 4000
+
+
+def _partial_tag(text: str, tags: tuple) -> int:
+    """
+    Length of the longest suffix of text that is a proper prefix of one of the tags.
+    """
+    for n in range(min(len(text), max(len(t) for t in tags) - 1), 0, -1):
+        if any(tag.startswith(text[-n:]) for tag in tags):
+            return n
+    return 0
+
+
+class ThinkFilter:
+    """
+    Stateful filter fed with completion chunks, returning the visible (non-reasoning)
+    text of each. Reasoning text can be observed through `on_reasoning`. Text before a
+    closing tag with no opening one (templates that omit it) is reasoning; a later stray
+    closing tag is dropped. Leading whitespace of the answer is trimmed.
+    """
+
+    def __init__(
+        self,
+        on_reasoning: Optional[Callable[[str], None]] = None,
+        hold_chars: int = UNTAGGED_ANSWER_CHARS
+    ) -> None:
+        """
+        Args:
+            on_reasoning (Optional[Callable[[str], None]], optional): Called with reasoning
+                text as it is filtered out, e.g. for debugging. Defaults to None.
+            hold_chars (int, optional): Text held back while no tag has been seen, before it
+                is released as the answer. Defaults to UNTAGGED_ANSWER_CHARS.
+        """
+        self.on_reasoning = on_reasoning
+        self.hold_chars = hold_chars
+        self.thinking = False
+        self._pending = ""
+        self._started = False
+        self._tagged = False
+        self._held = ""
+
+    def _release(self, out: list) -> None:
+        # No opening tag is coming: what was held is the answer
+        self._tagged = True
+        held, self._held = self._held, ""
+        self._emit(held, out)
+
+    def _emit(self, text: str, out: list) -> None:
+        if not text:
+            return
+        if not self._tagged:
+            self._held += text
+            if len(self._held) > self.hold_chars:
+                self._release(out)
+            return
+        if self.thinking:
+            if self.on_reasoning:
+                self.on_reasoning(text)
+            return
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        if text:
+            out.append(text)
+
+    def feed(self, chunk: str) -> str:
+        """
+        Filters the next chunk of the completion.
+
+        Args:
+            chunk (str): The next chunk.
+
+        Returns:
+            str: The visible text that can be emitted now (possibly empty).
+        """
+        text, self._pending = self._pending + chunk, ""
+        out = []
+        while text:
+            tags = (CLOSE_TAG,) if self.thinking else (OPEN_TAG, CLOSE_TAG)
+            hits = [(text.find(tag), tag) for tag in tags if tag in text]
+            if not hits:
+                keep = _partial_tag(text, tags)
+                self._emit(text[:len(text) - keep], out)
+                self._pending = text[len(text) - keep:]
+                break
+            index, tag = min(hits)
+            self._emit(text[:index], out)
+            text = text[index + len(tag):]
+            if not self._tagged:
+                self._tagged = True
+                held, self._held = self._held, ""
+                if tag == CLOSE_TAG:
+                    # Closing tag without an opening one: the text so far was reasoning
+                    if held and self.on_reasoning:
+                        self.on_reasoning(held)
+                else:
+                    self._emit(held, out)
+            self.thinking = tag == OPEN_TAG
+        return "".join(out)
+
+    def flush(self) -> str:
+        """
+        Releases text held back at the end of the stream (an incomplete tag is literal text).
+
+        Returns:
+            str: The remaining visible text.
+        """
+        out = []
+        self._emit(self._pending, out)
+        self._pending = ""
+        if not self._tagged:
+            self._release(out)
+        return "".join(out)
+
+
+def filter_stream(chunks: Iterable[str], on_reasoning: Optional[Callable[[str], None]] = None) -> Iterator[str]:
+    """
+    Yields the visible text of a stream of completion chunks.
+
+    Args:
+        chunks (Iterable[str]): The completion chunks.
+        on_reasoning (Optional[Callable[[str], None]], optional): Receives reasoning text. Defaults to None.
+
+    Yields:
+        str: Non-empty visible text.
+    """
+    think_filter = ThinkFilter(on_reasoning)
+    for chunk in chunks:
+        visible = think_filter.feed(chunk)
+        if visible:
+            yield visible
+    tail = think_filter.flush()
+    if tail:
+        yield tail
+
+
+def strip_think(text: str) -> str:
+    """
+    Removes the reasoning block(s) from a complete completion with the same filter as
+    filter_stream, so both paths show the same answer. As the whole completion is known,
+    untagged text is held for its full length rather than UNTAGGED_ANSWER_CHARS, so long
+    reasoning before a lone closing tag is still dropped.
+
+    Args:
+        text (str): The completion.
+
+    Returns:
+        str: The visible answer, stripped of surrounding whitespace.
+    """
+    think_filter = ThinkFilter(hold_chars=len(text))
+    return (think_filter.feed(text) + think_filter.flush()).strip()
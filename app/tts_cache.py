@@ -0,0 +1,231 @@
+# app/tts_cache.py
+#
+# Content-addressed cache of synthesized speech. Audio is keyed by the SHA-256 of
+# (text, voice_id, model_id, output_format), so replaying an answer or synthesizing a
+# canned phrase again costs neither API latency nor quota. Two tiers:
+#
+# - disk: one file per entry under TTS_CACHE_DIR, with a SQLite index of sizes and last
+#   use; the least recently used files are evicted once the total exceeds max_bytes;
+# - memory: an LRU of recently used entries bounded by memory_bytes.
+#
+#   python -m app.tts_cache stats
+#   python -m app.tts_cache clear
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(ROOT_DIR, 'tts_cache'))
+
+# Cache in front of text_to_speech(); disable with TTS_CACHE=0
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE", "1") != "0"
+TTS_CACHE_MAX_BYTES = int(float(os.environ.get("TTS_CACHE_MAX_MB", "256")) * 2**20)
+TTS_CACHE_MEMORY_BYTES = int(float(os.environ.get("TTS_CACHE_MEMORY_MB", "16")) * 2**20)
+
+# Memory hits are written to the disk index's last_used in batches, at most this often
+TOUCH_FLUSH_SECONDS = 5.0
+
+
+def tts_key(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+    """
+    Returns the cache key of a synthesis request.
+    """
+    request = json.dumps([text, voice_id, model_id, output_format], ensure_ascii=False)
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """
+    Thread- and process-safe two-tier (memory, disk) LRU cache of audio bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str = TTS_CACHE_DIR,
+        max_bytes: int = TTS_CACHE_MAX_BYTES,
+        memory_bytes: int = TTS_CACHE_MEMORY_BYTES
+    ) -> None:
+        """
+        Args:
+            directory (str, optional): Where audio files and the index live. Defaults to TTS_CACHE_DIR.
+            max_bytes (int, optional): Disk budget. Defaults to TTS_CACHE_MAX_BYTES (TTS_CACHE_MAX_MB).
+            memory_bytes (int, optional): Memory budget. Defaults to TTS_CACHE_MEMORY_BYTES (TTS_CACHE_MEMORY_MB).
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS audio ("
+            " key TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS audio_last_used ON audio (last_used)")
+        self._conn.commit()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.audio')
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_used += len(audio)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _flush_touches(self) -> None:
+        # Called with the lock held
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE audio SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._conn.commit()
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns cached audio, or None on a miss.
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                # Keeps replayed entries recent in the disk LRU too
+                self._touched[key] = time.time()
+                if time.monotonic() - self._last_flush >= TOUCH_FLUSH_SECONDS:
+                    self._flush_touches()
+                return audio
+            try:
+                with open(self._path(key), 'rb') as f:
+                    audio = f.read()
+            except FileNotFoundError:
+                self._counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE audio SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._counters["disk_hits"] += 1
+            self._remember(key, audio)
+            return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        """
+        Stores audio and evicts the least recently used files if over the disk budget.
+        """
+        if not audio:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._remember(key, audio)
+            # Eviction order must include the memory hits not yet written
+            self._flush_touches()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO audio (key, size, last_used) VALUES (?, ?, ?)",
+                (key, len(audio), time.time()),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM audio").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in self._conn.execute("SELECT key, size FROM audio ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes or old_key == key:
+                        break
+                    try:
+                        os.remove(self._path(old_key))
+                    except FileNotFoundError:
+                        pass
+                    self._conn.execute("DELETE FROM audio WHERE key = ?", (old_key,))
+                    self._memory_used -= len(self._memory.pop(old_key, b""))
+                    total -= size
+                    self._counters["evictions"] += 1
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            for (key,) in self._conn.execute("SELECT key FROM audio").fetchall():
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._conn.execute("DELETE FROM audio")
+            self._conn.commit()
+            self._touched.clear()
+            self._memory.clear()
+            self._memory_used = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns hit/miss counters, the hit rate and the size of both tiers.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM audio").fetchone()
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "disk_mb": round(size / 2**20, 2),
+                "memory_entries": len(self._memory),
+                "memory_mb": round(self._memory_used / 2**20, 2),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+
+_cache: Optional[TTSCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """
+    Returns the process-wide TTS cache, or None when disabled (TTS_CACHE=0).
+    """
+    global _cache
+    if _cache is None and TTS_CACHE_ENABLED:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TTS audio cache tools.")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--dir", default=TTS_CACHE_DIR)
+    args = parser.parse_args()
+
+    cache = TTSCache(args.dir)
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared TTS cache at {args.dir}")
+    else:
+        print(json.dumps(cache.stats(), indent=2))
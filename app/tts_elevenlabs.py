@@ -1,30 +1,33 @@
 # app/tts_elevenlabs.py
 
+import io
+from typing import Iterable, Iterator, Optional
+
 import requests
+from app.http_client import ELEVENLABS_BASE_URL, get_http_client
 from app.instance.config import ELEVENLABS_API_KEY
+from app.tts_cache import get_tts_cache, tts_key
+
+# Bytes read from a streaming TTS response at a time
+STREAM_CHUNK_BYTES = 4096
 
 def list_voices() -> dict:
     """
     Fetch all available ElevenLabs voices.
     Returns a dict containing 'voices' list with 'voice_id' and 'name'.
     """
-    url = "https://api.elevenlabs.io/v1/voices"
+    url = f"{ELEVENLABS_BASE_URL}/v1/voices"
     headers = {"xi-api-key": ELEVENLABS_API_KEY}
-    resp = requests.get(url, headers=headers)
+    resp = get_http_client().get(url, endpoint="voices", headers=headers)
     resp.raise_for_status()
     return resp.json()
 
-def text_to_speech(
-    text: str,
-    voice_id: str,
-    model_id: str = "eleven_multilingual_v2",
-    output_format: str = "mp3_44100_128"
-) -> bytes:
-    """
-    Convert `text` into speech using ElevenLabs TTS Convert endpoint.
-    Returns raw audio bytes (MP3) on success, or empty bytes on failure.
-    """
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+def _cache_key(text: str, voice_id: str, model_id: str, output_format: str, previous_text: str, next_text: str) -> str:
+    # The context changes the audio, so it is part of the key
+    context = f"\x00{previous_text}\x00{next_text}" if previous_text or next_text else ""
+    return tts_key(text + context, voice_id, model_id, output_format)
+
+def _request(text: str, model_id: str, output_format: str, previous_text: str, next_text: str):
     headers = {
         "xi-api-key": ELEVENLABS_API_KEY,
         "Content-Type": "application/json"
@@ -34,10 +37,127 @@ def text_to_speech(
         "text": text,
         "model_id": model_id
     }
+    if previous_text:
+        payload["previous_text"] = previous_text
+    if next_text:
+        payload["next_text"] = next_text
+    return headers, params, payload
 
-    resp = requests.post(url, headers=headers, params=params, json=payload)
+def text_to_speech(
+    text: str,
+    voice_id: str,
+    model_id: str = "eleven_multilingual_v2",
+    output_format: str = "mp3_44100_128",
+    use_cache: bool = True,
+    previous_text: str = "",
+    next_text: str = ""
+) -> bytes:
+    """
+    Convert `text` into speech using ElevenLabs TTS Convert endpoint.
+    Returns raw audio bytes (MP3) on success, or empty bytes on failure.
+    Audio already synthesized for the same text, voice, model and format is served
+    from the TTS cache (app/tts_cache.py) unless use_cache is False.
+    When `text` is one segment of a longer answer, previous_text / next_text give the
+    surrounding text so the segments' intonation joins up.
+    """
+    cache = get_tts_cache() if use_cache else None
+    if cache is not None:
+        key = _cache_key(text, voice_id, model_id, output_format, previous_text, next_text)
+        audio = cache.get(key)
+        if audio is not None:
+            return audio
+
+    url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{voice_id}"
+    headers, params, payload = _request(text, model_id, output_format, previous_text, next_text)
+    try:
+        resp = get_http_client().post(url, endpoint="tts", headers=headers, params=params, json=payload)
+    except requests.RequestException as e:
+        print(f"[ERROR] ElevenLabs TTS request failed: {e}")
+        return b""
     if resp.status_code == 200:
+        if cache is not None:
+            cache.put(key, resp.content)
         return resp.content
     else:
         print(f"[ERROR] ElevenLabs TTS failed ({resp.status_code}): {resp.text}")
         return b""
+
+def text_to_speech_stream(
+    text: str,
+    voice_id: str,
+    model_id: str = "eleven_multilingual_v2",
+    output_format: str = "mp3_44100_128",
+    chunk_size: int = STREAM_CHUNK_BYTES,
+    use_cache: bool = True,
+    previous_text: str = "",
+    next_text: str = ""
+) -> Iterator[bytes]:
+    """
+    Streaming variant of text_to_speech using the ElevenLabs streaming endpoint: audio is
+    yielded in chunks as it is downloaded, so playback can start before synthesis ends.
+    Chunks are raw bytes of the MP3 stream and need not end on frame boundaries (see
+    tts_pipeline.mp3_frame_chunks). A cached result is yielded at once; a fully received
+    stream is added to the cache. Closing the generator early closes the connection.
+    Yields nothing on failure.
+    """
+    cache = get_tts_cache() if use_cache else None
+    if cache is not None:
+        key = _cache_key(text, voice_id, model_id, output_format, previous_text, next_text)
+        audio = cache.get(key)
+        if audio is not None:
+            yield audio
+            return
+
+    url = f"{ELEVENLABS_BASE_URL}/v1/text-to-speech/{voice_id}/stream"
+    headers, params, payload = _request(text, model_id, output_format, previous_text, next_text)
+    received = []
+    try:
+        resp = get_http_client().post(url, endpoint="tts_stream", headers=headers, params=params, json=payload, stream=True)
+    except requests.RequestException as e:
+        print(f"[ERROR] ElevenLabs TTS stream request failed: {e}")
+        return
+    with resp:
+        if resp.status_code != 200:
+            print(f"[ERROR] ElevenLabs TTS stream failed ({resp.status_code}): {resp.text}")
+            return
+        try:
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    received.append(chunk)
+                    yield chunk
+        except requests.RequestException as e:
+            # The read timeout also bounds stalls mid-stream; what arrived is kept playing
+            print(f"[ERROR] ElevenLabs TTS stream interrupted: {e}")
+            return
+    if cache is not None:
+        cache.put(key, b"".join(received))
+
+class AudioStream(io.RawIOBase):
+    """
+    Read-only file-like view of an audio chunk iterator (e.g. text_to_speech_stream), for
+    APIs that read from files. Reads block until the next chunk arrives; closing the
+    stream closes the iterator and with it the HTTP response.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk: Optional[bytes] = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self) -> None:
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+        super().close()
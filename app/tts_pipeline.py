@@ -0,0 +1,282 @@
+# app/tts_pipeline.py
+#
+# Sentence-pipelined speech synthesis. A response is split at sentence boundaries into
+# segments (the first one short, so it is ready quickly); segments are synthesized
+# concurrently by a bounded worker pool and delivered in order, so playback of segment 1
+# can start while the later ones are still being produced. Each request carries the
+# neighbouring text (ElevenLabs request stitching) so intonation flows across segments,
+# and the MP3 segments are joined into one stream by dropping their per-file headers.
+# mp3_frame_chunks regroups a byte stream (a streaming TTS download) into whole-frame
+# chunks that can be played one after another while the download continues.
+
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Audio in the first and second chunk of mp3_frame_chunks, and the cap later chunks
+# double up to (seconds); each chunk boundary is a join in live playback
+FIRST_CHUNK_SECONDS = 0.5
+CHUNK_SECONDS = 2.0
+MAX_CHUNK_SECONDS = 8.0
+
+# Concurrent segment requests across the process
+TTS_PIPELINE_WORKERS = int(os.environ.get("TTS_PIPELINE_WORKERS", "3"))
+
+# Later segments are grouped to about this many characters (fewer, larger requests)
+SEGMENT_CHARS = 250
+
+# The first segment is a single sentence unless it is shorter than this
+FIRST_SEGMENT_MIN_CHARS = 40
+
+# A sentence ends at ./!/? (plus closing quotes or brackets) followed by whitespace and
+# an uppercase letter, or by the end of the text; "94.5%", "$3.50" and "1.2 million"
+# are not split
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s+[\"'(\[]?[A-Z]|\s*$)")
+
+_executor = ThreadPoolExecutor(max_workers=TTS_PIPELINE_WORKERS, thread_name_prefix="tts-segment")
+
+
+def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        spans.append((start, match.end()))
+        start = match.end()
+    spans.append((start, len(text)))
+    return [(a, b) for a, b in spans if text[a:b].strip()]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [text[a:b].strip() for a, b in _sentence_spans(text)]
+
+
+def split_segments(
+    text: str,
+    segment_chars: int = SEGMENT_CHARS,
+    first_min_chars: int = FIRST_SEGMENT_MIN_CHARS
+) -> List[str]:
+    """
+    Splits a response into synthesis segments at sentence boundaries: a short first
+    segment for early playback, then segments of about segment_chars characters.
+
+    Args:
+        text (str): The response.
+        segment_chars (int, optional): Target size of later segments. Defaults to SEGMENT_CHARS.
+        first_min_chars (int, optional): Minimum size of the first segment. Defaults to FIRST_SEGMENT_MIN_CHARS.
+
+    Returns:
+        List[str]: The segments, in order.
+    """
+    segments: List[str] = []
+    current: Optional[Tuple[int, int]] = None
+    for start, end in _sentence_spans(text):
+        limit = first_min_chars if not segments else segment_chars
+        if current is not None:
+            length = len(text[current[0]:current[1]].strip())
+            if length >= limit or length + len(text[start:end].strip()) > max(limit, segment_chars):
+                segments.append(text[current[0]:current[1]].strip())
+                current = None
+        # Segments are slices of the text, so its spacing is kept
+        current = (start, end) if current is None else (current[0], end)
+    if current is not None:
+        segments.append(text[current[0]:current[1]].strip())
+    return segments
+
+
+def strip_id3(audio: bytes) -> bytes:
+    """
+    Removes ID3v2 (leading) and ID3v1 (trailing) tags from an MP3, leaving only frames.
+    """
+    if audio[:3] == b"ID3" and len(audio) >= 10:
+        flags = audio[5]
+        size = (audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9]
+        audio = audio[10 + size + (10 if flags & 0x10 else 0):]
+    if len(audio) >= 128 and audio[-128:-125] == b"TAG":
+        audio = audio[:-128]
+    return audio
+
+
+# MPEG-1 Layer III bitrates (kbps) by header index, and sample rates by header index
+_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_SAMPLE_RATES = (44100, 48000, 32000)
+
+
+def mp3_frame_length(header: bytes) -> int:
+    """
+    Length in bytes of the MPEG-1 Layer III frame starting with `header` (4 bytes), or 0
+    if it is not a valid frame header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xFE) != 0xFA:
+        return 0
+    bitrate_index, rate_index, padding = header[2] >> 4, (header[2] >> 2) & 0x3, (header[2] >> 1) & 0x1
+    if not 0 < bitrate_index < 15 or rate_index == 3:
+        return 0
+    return 144000 * _BITRATES[bitrate_index] // _SAMPLE_RATES[rate_index] + padding
+
+
+def _drop_info_frame(audio: bytes) -> bytes:
+    # Encoders prepend a silent frame carrying a Xing/Info header with the file's frame
+    # count; inside a stitched stream it is a click and a wrong duration
+    length = mp3_frame_length(audio[:4])
+    if length and (b"Xing" in audio[:min(length, 64)] or b"Info" in audio[:min(length, 64)]):
+        return audio[length:]
+    return audio
+
+
+def stitch_mp3(segments: Iterable[bytes]) -> bytes:
+    """
+    Joins MP3 segments into one stream of frames: tags and per-file Xing/Info frames
+    are removed, so the joins are gapless.
+    """
+    return b"".join(_drop_info_frame(strip_id3(segment)) for segment in segments if segment)
+
+
+def mp3_frame_chunks(
+    stream: Iterable[bytes],
+    first_seconds: float = FIRST_CHUNK_SECONDS,
+    chunk_seconds: float = CHUNK_SECONDS,
+    max_seconds: float = MAX_CHUNK_SECONDS
+) -> Iterator[bytes]:
+    """
+    Regroups an MP3 byte stream, split at arbitrary points, into chunks of whole frames
+    that each play on their own: a short first chunk for early playback, then chunks
+    doubling from chunk_seconds up to max_seconds, so a long reply has few joins (the
+    download runs faster than real time, so each chunk is ready before its predecessor
+    has played). Tags and the Xing/Info frame are dropped; bytes that are not frames are
+    skipped up to the next frame header.
+
+    Args:
+        stream (Iterable[bytes]): The MP3 bytes, e.g. from tts_elevenlabs.text_to_speech_stream.
+        first_seconds (float, optional): Audio in the first chunk. Defaults to FIRST_CHUNK_SECONDS.
+        chunk_seconds (float, optional): Audio in the second chunk. Defaults to CHUNK_SECONDS.
+        max_seconds (float, optional): Most audio in a later chunk. Defaults to MAX_CHUNK_SECONDS.
+
+    Yields:
+        bytes: Consecutive runs of MP3 frames.
+    """
+    buffer = b""
+    frames: List[bytes] = []
+    seconds = 0.0
+    target = first_seconds
+    emitted = 0
+    first_frame = True
+    tag_checked = False
+    skip = 0
+    for chunk in stream:
+        if skip:
+            # The rest of an ID3 tag longer than the data received when it started
+            dropped = min(skip, len(chunk))
+            chunk, skip = chunk[dropped:], skip - dropped
+        buffer += chunk
+        if not tag_checked:
+            if len(buffer) < 10:
+                continue
+            tag_checked = True
+            if buffer[:3] == b"ID3":
+                flags, size = buffer[5], (buffer[6] << 21) | (buffer[7] << 14) | (buffer[8] << 7) | buffer[9]
+                tag_length = 10 + size + (10 if flags & 0x10 else 0)
+                skip = max(0, tag_length - len(buffer))
+                buffer = buffer[tag_length:]
+        start = 0
+        while len(buffer) - start >= 4:
+            length = mp3_frame_length(buffer[start:start + 4])
+            if not length:
+                # Lost sync (or a trailing tag): skip to the next possible frame header
+                next_sync = buffer.find(b"\xff", start + 1)
+                start = next_sync if next_sync != -1 else len(buffer)
+                continue
+            if len(buffer) - start < length:
+                break
+            frame = buffer[start:start + length]
+            start += length
+            if first_frame:
+                first_frame = False
+                if b"Xing" in frame[:64] or b"Info" in frame[:64]:
+                    continue
+            frames.append(frame)
+            seconds += 1152 / _SAMPLE_RATES[(frame[2] >> 2) & 0x3]
+            if seconds >= target:
+                yield b"".join(frames)
+                frames, seconds = [], 0.0
+                emitted += 1
+                target = min(chunk_seconds * 2 ** (emitted - 1), max(chunk_seconds, max_seconds))
+        buffer = buffer[start:]
+    if frames:
+        yield b"".join(frames)
+
+
+def mp3_duration(audio: bytes, output_format: str = "mp3_44100_128") -> float:
+    """
+    Estimated duration in seconds of constant-bitrate MP3 audio in an ElevenLabs
+    output format ("mp3_<sample rate>_<kbps>").
+    """
+    try:
+        kbps = int(output_format.rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        kbps = 128
+    return len(strip_id3(audio)) * 8 / (kbps * 1000)
+
+
+def synthesize_pipelined(
+    text: str,
+    voice_id: str,
+    model_id: str = "eleven_multilingual_v2",
+    output_format: str = "mp3_44100_128",
+    max_in_flight: int = TTS_PIPELINE_WORKERS,
+    synthesize: Optional[Callable[..., bytes]] = None
+) -> Iterator[bytes]:
+    """
+    Synthesizes a response segment by segment, yielding each segment's audio in order as
+    soon as it and its predecessors are ready. At most max_in_flight segments are
+    requested ahead of the one being yielded.
+
+    Args:
+        text (str): The response.
+        voice_id (str): The ElevenLabs voice.
+        model_id (str, optional): The ElevenLabs model. Defaults to "eleven_multilingual_v2".
+        output_format (str, optional): The audio format. Defaults to "mp3_44100_128".
+        max_in_flight (int, optional): Segments requested ahead. Defaults to TTS_PIPELINE_WORKERS.
+        synthesize (Optional[Callable[..., bytes]], optional): The per-segment TTS call, with
+            text_to_speech's signature. Defaults to text_to_speech (cached).
+
+    Yields:
+        bytes: MP3 audio per segment (empty for a segment whose synthesis failed).
+    """
+    if synthesize is None:
+        from app.tts_elevenlabs import text_to_speech as synthesize
+
+    segments = split_segments(text)
+
+    def submit(i: int):
+        return _executor.submit(
+            synthesize,
+            segments[i],
+            voice_id,
+            model_id=model_id,
+            output_format=output_format,
+            previous_text=" ".join(segments[:i])[-1000:],
+            next_text=" ".join(segments[i + 1:])[:1000],
+        )
+
+    pending = deque()
+    next_index = 0
+    try:
+        for _ in range(len(segments)):
+            while next_index < len(segments) and len(pending) < max(1, max_in_flight):
+                pending.append(submit(next_index))
+                next_index += 1
+            yield pending.popleft().result()
+    finally:
+        # The consumer stopped early: do not start the remaining segments
+        for future in pending:
+            future.cancel()
+
+
+def text_to_speech_pipelined(text: str, voice_id: str, **kwargs) -> bytes:
+    """
+    Drop-in replacement for text_to_speech on long responses: segments are synthesized
+    concurrently and stitched into one MP3. kwargs are passed to synthesize_pipelined.
+    """
+    return stitch_mp3(synthesize_pipelined(text, voice_id, **kwargs))
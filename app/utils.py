@@ -1,6 +1,41 @@
 # app/utils.py
 import base64
+import json
+import os
+import time
+import uuid
+from typing import Iterable, Optional
+
 import streamlit as st
+import streamlit.components.v1 as components
+
+# Pause left between autoplayed segments, absorbing browser start-up jitter (seconds)
+PLAYBACK_MARGIN_SECONDS = 0.1
+
+# Player installed once in the page (outside the component iframes, so it outlives them
+# and keeps playing across reruns): plays queued sources back to back, skipping ids it
+# has already queued in case an iframe is mounted again
+_QUEUE_PLAYER_JS = """
+const queue = [], seen = new Set();
+let current = null;
+function next() {
+    current = null;
+    const src = queue.shift();
+    if (src === undefined) return;
+    current = new Audio(src);
+    current.onended = next;
+    current.play().catch(next);
+}
+return function push(id, src) {
+    if (seen.has(id)) return;
+    seen.add(id);
+    queue.push(src);
+    if (current === null) next();
+};
+"""
+
+# Keep a copy of uploaded and recorded audio on disk (transcription works from memory)
+SAVE_UPLOADS = os.environ.get("SAVE_UPLOADS", "0") == "1"
 
 def get_custom_css() -> str:
     """
@@ -92,6 +127,113 @@ def autoplay_audio(audio_bytes: bytes) -> None:
     """
     st.markdown(audio_html, unsafe_allow_html=True)
 
+def autoplay_audio_segments(
+    segments: Iterable[bytes],
+    output_format: str = "mp3_44100_128",
+    wait_for_end: bool = False
+) -> bytes:
+    """
+    Autoplays audio segments one after another as they arrive (e.g. from
+    tts_pipeline.synthesize_pipelined or mp3_frame_chunks), so playback starts with the
+    first segment while later ones are still being synthesized. Blocks until the last
+    segment has started.
+
+    Each segment is its own hidden <audio> element, started from the server when the
+    previous one should have ended (plus PLAYBACK_MARGIN_SECONDS). Elements are added,
+    never replaced, so a segment that starts late in the browser still plays to its
+    end; but playback is not gapless: expect a short pause (the margin plus browser
+    jitter) at each join. Use st.audio on the returned audio for seamless replay.
+
+    Args:
+        segments (Iterable[bytes]): MP3 segments, in order.
+        output_format (str, optional): Their ElevenLabs output format, for timing. Defaults to "mp3_44100_128".
+        wait_for_end (bool, optional): Also wait for the last segment to finish, e.g. before
+            a rerun would remove the players. Defaults to False.
+
+    Returns:
+        bytes: The stitched audio of all segments, e.g. for the chat history.
+    """
+    from app.tts_pipeline import mp3_duration, stitch_mp3
+
+    players = st.container()
+    played = []
+    ends_at = time.monotonic()
+    for segment in segments:
+        if not segment:
+            continue
+        # Starting before the previous segment has ended would play both at once
+        time.sleep(max(0.0, ends_at + PLAYBACK_MARGIN_SECONDS - time.monotonic()))
+        with players:
+            autoplay_audio(segment)
+        ends_at = time.monotonic() + mp3_duration(segment, output_format)
+        played.append(segment)
+    if wait_for_end:
+        time.sleep(max(0.0, ends_at + PLAYBACK_MARGIN_SECONDS - time.monotonic()))
+    return stitch_mp3(played)
+
+def queue_audio(audio_bytes: bytes) -> None:
+    """
+    Queues audio in a player that lives in the browser page rather than in the script
+    run: it plays after anything queued before it, back to back, and keeps playing
+    when the script reruns.
+
+    Args:
+        audio_bytes (bytes): The MP3 audio.
+    """
+    src = "data:audio/mp3;base64," + base64.b64encode(audio_bytes).decode()
+    components.html(f"""
+        <script>
+        const page = window.parent;
+        page.__ttsQueue = page.__ttsQueue || new page.Function({json.dumps(_QUEUE_PLAYER_JS)})();
+        page.__ttsQueue({json.dumps(uuid.uuid4().hex)}, {json.dumps(src)});
+        </script>
+    """, height=0)
+
+def queue_audio_segments(segments: Iterable[bytes]) -> bytes:
+    """
+    Queues audio segments in the page's player as they arrive (see queue_audio), so
+    playback starts with the first segment while later ones are still being synthesized.
+    Returns once the last segment is queued, without waiting for playback, which goes on
+    in the browser after the script run ends or reruns.
+
+    Args:
+        segments (Iterable[bytes]): MP3 segments, in order.
+
+    Returns:
+        bytes: The stitched audio of all segments, e.g. for the chat history.
+    """
+    from app.tts_pipeline import stitch_mp3
+
+    players = st.container()
+    played = []
+    for segment in segments:
+        if not segment:
+            continue
+        with players:
+            queue_audio(segment)
+        played.append(segment)
+    return stitch_mp3(played)
+
+def save_upload(audio_bytes: bytes, filename: str, upload_dir: str = "uploads") -> Optional[str]:
+    """
+    Writes user audio to upload_dir when SAVE_UPLOADS=1 is set.
+
+    Args:
+        audio_bytes (bytes): The audio.
+        filename (str): The file name; any directory part is dropped.
+        upload_dir (str, optional): Where to write it. Defaults to "uploads".
+
+    Returns:
+        Optional[str]: The path written, or None when uploads are not saved.
+    """
+    if not SAVE_UPLOADS or not audio_bytes:
+        return None
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, os.path.basename(filename))
+    with open(path, "wb") as f:
+        f.write(audio_bytes)
+    return path
+
 def render_listening_animation() -> None:
     """
     Renders a listening animation in the Streamlit app to indicate active listening.
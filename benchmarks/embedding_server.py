@@ -0,0 +1,82 @@
+# benchmarks/embedding_server.py
+#
+# Local stand-in for the Ollama embedding endpoint, for benchmarking the index
+# builder without a GPU. It serves POST /api/embed with deterministic vectors
+# and can simulate per-request and per-text latency.
+#
+#   python -m benchmarks.embedding_server --port 11435 --request-latency-ms 20
+#   rm -rf /tmp/standin_vector_db
+#   python -m app.build_sit_vector_db --persist-directory /tmp/standin_vector_db \
+#       --base-url http://localhost:11435 --batch-size 16 --no-cache
+#
+# Build into an empty scratch directory: the stand-in vectors must not replace the real
+# index in vector_context/, and an index that is already up to date embeds nothing.
+# Pass --no-cache so stand-in vectors do not end up in the persistent embedding cache.
+
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.embeddings import DeterministicEmbeddings
+
+
+def make_handler(embeddings: DeterministicEmbeddings, request_latency: float, text_latency: float):
+    """
+    Builds a request handler class bound to the given embedding function and simulated latencies.
+    """
+
+    class EmbedHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            if self.path != "/api/embed":
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            texts = body.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+
+            time.sleep(request_latency + text_latency * len(texts))
+            payload = json.dumps({
+                "model": body.get("model", ""),
+                "embeddings": embeddings.embed_documents(texts),
+            }).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return EmbedHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in Ollama embedding server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimensionality")
+    parser.add_argument("--request-latency-ms", type=float, default=0.0, help="Fixed latency per request")
+    parser.add_argument("--text-latency-ms", type=float, default=0.0, help="Additional latency per embedded text")
+    args = parser.parse_args()
+
+    handler = make_handler(
+        DeterministicEmbeddings(size=args.dim),
+        args.request_latency_ms / 1000,
+        args.text_latency_ms / 1000,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Stand-in embedding server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# benchmarks/retrieval.py
+#
+# Retrieval latency and quality benchmark. For every chunking setting and corpus scale
+# it chunks sit-data/ (plus synthetic distractor chunks drawn from the corpus vocabulary),
+# embeds everything offline with DeterministicEmbeddings, builds each backend in a
+# temporary directory and runs a fixed question set through the retriever the app
+# builds for it (rag_pipeline.get_retriever: hybrid fusion with the question extracted
+# for BM25, then context packing), with the SIT system prompt prepended as query_llm does.
+#
+# Reported per backend: build time, p50/p95/p99 latency, throughput, resident memory
+# growth, on-disk size, recall@k against exact search over the same vectors, and hit@k
+# (the share of questions whose answer text appears in the retrieved chunks), plus the
+# estimated prompt tokens of the retrieved context before and after context packing.
+#
+#   python -m benchmarks.retrieval --scales 0 10000 100000 --output retrieval.json
+#   python -m benchmarks.retrieval --backends numpy ivf int8 --baseline retrieval.json
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+
+from app.context_packing import estimate_tokens
+from app.embeddings import DeterministicEmbeddings
+from app.ingest import iter_source_files
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(ROOT_DIR, 'sit-data')
+
+BACKENDS = ["chroma", "numpy", "ivf", "int8", "pq", "hybrid"]
+CHUNKINGS = ["800/100", "400/50", "1600/200"]
+EMBEDDING_DIM = 256
+
+# Fixed question set with strings expected in a relevant chunk
+QUESTIONS = [
+    {"question": "Who founded SIT and when?", "answers": ["Tan Chin Tiong"]},
+    {"question": "Where is the SIT campus located?", "answers": ["Punggol Coast"]},
+    {"question": "Who is the president of SIT?", "answers": ["Chua Kee Chaing"]},
+    {"question": "When was the SIT Bill passed?", "answers": ["2014"]},
+    {"question": "How many students can the Punggol campus house?", "answers": ["12,000"]},
+    {"question": "What are the five academic clusters of SIT?", "answers": ["Infocomm Technology"]},
+    {"question": "How many applicants competed for places in 2023?", "answers": ["13,053"]},
+    {"question": "Which qualifications does SIT accept for admission?", "answers": ["International Baccalaureate"]},
+    {"question": "Which overseas universities does SIT partner with?", "answers": ["DigiPen", "Newcastle University"]},
+    {"question": "What applied research centres does SIT have?", "answers": ["Tunnel Engineering", "FoodPlant"]},
+    {"question": "What innovation centres are at SIT?", "answers": ["Design Factory"]},
+    {"question": "What are the university colours?", "answers": ["Red, Black, White"]},
+    {"question": "What is the SIT website address?", "answers": ["singaporetech.edu.sg"]},
+    {"question": "Which other campuses does SIT have besides Punggol?", "answers": ["SIT@Dover"]},
+    {"question": "What was the Poly-FSI initiative?", "answers": ["Poly-FSI"]},
+    {"question": "How many undergraduate programmes does the Engineering cluster offer?", "answers": ["13 undergraduate"]},
+]
+
+
+class LookupEmbeddings(Embeddings):
+    """
+    Serves precomputed vectors for known texts, so a corpus is embedded once and shared
+    by every backend; unknown texts (queries) are embedded by the wrapped function.
+    """
+
+    def __init__(self, embeddings: Embeddings, table: Dict[str, np.ndarray]) -> None:
+        self.embeddings = embeddings
+        self.table = table
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.table[t].tolist() if t in self.table else self.embeddings.embed_query(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def rss_bytes() -> int:
+    """
+    Current resident set size of this process (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def disk_bytes(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def load_texts(sources: List[str]) -> List[str]:
+    texts = []
+    for path in iter_source_files(sources):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            texts.append(f.read())
+    return texts
+
+
+def chunk_texts(texts: List[str], chunking: str) -> List[str]:
+    """
+    Splits the source texts with the repo's splitter, given "chunk_size/chunk_overlap".
+    """
+    size, overlap = map(int, chunking.split('/'))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap)
+    chunks = [chunk for text in texts for chunk in splitter.split_text(text)]
+    return list(dict.fromkeys(chunks))
+
+
+def synthetic_chunks(texts: List[str], count: int, chunk_chars: int, seed: int = 0) -> List[str]:
+    """
+    Distractor chunks of about chunk_chars characters, with words drawn from the corpus
+    unigram distribution so they share vocabulary (and hence embedding mass) with it.
+    """
+    if count <= 0:
+        return []
+    words = Counter(re.findall(r"\S+", " ".join(texts)))
+    vocab = np.array(list(words))
+    probs = np.array(list(words.values()), dtype=np.float64)
+    probs /= probs.sum()
+    mean_len = sum(len(w) + 1 for w in words.elements()) / sum(words.values())
+    per_chunk = max(1, int(chunk_chars / mean_len))
+    rng = np.random.default_rng(seed)
+    drawn = rng.choice(len(vocab), size=(count, per_chunk), p=probs)
+    return [f"Record {n}: " + " ".join(vocab[row]) for n, row in enumerate(drawn)]
+
+
+def embed_corpus(embeddings: Embeddings, chunks: List[str], batch_size: int = 1000) -> np.ndarray:
+    return np.concatenate([
+        np.asarray(embeddings.embed_documents(chunks[start:start + batch_size]), dtype=np.float32)
+        for start in range(0, len(chunks), batch_size)
+    ])
+
+
+def build_backends(workdir: str, chunks: List[str], vectors: np.ndarray, embeddings: Embeddings, backends: List[str]) -> Dict[str, dict]:
+    """
+    Builds the stores/indexes the requested backends need. Returns, per backend, its
+    build time in seconds and the paths it reads.
+    """
+    from app.ann_index import IVFIndex
+    from app.bm25 import BM25Index
+    from app.numpy_store import NumpyVectorStore
+    from app.quantization import QuantizedIndex
+
+    built = {}
+    ids = [str(n) for n in range(len(chunks))]
+    numpy_dir = os.path.join(workdir, 'numpy')
+    if set(backends) - {"chroma"}:
+        start = time.perf_counter()
+        store = NumpyVectorStore(numpy_dir)
+        store.add_vectors(vectors, chunks, ids=ids)
+        elapsed = time.perf_counter() - start
+        built["numpy"] = {"build_s": elapsed, "paths": [numpy_dir]}
+        for name, build in (
+            ("ivf", lambda d: IVFIndex.build(store, d)),
+            ("int8", lambda d: QuantizedIndex.build(store, "int8", d)),
+            ("pq", lambda d: QuantizedIndex.build(store, "pq", d)),
+            ("hybrid", lambda d: BM25Index.build((Document(page_content=c) for c in chunks), d)),
+        ):
+            if name in backends:
+                start = time.perf_counter()
+                build(os.path.join(workdir, name))
+                built[name] = {"build_s": elapsed + time.perf_counter() - start, "paths": [numpy_dir, os.path.join(workdir, name)]}
+        store.close()
+
+    if "chroma" in backends:
+        from langchain_community.vectorstores import Chroma
+
+        chroma_dir = os.path.join(workdir, 'chroma')
+        start = time.perf_counter()
+        chroma = Chroma(persist_directory=chroma_dir, embedding_function=LookupEmbeddings(embeddings, dict(zip(chunks, vectors))))
+        for offset in range(0, len(chunks), 1000):
+            chroma.add_texts(chunks[offset:offset + 1000], ids=ids[offset:offset + 1000])
+        built["chroma"] = {"build_s": time.perf_counter() - start, "paths": [chroma_dir]}
+        del chroma
+    return built
+
+
+def question_query(question: str) -> str:
+    """
+    The retriever query the app sends for a question (system prompt + question).
+    """
+    from app.rag_pipeline import SIT_SYSTEM_PROMPT
+
+    return SIT_SYSTEM_PROMPT + question
+
+
+def open_retriever(backend: str, workdir: str, embeddings: Embeddings, k: int):
+    """
+    Opens a backend from the benchmark directory and builds its retriever with the app's
+    factory, returning (packed retriever, store).
+    """
+    from app.rag_pipeline import get_retriever
+
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+
+        store = Chroma(persist_directory=os.path.join(workdir, 'chroma'), embedding_function=embeddings)
+    elif backend in ("numpy", "hybrid"):
+        from app.numpy_store import NumpyVectorStore
+
+        store = NumpyVectorStore(os.path.join(workdir, 'numpy'), embeddings)
+    elif backend == "ivf":
+        from app.ann_index import IVFVectorStore
+
+        store = IVFVectorStore(os.path.join(workdir, 'numpy'), embeddings, index_directory=os.path.join(workdir, 'ivf'))
+    else:
+        from app.quantization import QuantizedVectorStore
+
+        store = QuantizedVectorStore(os.path.join(workdir, 'numpy'), embeddings, mode=backend,
+                                     index_directory=os.path.join(workdir, backend))
+
+    if backend == "hybrid":
+        from app.bm25 import BM25Index
+
+        return get_retriever(store, k, mode="hybrid", bm25=BM25Index(os.path.join(workdir, 'hybrid'))), store
+    return get_retriever(store, k, mode="vector"), store
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def run_backend(backend: str, workdir: str, embeddings: Embeddings, k: int, repeat: int, exact: List[set]) -> dict:
+    """
+    Runs the question set through one backend: one untimed warm-up pass, then `repeat`
+    timed passes.
+    """
+    gc.collect()
+    rss_before = rss_bytes()
+    retriever, store = open_retriever(backend, workdir, embeddings, k)
+    queries = [question_query(q["question"]) for q in QUESTIONS]
+    # The chunks before packing, and the packed context the prompt receives
+    results = [retriever.retriever.invoke(query) for query in queries]
+    packed = [retriever.invoke(query) for query in queries]
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            t = time.perf_counter()
+            retriever.invoke(query)
+            latencies.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - start
+
+    retrieved = [{doc.page_content for doc in docs} for docs in results]
+    hits = sum(any(a.lower() in text.lower() for text in texts for a in q["answers"]) for q, texts in zip(QUESTIONS, retrieved))
+    packed_hits = sum(any(a.lower() in doc.page_content.lower() for doc in docs for a in q["answers"]) for q, docs in zip(QUESTIONS, packed))
+    row = {
+        **percentiles(latencies),
+        "qps": round(len(latencies) / elapsed, 1),
+        "rss_mb": round((rss_bytes() - rss_before) / 2**20, 2),
+        f"recall@{k}": None if backend == "hybrid" else round(
+            sum(len(r & e) for r, e in zip(retrieved, exact)) / max(1, sum(len(e) for e in exact)), 4),
+        f"hit@{k}": round(hits / len(QUESTIONS), 4),
+        "context_tokens": round(float(np.mean([sum(estimate_tokens(d.page_content) for d in docs) for docs in results])), 1),
+        "packed_tokens": round(float(np.mean([sum(estimate_tokens(d.page_content) for d in docs) for docs in packed])), 1),
+        f"packed_hit@{k}": round(packed_hits / len(QUESTIONS), 4),
+    }
+    if hasattr(store, "close"):
+        store.close()
+    del retriever, store
+    return row
+
+
+def run(
+    sources: List[str],
+    backends: List[str],
+    chunkings: List[str],
+    scales: List[int],
+    k: int = 4,
+    repeat: int = 5,
+    dim: int = EMBEDDING_DIM,
+    keep: Optional[str] = None
+) -> dict:
+    """
+    Runs the benchmark matrix and returns the machine-readable report.
+
+    Args:
+        sources (List[str]): Files/directories forming the real corpus.
+        backends (List[str]): Backends to measure, from BACKENDS.
+        chunkings (List[str]): "chunk_size/chunk_overlap" settings.
+        scales (List[int]): Synthetic distractor chunks added per run (0 = real corpus only).
+        k (int, optional): Chunks retrieved per question. Defaults to 4.
+        repeat (int, optional): Timed passes over the question set. Defaults to 5.
+        dim (int, optional): Embedding dimensionality. Defaults to EMBEDDING_DIM.
+        keep (Optional[str], optional): Directory to keep the built indexes in. Defaults to a
+            temporary directory that is removed afterwards.
+
+    Returns:
+        dict: {"config": ..., "results": [one row per chunking, scale and backend]}.
+    """
+    from app.numpy_store import normalize_rows, top_k
+
+    embeddings = DeterministicEmbeddings(dim)
+    texts = load_texts(sources)
+    query_vectors = normalize_rows(np.asarray(embeddings.embed_documents([question_query(q["question"]) for q in QUESTIONS]), dtype=np.float32))
+    report = {
+        "config": {"sources": sources, "backends": backends, "chunkings": chunkings, "scales": scales,
+                   "k": k, "repeat": repeat, "dim": dim, "questions": len(QUESTIONS),
+                   "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                   "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": [],
+    }
+
+    for chunking in chunkings:
+        real = chunk_texts(texts, chunking)
+        for scale in scales:
+            chunks = real + synthetic_chunks(texts, scale, int(chunking.split('/')[0]))
+            workdir = os.path.join(keep, f"{chunking.replace('/', '-')}-{scale}") if keep else tempfile.mkdtemp(prefix="retrieval-bench-")
+            os.makedirs(workdir, exist_ok=True)
+            try:
+                start = time.perf_counter()
+                vectors = normalize_rows(embed_corpus(embeddings, chunks))
+                embed_s = time.perf_counter() - start
+                exact = [{chunks[row] for row in top_k(vectors @ q, k)} for q in query_vectors]
+                built = build_backends(workdir, chunks, vectors, embeddings, backends)
+                for backend in backends:
+                    row = {"backend": backend, "chunking": chunking, "scale": scale, "chunks": len(chunks),
+                           "embed_s": round(embed_s, 3), "build_s": round(built[backend]["build_s"], 3),
+                           "disk_mb": round(sum(disk_bytes(p) for p in built[backend]["paths"]) / 2**20, 2)}
+                    row.update(run_backend(backend, workdir, embeddings, k, repeat, exact))
+                    report["results"].append(row)
+                    print(f"{chunking:>9} {scale:>7} {backend:>7}  p50 {row['p50_ms']:8.3f} ms  p99 {row['p99_ms']:8.3f} ms  "
+                          f"{row['qps']:8.1f} q/s  recall {row[f'recall@{k}']}  hit {row[f'hit@{k}']}  "
+                          f"context {row['context_tokens']:.0f} -> {row['packed_tokens']:.0f} tok", flush=True)
+            finally:
+                if not keep:
+                    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(baseline: dict, current: dict, latency_tolerance: float = 0.2, quality_tolerance: float = 0.01) -> List[str]:
+    """
+    Lists regressions of `current` against `baseline`: p95 latency more than
+    latency_tolerance (relative) slower, or recall/hit more than quality_tolerance lower.
+    Rows are matched on (backend, chunking, scale).
+    """
+    key = lambda row: (row["backend"], row["chunking"], row["scale"])
+    previous = {key(row): row for row in baseline["results"]}
+    regressions = []
+    for row in current["results"]:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        if row["p95_ms"] > old["p95_ms"] * (1 + latency_tolerance):
+            regressions.append(f"{key(row)}: p95 {old['p95_ms']} -> {row['p95_ms']} ms")
+        for metric in (m for m in row if m.startswith(("recall@", "hit@"))):
+            if old.get(metric) is not None and row[metric] is not None and row[metric] < old[metric] - quality_tolerance:
+                regressions.append(f"{key(row)}: {metric} {old[metric]} -> {row[metric]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency and quality per backend and chunking.")
+    parser.add_argument("sources", nargs="*", default=[DATA_DIR], help="Files/directories forming the real corpus")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--chunkings", nargs="+", default=CHUNKINGS, help="chunk_size/chunk_overlap settings")
+    parser.add_argument("--scales", nargs="+", type=int, default=[0, 10000], help="Synthetic chunks added to the corpus")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes over the question set")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--keep", default=None, help="Keep the built indexes under this directory")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="Previous JSON report; exit 1 on regressions")
+    args = parser.parse_args()
+
+    report = run(args.sources, args.backends, args.chunkings, args.scales, args.k, args.repeat, args.dim, args.keep)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        print(f"Report written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), report)
+        for line in regressions:
+            print(f"[WARN] Regression {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,132 @@
+# benchmarks/tts_server.py
+#
+# Local stand-in for the ElevenLabs TTS API, for testing streaming playback without an
+# API key or quota. It serves GET /v1/voices, POST /v1/text-to-speech/<voice> (whole
+# file), POST /v1/text-to-speech/<voice>/stream (chunked transfer encoding) and
+# POST /v1/speech-to-text (echoes the size of the uploaded request). The
+# audio is a valid but silent 128 kbps / 44.1 kHz MP3 (ID3 tag, Info frame, frames) whose
+# length follows the text; synthesis latency is simulated with a time to first byte and
+# a speed relative to real time.
+#
+#   python -m benchmarks.tts_server --port 8765 --first-byte-ms 300 --speed 4
+#   ELEVENLABS_BASE_URL=http://localhost:8765 python -m benchmarks.tts_streaming
+#   ELEVENLABS_BASE_URL=http://localhost:8765 streamlit run streamlit_app_sit.py
+
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono: 417-byte frames of 1152 samples
+FRAME_HEADER = b"\xff\xfb\x90\xc4"
+FRAME_BYTES = 417
+FRAME_SECONDS = 1152 / 44100
+
+# Speaking rate used to size the audio
+CHARS_PER_SECOND = 15
+
+VOICES = {"voices": [{"voice_id": "standin", "name": "Stand-in (silent)"}]}
+
+
+def synthetic_mp3(text: str) -> bytes:
+    """
+    Silent MP3 of about the duration it would take to speak `text`.
+    """
+    frames = max(1, int(len(text) / CHARS_PER_SECOND / FRAME_SECONDS))
+    frame = FRAME_HEADER + bytes(FRAME_BYTES - 4)
+    info = FRAME_HEADER + bytes(32) + b"Info" + bytes(FRAME_BYTES - 40)
+    return b"ID3\x04\x00\x00\x00\x00\x00\x00" + info + frame * frames
+
+
+def make_handler(first_byte: float, speed: float, chunk_bytes: int):
+    """
+    Builds a request handler class bound to the given simulated latencies.
+    """
+
+    class TTSHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/v1/voices":
+                self.send_error(404)
+                return
+            self._send_json(200, VOICES)
+
+        def do_POST(self) -> None:
+            if self.path.split("?")[0] == "/v1/speech-to-text":
+                upload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._send_json(200, {"text": f"Received {len(upload)} bytes."})
+                return
+            match = re.fullmatch(r"/v1/text-to-speech/([^/?]+)(/stream)?(?:\?.*)?", self.path)
+            if not match:
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            text = body.get("text", "")
+            if not text:
+                self._send_json(400, {"detail": "text is required"})
+                return
+
+            audio = synthetic_mp3(text)
+            # Audio is "synthesized" at `speed` times real time after the first byte
+            seconds_per_byte = FRAME_SECONDS / FRAME_BYTES / speed
+            time.sleep(first_byte)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            if match.group(2):
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in _chunks(audio, chunk_bytes):
+                    time.sleep(len(chunk) * seconds_per_byte)
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(len(audio) * seconds_per_byte)
+                self.send_header("Content-Length", str(len(audio)))
+                self.end_headers()
+                self.wfile.write(audio)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return TTSHandler
+
+
+def _chunks(data: bytes, size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in ElevenLabs TTS server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-byte-ms", type=float, default=300.0, help="Latency before the first audio byte")
+    parser.add_argument("--speed", type=float, default=4.0, help="Synthesis speed relative to real time")
+    parser.add_argument("--chunk-bytes", type=int, default=1000, help="Size of streamed chunks (not frame aligned)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(args.first_byte_ms / 1000, args.speed, args.chunk_bytes),
+    )
+    print(f"Stand-in ElevenLabs TTS server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
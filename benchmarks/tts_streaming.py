@@ -0,0 +1,99 @@
+# benchmarks/tts_streaming.py
+#
+# Time to first playable audio, buffered vs streamed TTS. Each text is synthesized with
+# text_to_speech (the whole MP3 is downloaded before playback can start) and with
+# text_to_speech_stream regrouped by mp3_frame_chunks (playback starts with the first
+# whole-frame chunk). The cache is bypassed. Also checks that the streamed frames are
+# the buffered file's frames.
+#
+# By default a stand-in server (benchmarks/tts_server.py) is started in-process; pass
+# --base-url to measure another server. ELEVENLABS_BASE_URL is set before the TTS module
+# is imported.
+#
+#   python -m benchmarks.tts_streaming --first-byte-ms 300 --speed 4 --output tts.json
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from typing import Dict, List
+
+from benchmarks.tts_server import make_handler
+
+TEXTS = [
+    "Yes.",
+    "The admission office is open from nine to five on weekdays.",
+    "Hostel rooms are allotted in the order of admission. First-year students share a room, "
+    "senior students may apply for a single room, and the mess is included in the hostel fee.",
+]
+
+
+def measure(texts: List[str], voice_id: str) -> List[Dict[str, float]]:
+    from app.tts_elevenlabs import text_to_speech, text_to_speech_stream
+    from app.tts_pipeline import _drop_info_frame, mp3_duration, mp3_frame_chunks, strip_id3
+
+    results = []
+    for text in texts:
+        start = time.perf_counter()
+        audio = text_to_speech(text, voice_id, use_cache=False)
+        buffered = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first_chunk = None
+        chunks = []
+        for chunk in mp3_frame_chunks(text_to_speech_stream(text, voice_id, use_cache=False)):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            chunks.append(chunk)
+        streamed = time.perf_counter() - start
+
+        results.append({
+            "chars": len(text),
+            "audio_seconds": round(mp3_duration(audio), 3),
+            "buffered_first_audio_s": round(buffered, 3),
+            "streamed_first_audio_s": round(first_chunk or streamed, 3),
+            "streamed_total_s": round(streamed, 3),
+            "chunks": len(chunks),
+            "identical_frames": b"".join(chunks) == _drop_info_frame(strip_id3(audio)),
+        })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Buffered vs streamed TTS benchmark.")
+    parser.add_argument("--base-url", default=None, help="TTS server; default: in-process stand-in")
+    parser.add_argument("--voice-id", default="standin")
+    parser.add_argument("--first-byte-ms", type=float, default=300.0, help="Stand-in latency before the first byte")
+    parser.add_argument("--speed", type=float, default=4.0, help="Stand-in synthesis speed relative to real time")
+    parser.add_argument("--chunk-bytes", type=int, default=1000, help="Stand-in streamed chunk size")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0),
+            make_handler(args.first_byte_ms / 1000, args.speed, args.chunk_bytes),
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["ELEVENLABS_BASE_URL"] = base_url
+
+    try:
+        results = measure(TEXTS, args.voice_id)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = json.dumps({"base_url": base_url, "results": results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
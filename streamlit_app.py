@@ -1,11 +1,16 @@
 # streamlit_app.py
 
-import os
+import uuid
 import streamlit as st
-from app.stt_elevenlabs import transcribe_audio
-from app.tts_elevenlabs import list_voices, text_to_speech
-from app.rag_pipeline import llm_response_finance  # or your llm_response function
-from app.rag_pipeline import llm_response_sit  # or your llm_response function
+from app.stt_elevenlabs import TRANSCRIPTION_FAILED, transcribe_audio
+from app.http_client import http_stats
+from app.tts_elevenlabs import list_voices, text_to_speech_stream
+from app.tts_pipeline import mp3_frame_chunks
+from app.rag_pipeline import stream_response_sit
+from app.rag_pipeline import answer_cache_stats, scheduler_stats, speculate_sit
+from app.scheduler import session_scope
+from app.rag_pipeline import warm_up_vector_db
+from app.utils import autoplay_audio_segments, save_upload
 
 # —————————————————————————————
 # Setup
@@ -13,15 +18,26 @@ from app.rag_pipeline import llm_response_sit  # or your llm_response function
 
 st.set_page_config(page_title="Voice-Driven RAG Q&A", layout="centered")
 
-# Ensure upload directory exists
+# Audio is only written here with SAVE_UPLOADS=1
 UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+@st.cache_resource(show_spinner=False)
+def start_vector_db_warm_up():
+    # Once per process: load the vector DB in the background while the page renders
+    return warm_up_vector_db(background=True)
+
+
+start_vector_db_warm_up()
 
 # Initialize session state
 if "response" not in st.session_state:
     st.session_state.response = None
 if "transcript" not in st.session_state:
     st.session_state.transcript = None
+if "session_id" not in st.session_state:
+    # Identifies this browser session to the Ollama scheduler's fair queue
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Fetch TTS voices once
 voices = list_voices().get("voices", [])
@@ -40,6 +56,26 @@ with st.sidebar:
     )
     voice_id = voice_map[voice_name]
 
+    cache_stats = answer_cache_stats()
+    if cache_stats:
+        st.header("Answer Cache")
+        st.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}", help=f"{cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        st.metric("Generation time saved", f"{cache_stats['seconds_saved']:.1f} s")
+
+    llm_queue = scheduler_stats()["generation"]
+    st.header("LLM Queue")
+    st.metric("Waiting", llm_queue["queue_depth"], help=f"{llm_queue['running']} of {llm_queue['max_concurrency']} slots busy")
+    st.metric("Queue wait p95", f"{llm_queue['wait_p95_ms']:.0f} ms", help=f"{llm_queue['coalesced']} duplicate requests coalesced")
+
+    api_stats = http_stats()
+    if api_stats:
+        st.header("ElevenLabs API")
+        for endpoint, endpoint_stats in api_stats.items():
+            st.metric(
+                f"{endpoint} p95", f"{endpoint_stats['p95_ms']:.0f} ms",
+                help=f"{endpoint_stats['requests']} requests, {endpoint_stats['retries']} retries, {endpoint_stats['failures']} failures"
+            )
+
 # —————————————————————————————
 # Main UI
 # —————————————————————————————
@@ -68,23 +104,35 @@ except AttributeError:
     audio_recording = None
     audio_input_supported = False
 
-# When we have audio, save + transcribe once
+# When we have audio, transcribe it from memory
 if audio_file or (audio_input_supported and audio_recording):
     if audio_file:
-        path = os.path.join(UPLOAD_DIR, audio_file.name)
-        with open(path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        st.success(f"📥 Saved upload to `{path}`")
+        audio_bytes, filename = audio_file.getvalue(), audio_file.name
+        path = save_upload(audio_bytes, filename, UPLOAD_DIR)
+        if path:
+            st.success(f"📥 Saved upload to `{path}`")
     elif audio_input_supported and audio_recording:
-        path = os.path.join(UPLOAD_DIR, "mic_recording.wav")
-        with open(path, "wb") as f:
-            f.write(audio_recording.read())
-        st.success(f"🎤 Saved recording to `{path}`")
-        st.audio(audio_recording, format="audio/wav")
+        audio_bytes, filename = audio_recording.getvalue(), "mic_recording.wav"
+        path = save_upload(audio_bytes, filename, UPLOAD_DIR)
+        if path:
+            st.success(f"🎤 Saved recording to `{path}`")
+        st.audio(audio_bytes, format="audio/wav")
 
     # Transcribe
     with st.spinner("📝 Transcribing…"):
-        st.session_state.transcript = transcribe_audio(path, language="en")
+        st.session_state.transcript = transcribe_audio(audio_bytes, language="en", filename=filename)
+
+    # Start retrieving while the user reviews the transcript; restarted only for a new one
+    if st.session_state.get("speculated_transcript") != st.session_state.transcript:
+        previous = st.session_state.pop("speculation", None)
+        if previous is not None:
+            previous.cancel()
+        st.session_state.speculated_transcript = st.session_state.transcript
+        if st.session_state.transcript and st.session_state.transcript != TRANSCRIPTION_FAILED:
+            with session_scope(st.session_state.session_id):
+                st.session_state.speculation = speculate_sit(st.session_state.transcript)
+        else:
+            st.session_state.speculation = None
 
 # Show editable transcript if available
 if st.session_state.transcript:
@@ -96,25 +144,30 @@ if st.session_state.transcript:
         key="editable_transcript"
     )
 
-    # Query LLM
+    # Query LLM, rendering the answer as it streams in
     if st.button("💡 Get Answer", key="get_answer"):
-        with st.spinner("🤖 Thinking…"):
-            # st.session_state.response = llm_response_finance(editable)
-            st.session_state.response = llm_response_sit(editable)
+        st.markdown("### ✅ Response")
+        with session_scope(st.session_state.session_id):
+            st.session_state.response = st.write_stream(
+                stream_response_sit(editable, speculation=st.session_state.pop("speculation", None))
+            )
+        st.session_state.response_streamed = True
 
 # Display LLM response if we have one
 if st.session_state.response:
-    st.markdown("### ✅ Response")
-    st.write(st.session_state.response)
+    if not st.session_state.pop("response_streamed", False):
+        st.markdown("### ✅ Response")
+        st.write(st.session_state.response)
 
     # TTS playback
     st.markdown("### 3️⃣ Listen to the Answer")
     if st.button("🔉 Play Answer", key="play_tts"):
         with st.spinner("🔊 Generating speech…"):
-            audio_bytes = text_to_speech(
+            # Playback starts with the first downloaded frames
+            audio_bytes = autoplay_audio_segments(mp3_frame_chunks(text_to_speech_stream(
                 text=st.session_state.response,
                 voice_id=voice_id
-            )
+            )))
         if audio_bytes:
             st.audio(audio_bytes, format="audio/mp3")
         else:
@@ -1,44 +1,38 @@
 # streamlit_app_medical_modular.py
 
-import os
 import time
 import threading
+import uuid
 
 import numpy as np
 import streamlit as st
 import streamlit.components.v1 as components
 
 from app.stt_elevenlabs import transcribe_audio
-from app.tts_elevenlabs import list_voices, text_to_speech
-from app.rag_pipeline import llm_response_medical_debate
+from app.tts_elevenlabs import list_voices, text_to_speech_stream
+from app.tts_pipeline import mp3_frame_chunks, synthesize_pipelined
+from app.rag_pipeline import new_debate_evidence, new_debate_memory, stream_response_medical_debate
+from app.scheduler import session_scope
+from app.think_filter import strip_think
 from app.utils import (
     get_custom_css,
-    autoplay_audio,
+    queue_audio_segments,
     render_listening_animation,
     render_message_bubbles,
+    save_upload,
 )
 from app.vad import VoiceActivityDetector
 
 # —————————————————————————————
 # Constants
 # —————————————————————————————
+# Audio is only written here with SAVE_UPLOADS=1
 UPLOAD_DIR = "uploads"
 
 
 # —————————————————————————————
 # Helper Functions
 # —————————————————————————————
-def ensure_upload_dir() -> None:
-    """
-    Ensure the upload directory exists.
-    Creates the UPLOAD_DIR if it does not already exist.
-
-    Returns:
-        None
-    """
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-
 def on_silence_detected() -> None:
     """
     Callback invoked by VAD when silence is detected.
@@ -130,6 +124,8 @@ def init_session_state() -> None:
         "debate_topic": "",
         "debate_side": "against",
         "debate_started": False,
+        "debate_memory": None,
+        "debate_evidence": None,
         "listening": False,
         "recording": False,
         "last_user_input": None,
@@ -137,6 +133,8 @@ def init_session_state() -> None:
         "vad_timeout": 2.0,
         "audio_buffer": None,
         "should_stop_recording": False,
+        # Identifies this browser session to the Ollama scheduler's fair queue
+        "session_id": uuid.uuid4().hex,
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -246,6 +244,9 @@ def render_setup_panel(voice_map: dict) -> None:
             st.session_state.debate_started = True
             st.session_state.debate_round = 1
             st.session_state.chat_history = []
+            st.session_state.debate_memory = new_debate_memory(topic)
+            # Topic evidence is retrieved in the background while the user records
+            st.session_state.debate_evidence = new_debate_evidence(topic)
             st.rerun()
         else:
             st.error("Please enter a debate topic to begin.")
@@ -292,6 +293,8 @@ def render_debate_interface() -> None:
         if st.button("🔄 New Debate", key="new_debate"):
             st.session_state.debate_started = False
             st.session_state.chat_history = []
+            st.session_state.debate_memory = None
+            st.session_state.debate_evidence = None
             st.experimental_rerun()
 
     # Determine live mic support and get audio_data
@@ -336,6 +339,7 @@ def render_main_ui() -> None:
             st.markdown(f"**{role}:** {msg['text']}")
         if st.button("🧹 Clear History", key="clear_history"):
             st.session_state.chat_history = []
+            st.session_state.debate_memory = new_debate_memory(st.session_state.debate_topic)
 
     # === Main area ===
     st.title("🧠 Medical Voice Debate")
@@ -368,17 +372,15 @@ def render_main_ui() -> None:
             None
         )
         if last_bot:
-            raw = last_bot["text"]
-            if "</think>" in raw:
-                bot_text = raw.split("</think>", 1)[1].strip()
-            else:
-                bot_text = raw
+            bot_text = strip_think(last_bot["text"])
                 
             if st.button("▶️ Play AI Response", key="play_ai"):
-                # call your TTS function here
-                tts_bytes = text_to_speech(
-                    text=bot_text,
-                    voice_id=st.session_state.voice_id
+                # Played while it downloads, then kept as a player for replays
+                tts_bytes = queue_audio_segments(
+                    mp3_frame_chunks(text_to_speech_stream(
+                        text=bot_text,
+                        voice_id=st.session_state.voice_id
+                    ))
                 )
                 if tts_bytes:
                     st.audio(tts_bytes, format="audio/mp3")
@@ -403,10 +405,8 @@ def handle_audio_input(audio_data, live_supported: bool) -> None:
         None
     """
     if live_supported and audio_data:
-        file_path = os.path.join(UPLOAD_DIR, "mic_recording.wav")
-        with open(file_path, "wb") as f:
-            audio_bytes = audio_data.read()
-            f.write(audio_bytes)
+        audio_bytes = audio_data.getvalue()
+        save_upload(audio_bytes, "mic_recording.wav", UPLOAD_DIR)
 
         st.session_state.listening = False
 
@@ -418,20 +418,18 @@ def handle_audio_input(audio_data, live_supported: bool) -> None:
 
         # Transcription
         with st.spinner("Transcribing..."):
-            user_text = transcribe_audio(file_path, language="en")
+            user_text = transcribe_audio(audio_bytes, language="en", filename="mic_recording.wav")
 
         _process_user_text(user_text, audio_bytes)
 
     elif not live_supported and audio_data:
-        # Uploaded file path & bytes
-        path = os.path.join(UPLOAD_DIR, audio_data.name)
-        with open(path, "wb") as f:
-            f.write(audio_data.getbuffer())
+        # Uploaded file bytes
         audio_bytes = audio_data.getvalue()
+        save_upload(audio_bytes, audio_data.name, UPLOAD_DIR)
 
         st.session_state.listening = False
         with st.spinner("Transcribing..."):
-            user_text = transcribe_audio(path, language="en")
+            user_text = transcribe_audio(audio_bytes, language="en", filename=audio_data.name)
 
         _process_user_text(user_text, audio_bytes)
 
@@ -458,25 +456,38 @@ def _process_user_text(user_text: str, audio_bytes: bytes) -> None:
         "audio": audio_bytes
     })
 
-    # Generate AI response
-    with st.spinner("AI is responding..."):
-        if len(st.session_state.chat_history) == 1:
-            context = f"Topic: {st.session_state.debate_topic}. User's opening argument: {user_text}"
-        else:
-            context = user_text
+    # Generate AI response, rendering it as it streams in
+    if len(st.session_state.chat_history) == 1:
+        context = f"Topic: {st.session_state.debate_topic}. User's opening argument: {user_text}"
+    else:
+        context = user_text
+
+    if st.session_state.get("debate_memory") is None:
+        st.session_state.debate_memory = new_debate_memory(st.session_state.debate_topic)
+    memory = st.session_state.debate_memory
 
-        bot_text = llm_response_medical_debate(
+    with st.chat_message("assistant"), session_scope(st.session_state.session_id):
+        bot_text = st.write_stream(stream_response_medical_debate(
             context,
             debate_side=st.session_state.debate_side,
             debate_round=len(st.session_state.chat_history)//2 + 1,
-        )
-        bot_audio = text_to_speech(text=bot_text, voice_id=st.session_state.voice_id)
-
-    st.session_state.chat_history.append({
+            memory=memory,
+            evidence=st.session_state.get("debate_evidence"),
+        ))
+    # Older rounds are summarized in the background while the reply is voiced
+    memory.add_turn(context, bot_text)
+    # Recorded with the memory turn, before any audio, so a rerun cannot drop the reply
+    bot_message = {
         "role": "bot",
         "text": bot_text,
-        "audio": bot_audio
-    })
+        "audio": None
+    }
+    st.session_state.chat_history.append(bot_message)
+    # Speak the reply sentence by sentence while the rest is synthesized; playback goes
+    # on in the browser, so the script does not wait for it
+    bot_message["audio"] = queue_audio_segments(
+        synthesize_pipelined(bot_text, st.session_state.voice_id)
+    )
 
     # Auto-listen for next turn
     if st.session_state.auto_listen:
@@ -500,7 +511,7 @@ def handle_footer_and_reset() -> None:
         st.caption("Click 'New Debate' to restart.")
 
     if st.query_params.get("clear_chat"):
-        for key in ["debate_started", "debate_topic", "chat_history", "listening", "last_user_input", "response", "transcript"]:
+        for key in ["debate_started", "debate_topic", "chat_history", "debate_memory", "debate_evidence", "listening", "last_user_input", "response", "transcript"]:
             st.session_state[key] = False if isinstance(st.session_state.get(key), bool) else None
         st.rerun()
 
@@ -515,7 +526,6 @@ def main() -> None:
     Returns:
         None
     """
-    ensure_upload_dir()
     init_session_state()
     setup_page()
     voice_map = load_voices()
@@ -1,10 +1,14 @@
 # streamlit_app.py
 
-import os
+import uuid
 import streamlit as st
 from app.stt_elevenlabs import transcribe_audio
-from app.tts_elevenlabs import list_voices, text_to_speech
-from app.rag_pipeline import llm_response_sit
+from app.tts_elevenlabs import list_voices, text_to_speech_stream
+from app.tts_pipeline import mp3_frame_chunks
+from app.rag_pipeline import stream_response_sit
+from app.rag_pipeline import warm_up_vector_db
+from app.scheduler import session_scope
+from app.utils import autoplay_audio_segments, save_upload
 
 # —————————————————————————————
 # Setup
@@ -12,9 +16,17 @@ from app.rag_pipeline import llm_response_sit
 
 st.set_page_config(page_title="Voice-Driven RAG Q&A", layout="centered")
 
-# Ensure upload directory exists
+# Audio is only written here with SAVE_UPLOADS=1
 UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+@st.cache_resource(show_spinner=False)
+def start_vector_db_warm_up():
+    # Once per process: load the vector DB in the background while the page renders
+    return warm_up_vector_db(background=True)
+
+
+start_vector_db_warm_up()
 
 # Initialize session state
 if "response" not in st.session_state:
@@ -23,6 +35,9 @@ if "transcript" not in st.session_state:
     st.session_state.transcript = None
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "session_id" not in st.session_state:
+    # Identifies this browser session to the Ollama scheduler's fair queue
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Fetch TTS voices once
 voices = list_voices().get("voices", [])
@@ -62,21 +77,14 @@ except AttributeError:
 # Handle new message
 if (audio_file or (audio_input_supported and audio_recording)) and not st.session_state.get("chat_ended", False):
     if audio_file:
-        path = os.path.join(UPLOAD_DIR, audio_file.name)
-        with open(path, "wb") as f:
-            f.write(audio_file.getbuffer())
-        user_audio_bytes = audio_file.getvalue()
-    elif audio_input_supported and audio_recording:
-        path = os.path.join(UPLOAD_DIR, "mic_recording.wav")
-        with open(path, "wb") as f:
-            f.write(audio_recording.read())
-        user_audio_bytes = audio_recording.read()
+        user_audio_bytes, filename = audio_file.getvalue(), audio_file.name
     else:
-        user_audio_bytes = None
+        user_audio_bytes, filename = audio_recording.getvalue(), "mic_recording.wav"
+    save_upload(user_audio_bytes, filename, UPLOAD_DIR)
 
-    # Transcribe
+    # Transcribe from memory
     with st.spinner("📝 Transcribing your voice note…"):
-        user_text = transcribe_audio(path, language="en")
+        user_text = transcribe_audio(user_audio_bytes, language="en", filename=filename)
 
     # Append user message
     st.session_state.chat_history.append({
@@ -85,10 +93,20 @@ if (audio_file or (audio_input_supported and audio_recording)) and not st.sessio
         "audio": user_audio_bytes
     })
 
-    # Get bot response
-    with st.spinner("🤖 Thinking and generating reply…"):
-        bot_text = llm_response_sit(user_text)
-        bot_audio = text_to_speech(text=bot_text, voice_id=voice_id)
+    # Stream the bot response; the placeholder is cleared once it is in the chat history
+    live_reply = st.empty()
+    with live_reply.container():
+        st.markdown("**SIT Bot:**")
+        with session_scope(st.session_state.session_id):
+            bot_text = st.write_stream(stream_response_sit(user_text))
+        with st.spinner("🔊 Generating voice reply…"):
+            # The reply is played while it downloads; wait for the end, as clearing the
+            # placeholder removes the player
+            bot_audio = autoplay_audio_segments(
+                mp3_frame_chunks(text_to_speech_stream(text=bot_text, voice_id=voice_id)),
+                wait_for_end=True,
+            )
+    live_reply.empty()
 
     # Append bot message
     st.session_state.chat_history.append({
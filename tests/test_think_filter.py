@@ -0,0 +1,28 @@
+# tests/test_think_filter.py
+
+import pytest
+
+from app.think_filter import filter_stream, strip_think
+
+COMPLETIONS = [
+    ("<think>a</think>B</think>C", "BC"),
+    ("<think>plan</think>\n\nThe answer.", "The answer."),
+    ("reasoning without an opening tag</think>The answer.", "The answer."),
+    ("No reasoning at all.", "No reasoning at all."),
+    ("The answer.<think>unclosed", "The answer."),
+]
+
+
+def _chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("text, answer", COMPLETIONS)
+def test_strip_think_matches_filter_stream(text, answer):
+    assert strip_think(text) == answer
+    for size in (1, 2, 3, 5, len(text)):
+        assert "".join(filter_stream(_chunked(text, size))).strip() == answer
+
+
+def test_long_untagged_reasoning_is_dropped_from_complete_text():
+    assert strip_think("x" * 10000 + "</think>The answer.") == "The answer."
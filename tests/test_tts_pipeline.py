@@ -0,0 +1,34 @@
+# tests/test_tts_pipeline.py
+
+import re
+
+import pytest
+
+from app.tts_pipeline import split_segments, split_sentences
+
+TEXTS = [
+    "Survival rose to 94.5% in the U.S. trial. It cost $3.50 per dose, about 1.2 million doses.",
+    'Is that enough? "Yes," he said. (It was.) The rest follows!\n\nA new paragraph... and more',
+    "No punctuation at all",
+    "Mortality fell from 12.4 to 9.1 per 1,000. " * 20,
+]
+
+
+def _squash(text: str) -> str:
+    return re.sub(r"\s+", "", text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_segments_preserve_text(text):
+    for segment_chars, first_min_chars in ((250, 40), (60, 20), (1, 1)):
+        segments = split_segments(text, segment_chars, first_min_chars)
+        assert _squash("".join(segments)) == _squash(text)
+
+
+def test_numbers_and_abbreviations_are_not_split():
+    sentences = split_sentences("Survival rose to 94.5% in the U.S. trial. It cost $3.50, about 1.2 million.")
+    assert sentences == ["Survival rose to 94.5% in the U.S. trial.", "It cost $3.50, about 1.2 million."]
+
+
+def test_spacing_is_kept():
+    assert split_segments("It cost $3.50 per dose.") == ["It cost $3.50 per dose."]
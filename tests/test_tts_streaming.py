@@ -0,0 +1,63 @@
+# tests/test_tts_streaming.py
+
+import sys
+import threading
+import types
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.tts_server import make_handler
+
+TEXT = (
+    "Hostel rooms are allotted in the order of admission. First-year students share a room, "
+    "senior students may apply for a single room, and the mess is included in the hostel fee."
+)
+
+
+@pytest.fixture
+def tts(monkeypatch):
+    # The stand-in server ignores the API key, so none is needed from app/instance/config.py
+    try:
+        import app.instance.config  # noqa: F401
+    except ImportError:
+        config = types.ModuleType("app.instance.config")
+        config.ELEVENLABS_API_KEY = "test"
+        monkeypatch.setitem(sys.modules, "app.instance", types.ModuleType("app.instance"))
+        monkeypatch.setitem(sys.modules, "app.instance.config", config)
+    import app.tts_elevenlabs as tts
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(first_byte=0.0, speed=50.0, chunk_bytes=1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(tts, "ELEVENLABS_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield tts
+    server.shutdown()
+    server.server_close()
+
+
+def test_streamed_frames_match_buffered_file(tts):
+    from app.tts_pipeline import _drop_info_frame, mp3_frame_chunks, strip_id3
+
+    audio = tts.text_to_speech(TEXT, "standin", use_cache=False)
+    chunks = list(mp3_frame_chunks(tts.text_to_speech_stream(TEXT, "standin", use_cache=False)))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == _drop_info_frame(strip_id3(audio))
+
+
+def test_closing_the_stream_early_closes_the_response(tts, monkeypatch):
+    client = tts.get_http_client()
+    post = client.post
+    responses = []
+
+    def recording_post(*args, **kwargs):
+        responses.append(post(*args, **kwargs))
+        return responses[-1]
+
+    monkeypatch.setattr(client, "post", recording_post)
+
+    stream = tts.text_to_speech_stream(TEXT * 10, "standin", chunk_size=512, use_cache=False)
+    assert next(stream)
+    assert not responses[0].raw.closed
+    stream.close()
+    assert responses[0].raw.closed